@@ -1,5 +1,17 @@
 from django.contrib import admin
-from .models import Contact, Review, Package, UserProfile, VillaReport, Comment
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ERROR_FLAG
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponseRedirect
+from django.urls import path, reverse
+from django.utils import timezone
+from .models import (
+    Attachment, Contact, Review, Package, UserProfile, VillaReport, Comment, Task, Notification, Technician, SLARollup,
+    StatusSnapshot, StatusTransition,
+)
+from .reports_io import export_response
+from .scheduling import OPEN_STATUSES, replan_report
+from .search import get_search_backend
 
 
 @admin.register(Contact)
@@ -52,7 +64,10 @@ class UserProfileAdmin(admin.ModelAdmin):
     list_display = ['user', 'phone', 'villa_type', 'subscription_package', 'created_at']
     list_filter = ['villa_type', 'subscription_package', 'created_at']
     search_fields = ['user__username', 'user__email', 'phone', 'villa_address']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = [
+        'created_at', 'updated_at', 'reports_total', 'reports_pending',
+        'reports_in_progress', 'reports_completed', 'reports_cancelled',
+    ]
     
     fieldsets = (
         ('User Information', {
@@ -61,12 +76,40 @@ class UserProfileAdmin(admin.ModelAdmin):
         ('Villa Information', {
             'fields': ('villa_address', 'villa_type', 'subscription_package')
         }),
+        ('Reports', {
+            'fields': ('reports_total', 'reports_pending', 'reports_in_progress',
+                       'reports_completed', 'reports_cancelled'),
+            'classes': ('collapse',)
+        }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
     )
 
+    def save_model(self, request, obj, form, change):
+        if not change:
+            return super().save_model(request, obj, form, change)
+        # Leave the report counters (read-only here, moved with F() expressions
+        # by main.counters) as they are in the database
+        obj.save(update_fields=[*form.base_fields, 'updated_at'])
+
+
+class StatusTransitionInline(admin.TabularInline):
+    # History only: transitions are written by main.transitions
+    model = StatusTransition
+    fields = ['at', 'from_status', 'to_status', 'changed_by']
+    readonly_fields = fields
+    ordering = ['-at', '-id']
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 
 @admin.register(VillaReport)
 class VillaReportAdmin(admin.ModelAdmin):
@@ -75,13 +118,15 @@ class VillaReportAdmin(admin.ModelAdmin):
     search_fields = ['user__username', 'title', 'description', 'location']
     readonly_fields = ['created_at', 'updated_at']
     list_editable = ['status', 'priority']
+    actions = ['schedule_reports', 'export_csv', 'export_xlsx']
+    inlines = [StatusTransitionInline]
     
     fieldsets = (
         ('Report Information', {
             'fields': ('user', 'report_type', 'priority', 'title', 'description', 'location')
         }),
         ('Status & Scheduling', {
-            'fields': ('status', 'scheduled_date', 'completed_date')
+            'fields': ('status', 'technician', 'scheduled_date', 'completed_date')
         }),
         ('Admin Notes', {
             'fields': ('admin_notes',)
@@ -95,6 +140,52 @@ class VillaReportAdmin(admin.ModelAdmin):
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('user')
 
+    def save_model(self, request, obj, form, change):
+        # Credited on the status transition, if the save makes one
+        obj._changed_by = request.user
+        super().save_model(request, obj, form, change)
+    
+    def get_search_results(self, request, queryset, search_term):
+        # Text fields go through the full-text index instead of icontains scans
+        if not search_term:
+            return super().get_search_results(request, queryset, search_term)
+        matches = get_search_backend().filter_reports(queryset, search_term)
+        return matches | queryset.filter(user__username__icontains=search_term), False
+
+    @admin.action(description='Schedule selected reports into this week')
+    def schedule_reports(self, request, queryset):
+        planned = 0
+        for report_id in queryset.filter(status__in=OPEN_STATUSES).values_list('id', flat=True):
+            planned += replan_report(report_id) is not None
+        self.message_user(request, f'{planned} report(s) scheduled.')
+
+    # Exports stream rows from values_list().iterator(), so memory stays
+    # flat and the download starts before the last row is read
+    @admin.action(description='Export selected reports to CSV')
+    def export_csv(self, request, queryset):
+        return export_response(queryset, 'csv')
+
+    @admin.action(description='Export selected reports to Excel')
+    def export_xlsx(self, request, queryset):
+        return export_response(queryset, 'xlsx')
+
+    def get_urls(self):
+        return [
+            path('export/<str:fmt>/', self.admin_site.admin_view(self.export_view),
+                 name='main_villareport_export'),
+        ] + super().get_urls()
+
+    def export_view(self, request, fmt):
+        """Export the whole changelist, with its current filters and search applied."""
+        if fmt not in ('csv', 'xlsx') or not self.has_view_permission(request):
+            raise PermissionDenied
+        try:
+            changelist = self.get_changelist_instance(request)
+        except IncorrectLookupParameters:
+            # Bad filter parameters: let the changelist report them, as it does for its own
+            return HttpResponseRedirect(f'{reverse("admin:main_villareport_changelist")}?{ERROR_FLAG}=1')
+        return export_response(changelist.get_queryset(request), fmt)
+
 
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
@@ -114,4 +205,95 @@ class CommentAdmin(admin.ModelAdmin):
     )
     
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('user', 'villa_report')
\ No newline at end of file
+        # villa_report__user is needed by VillaReport.__str__ in list_display
+        return super().get_queryset(request).select_related('user', 'villa_report__user')
+
+
+@admin.register(Attachment)
+class AttachmentAdmin(admin.ModelAdmin):
+    list_display = ['original_name', 'villa_report', 'uploaded_by', 'status', 'size', 'created_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['original_name', 'villa_report__title', 'uploaded_by__username']
+    readonly_fields = ['thumbnail', 'content_type', 'size', 'width', 'height', 'status', 'created_at']
+    raw_id_fields = ['villa_report', 'comment']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('villa_report__user', 'uploaded_by')
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ['name', 'status', 'attempts', 'duration_ms', 'run_at', 'finished_at']
+    list_filter = ['status', 'name']
+    search_fields = ['name', 'idempotency_key']
+    readonly_fields = [
+        'name', 'args', 'kwargs', 'idempotency_key', 'attempts', 'max_attempts', 'claimed_by', 'last_error',
+        'created_at', 'started_at', 'finished_at', 'duration_ms',
+    ]
+    actions = ['retry_tasks']
+
+    @admin.action(description='Run selected tasks again')
+    def retry_tasks(self, request, queryset):
+        updated = queryset.exclude(status='running').update(status='queued', run_at=timezone.now(), attempts=0)
+        self.message_user(request, f'{updated} task(s) queued again.')
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ['user', 'villa_report', 'kind', 'new_status', 'created_at', 'sent_at']
+    list_filter = ['kind', 'sent_at']
+    search_fields = ['user__username', 'villa_report__title']
+    list_select_related = ['user', 'villa_report']
+    raw_id_fields = ['user', 'villa_report', 'comment']
+    readonly_fields = ['created_at']
+
+
+@admin.register(Technician)
+class TechnicianAdmin(admin.ModelAdmin):
+    list_display = ['name', 'day_start', 'day_end', 'is_active']
+    list_filter = ['is_active']
+    search_fields = ['name']
+
+
+@admin.register(SLARollup)
+class SLARollupAdmin(admin.ModelAdmin):
+    # Written by main.sla; fix drift with `manage.py rollup_sla`, not by hand
+    list_display = ['month', 'report_type', 'priority', 'reports', 'responded', 'completed', 'cancelled']
+    list_filter = ['report_type', 'priority', 'month']
+    readonly_fields = [field.name for field in SLARollup._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(StatusTransition)
+class StatusTransitionAdmin(admin.ModelAdmin):
+    # By id: the report may have been deleted since
+    list_display = ['report_id', 'from_status', 'to_status', 'at', 'changed_by']
+    list_filter = ['to_status']
+    list_select_related = ['changed_by']
+    raw_id_fields = ['report', 'changed_by']
+
+    # Append-only
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(StatusSnapshot)
+class StatusSnapshotAdmin(admin.ModelAdmin):
+    # Written by `manage.py snapshot_statuses`
+    list_display = ['at', 'status', 'count']
+    list_filter = ['status']
+    date_hierarchy = 'at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,255 @@
+import gzip
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:  # .br files are only written when brotli is installed
+    brotli = None
+
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.map', '.txt', '.xml', '.html', '.ico')
+# Names written by ManifestStaticFilesStorage, e.g. style.3f2a9c1b7d4e.css
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+# Strings and unquoted url() values are matched first so that comment
+# markers and punctuation inside them are kept
+CSS_TOKENS = re.compile(
+    r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|url\([^)"\']*\))|/\*.*?\*/', re.S | re.I,
+)
+# After one of these (or nothing), a '/' in JavaScript starts a regex, not a division
+JS_REGEX_AFTER = set('(,=:[!&|?{};+-*%<>~^')
+JS_REGEX_KEYWORD = re.compile(
+    r'(?:^|[^\w$])(?:return|typeof|case|do|else|in|of|void|yield|await|delete|throw|new)\s*$',
+)
+# Stands in for a JavaScript string or template literal while lines are trimmed
+JS_LITERAL = re.compile('\0(\\d+)\0')
+
+
+def minify_css(css):
+    """Drop comments and redundant whitespace, leaving strings and url() values untouched."""
+    parts = []
+    text = ''
+    position = 0
+    for match in CSS_TOKENS.finditer(css):
+        text += css[position:match.start()]
+        position = match.end()
+        if match.group(1):
+            parts += [_squeeze_css(text), match.group(1)]
+            text = ''
+    parts.append(_squeeze_css(text + css[position:]))
+    return ''.join(parts).strip()
+
+
+def _squeeze_css(text):
+    text = re.sub(r'\s+', ' ', text)
+    # No space may be removed before ':' since 'a :hover' differs from 'a:hover'
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    return re.sub(r':\s+', ':', text).replace(';}', '}')
+
+
+def minify_js(js):
+    """Conservative minification: strip indentation, blank lines and whole-line // comments.
+
+    Line breaks are kept so automatic semicolon insertion behaves exactly as
+    in the source. String and template literals are set aside first, so
+    multi-line templates (and strings continued with a backslash) keep
+    every line as written.
+    """
+    literals = []
+    code = []
+    position = 0
+    for start, end in _js_literals(js):
+        code += [js[position:start], f'\0{len(literals)}\0']
+        literals.append(js[start:end])
+        position = end
+    code.append(js[position:])
+    lines = (line.strip() for line in ''.join(code).splitlines())
+    minified = '\n'.join(line for line in lines if line and not line.startswith('//')) + '\n'
+    return JS_LITERAL.sub(lambda match: literals[int(match.group(1))], minified)
+
+
+def _js_literals(js):
+    """(start, end) of each top-level string and template literal in js."""
+    spans = []
+    _scan_js(js, 0, spans)
+    return spans
+
+
+def _scan_js(js, index, spans=None):
+    """Scan code from index, skipping comments and regexes, to the end or to the '}' closing a ${...}.
+
+    Returns the index after where the scan stopped. Literals found are
+    added to spans, if given (only the top level passes it).
+    """
+    depth = 0
+    previous = ''
+    while index < len(js):
+        char = js[index]
+        if char in '\'"`':
+            end = _end_of_literal(js, index)
+            if spans is not None:
+                spans.append((index, end))
+            index, previous = end, char
+        elif js.startswith('//', index):
+            end = js.find('\n', index)
+            index = len(js) if end == -1 else end
+        elif js.startswith('/*', index):
+            end = js.find('*/', index + 2)
+            index = len(js) if end == -1 else end + 2
+        elif char == '/' and (
+                not previous or previous in JS_REGEX_AFTER
+                or JS_REGEX_KEYWORD.search(js, max(0, index - 30), index)):
+            index, previous = _end_of_regex(js, index), ')'
+        else:
+            if char == '{':
+                depth += 1
+            elif char == '}':
+                if depth == 0 and spans is None:
+                    return index + 1
+                depth -= 1
+            if not char.isspace():
+                previous = char
+            index += 1
+    return index
+
+
+def _end_of_literal(js, index):
+    quote = js[index]
+    index += 1
+    while index < len(js):
+        char = js[index]
+        if char == '\\':
+            index += 2
+        elif char == quote:
+            return index + 1
+        elif quote == '`' and js.startswith('${', index):
+            index = _scan_js(js, index + 2)
+        else:
+            index += 1
+    return len(js)
+
+
+def _end_of_regex(js, index):
+    in_class = False
+    index += 1
+    while index < len(js):
+        char = js[index]
+        if char == '\\':
+            index += 2
+            continue
+        if char == '\n':
+            # Not a regex after all
+            return index
+        if in_class:
+            in_class = char != ']'
+        elif char == '[':
+            in_class = True
+        elif char == '/':
+            return index + 1
+        index += 1
+    return index
+
+
+def compress(data):
+    """Return {'.gz': bytes, '.br': bytes} for the encodings that shrink data."""
+    variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(data, quality=11)
+    return {suffix: body for suffix, body in variants.items() if len(body) < len(data) * 0.95}
+
+
+def split_rules(css):
+    """Split minified CSS into top-level (prelude, body) pairs."""
+    rules = []
+    depth = 0
+    start = body_start = 0
+    quote = None
+    for index, char in enumerate(css):
+        if quote:
+            if char == quote and css[index - 1] != '\\':
+                quote = None
+        elif char in '"\'':
+            quote = char
+        elif char == '{':
+            if depth == 0:
+                body_start = index
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                rules.append((css[start:body_start].strip(), css[body_start + 1:index]))
+                start = index + 1
+    return rules
+
+
+def extract_critical_css(css, selectors):
+    """Keep the rules whose selectors start with one of the given prefixes.
+
+    @media blocks are filtered recursively; other at-rules (@keyframes,
+    @font-face...) are left to the full stylesheet.
+    """
+    critical = []
+    for prelude, body in split_rules(minify_css(css)):
+        if prelude.startswith('@media'):
+            inner = extract_critical_css(body, selectors)
+            if inner:
+                critical.append(f'{prelude}{{{inner}}}')
+        elif not prelude.startswith('@') and any(
+            selector.strip().startswith(tuple(selectors)) for selector in prelude.split(',')
+        ):
+            critical.append(f'{prelude}{{{body}}}')
+    return ''.join(critical)
+
+
+def serve(request, path, document_root=None, hashed=HASHED_NAME):
+    """Serve a collected static file with precompressed variants and cache headers.
+
+    Paths matching hashed never change content, so they are cached for a
+    year and marked immutable; anything else is revalidated after
+    STATIC_MAX_AGE. document_root defaults to STATIC_ROOT.
+    """
+    try:
+        full_path = safe_join(document_root or settings.STATIC_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    accepted = {
+        coding.split(';')[0].strip() for coding in request.headers.get('Accept-Encoding', '').split(',')
+    }
+
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz'), (None, '')):
+        if encoding and encoding not in accepted:
+            continue
+        try:
+            file = open(full_path + suffix, 'rb')
+        except (FileNotFoundError, IsADirectoryError):
+            continue
+        break
+    else:
+        raise Http404
+
+    stat = os.fstat(file.fileno())
+    if not was_modified_since(request.headers.get('If-Modified-Since'), stat.st_mtime):
+        file.close()
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(file, content_type=content_type)
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        if encoding:
+            response['Content-Encoding'] = encoding
+    if hashed.search(path):
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response['Cache-Control'] = f'public, max-age={settings.STATIC_MAX_AGE}'
+    if path.endswith(COMPRESSIBLE_EXTENSIONS):
+        patch_vary_headers(response, ['Accept-Encoding'])
+    return response
@@ -0,0 +1,163 @@
+import logging
+import mimetypes
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadhandler import SkipFile, TemporaryFileUploadHandler
+from django.db import close_old_connections, connection, transaction
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import http_date
+from PIL import Image, ImageOps
+from .models import Attachment
+
+logger = logging.getLogger(__name__)
+
+ORIENTATION = 0x0112
+RANGE = re.compile(r'bytes=(\d*)-(\d*)')
+
+
+class AttachmentUploadHandler(TemporaryFileUploadHandler):
+    """Streams every uploaded file to a temporary file in chunks.
+
+    Nothing is held in memory regardless of size. FileSystemStorage then
+    moves the temporary file into MEDIA_ROOT instead of copying it. Files
+    over ATTACHMENT_MAX_SIZE are dropped as soon as they cross the limit,
+    and their names are collected in rejected.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.rejected = []
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.ATTACHMENT_MAX_SIZE:
+            self.rejected.append(self.file_name)
+            self.file.close()
+            raise SkipFile
+        return super().receive_data_chunk(raw_data, start)
+
+
+_executor = None
+
+
+def schedule(attachment_id):
+    """Process an attachment on the worker pool once the upload has committed."""
+    if settings.ATTACHMENT_WORKERS == 0:
+        process(attachment_id)
+        return
+    transaction.on_commit(lambda: _get_executor().submit(_run, attachment_id))
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.ATTACHMENT_WORKERS, thread_name_prefix='attachments',
+        )
+    return _executor
+
+
+def _run(attachment_id):
+    close_old_connections()
+    try:
+        process(attachment_id)
+    except Exception:
+        logger.exception('Failed to process attachment %s', attachment_id)
+    finally:
+        # Pool threads are long-lived; don't leave their connection open
+        connection.close()
+
+
+def process(attachment_id):
+    """Strip metadata from the original and write a square WebP thumbnail."""
+    attachment = Attachment.objects.get(pk=attachment_id)
+    path = attachment.file.path
+    try:
+        with Image.open(path) as image:
+            source_format = image.format
+            orientation = image.getexif().get(ORIENTATION, 1)
+            upright = ImageOps.exif_transpose(image)
+            _strip_metadata(image, upright, source_format, orientation, path)
+            attachment.width, attachment.height = upright.size
+            thumbnail = ImageOps.fit(
+                upright.convert('RGB'), (settings.ATTACHMENT_THUMBNAIL_SIZE,) * 2, Image.LANCZOS,
+            )
+    except (OSError, Image.DecompressionBombError, SyntaxError, ValueError):
+        logger.warning('Attachment %s is not a readable image', attachment_id, exc_info=True)
+        Attachment.objects.filter(pk=attachment_id).update(status='failed')
+        return
+
+    buffer = BytesIO()
+    thumbnail.save(buffer, format='WEBP', quality=75)
+    attachment.thumbnail.save(f'{attachment.pk}.webp', ContentFile(buffer.getvalue()), save=False)
+    attachment.size = os.path.getsize(path)
+    attachment.status = 'ready'
+    attachment.save(update_fields=['thumbnail', 'size', 'width', 'height', 'status'])
+
+
+def _strip_metadata(image, upright, source_format, orientation, path):
+    """Rewrite the original without EXIF/XMP (GPS position, camera serials...)."""
+    if source_format == 'GIF':
+        return
+    options = {'icc_profile': image.info.get('icc_profile')}
+    if source_format == 'MPO':
+        # Multi-picture JPEGs from phones are kept as their primary image,
+        # re-encoded: Pillow only accepts quality='keep' for plain JPEGs
+        source_format = 'JPEG'
+        options['quality'] = 90
+    elif source_format == 'JPEG':
+        # 'keep' reuses the source quantization tables, so an upright JPEG
+        # loses no quality; a rotated one has to be re-encoded
+        options['quality'] = 'keep' if orientation == 1 else 90
+        if orientation == 1:
+            upright = image
+    elif source_format == 'WEBP':
+        options['quality'] = 90
+    temporary = f'{path}.tmp'
+    upright.save(temporary, format=source_format, **options)
+    os.replace(temporary, path)
+
+
+def ranged_file_response(request, path, content_type=None):
+    """FileResponse that honours a single 'Range: bytes=' request (206/416)."""
+    content_type = content_type or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    size = os.path.getsize(path)
+    last_modified = http_date(os.path.getmtime(path))
+    match = RANGE.fullmatch(request.headers.get('Range', '').strip())
+    if_range = request.headers.get('If-Range')
+    if not match or not any(match.groups()) or (if_range and if_range != last_modified):
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    else:
+        first, last = match.groups()
+        if first:
+            start, end = int(first), min(int(last) if last else size - 1, size - 1)
+        else:
+            # bytes=-N is the final N bytes
+            start, end = max(size - int(last), 0), size - 1
+        if start >= size or start > end:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        response = StreamingHttpResponse(
+            _read_range(path, start, end - start + 1), status=206, content_type=content_type,
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    response['Accept-Ranges'] = 'bytes'
+    response['Last-Modified'] = last_modified
+    return response
+
+
+def _read_range(path, start, length, chunk_size=64 * 1024):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(chunk_size, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
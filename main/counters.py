@@ -0,0 +1,164 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Value, When
+from .models import ReportTally, UserProfile, VillaReport
+from .profiles import forget_profile
+
+
+TOTAL_FIELD = 'reports_total'
+STATUS_FIELDS = {value: f'reports_{value}' for value, label in VillaReport.STATUS_CHOICES}
+COUNTER_FIELDS = [TOTAL_FIELD, *STATUS_FIELDS.values()]
+# ReportTally keys, named like VillaReportQuerySet.status_summary()
+TALLY_KEYS = ['total'] + [
+    f'{field}_{value}'
+    for field, choices in (
+        ('status', VillaReport.STATUS_CHOICES),
+        ('priority', VillaReport.PRIORITY_LEVELS),
+        ('report_type', VillaReport.REPORT_TYPES),
+    )
+    for value, label in choices
+]
+
+
+def adjust_report_counts(user_id, status, delta, create=True):
+    """Add delta to a user's total and per-status report counters.
+
+    The update is a single UPDATE with F() expressions, so concurrent changes
+    cannot overwrite each other. If the user has no profile yet and create is
+    set, one is created with counters computed from the reports table (which
+    already includes the change being counted).
+    """
+    updates = {TOTAL_FIELD: F(TOTAL_FIELD) + delta}
+    if status in STATUS_FIELDS:
+        updates[STATUS_FIELDS[status]] = F(STATUS_FIELDS[status]) + delta
+    if UserProfile.objects.filter(user_id=user_id).update(**updates):
+        # The UPDATE bypasses save(), so the cached profile is dropped here
+        forget_profile(user_id)
+        return
+    if not create:
+        return
+    profile, created = UserProfile.objects.get_or_create(
+        user_id=user_id, defaults=count_reports(user_id=user_id).get(user_id, {}),
+    )
+    if not created:
+        # Another request created the profile in the meantime
+        UserProfile.objects.filter(pk=profile.pk).update(**updates)
+        forget_profile(user_id)
+
+
+def move_report_counts(old_user_id, old_status, new_user_id, new_status):
+    if (old_user_id, old_status) == (new_user_id, new_status):
+        return
+    if old_user_id == new_user_id:
+        # Status change: the total stays the same
+        updates = {}
+        if old_status in STATUS_FIELDS:
+            updates[STATUS_FIELDS[old_status]] = F(STATUS_FIELDS[old_status]) - 1
+        if new_status in STATUS_FIELDS:
+            updates[STATUS_FIELDS[new_status]] = F(STATUS_FIELDS[new_status]) + 1
+        if UserProfile.objects.filter(user_id=new_user_id).update(**updates):
+            forget_profile(new_user_id)
+            return
+        adjust_report_counts(new_user_id, new_status, 0)
+        return
+    adjust_report_counts(old_user_id, old_status, -1, create=False)
+    adjust_report_counts(new_user_id, new_status, 1)
+
+
+def tally_filters(status, priority, report_type):
+    """{tally key: the filter it counts} for a report in this state."""
+    return {
+        'total': {},
+        f'status_{status}': {'status': status},
+        f'priority_{priority}': {'priority': priority},
+        f'report_type_{report_type}': {'report_type': report_type},
+    }
+
+
+def move_report_tallies(old_state, new_state):
+    """Move a report between the site-wide tallies with one UPDATE.
+
+    old_state and new_state are (status, priority, report_type), or None
+    for a report being created or deleted. Missing rows are computed from
+    the reports table, which already includes the change being counted.
+    """
+    deltas, filters = Counter(), {}
+    for state, sign in ((old_state, -1), (new_state, 1)):
+        if state:
+            for key, key_filters in tally_filters(*state).items():
+                deltas[key] += sign
+                filters[key] = key_filters
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    updated = ReportTally.objects.filter(key__in=deltas).update(
+        count=F('count') + Case(*[When(key=key, then=Value(delta)) for key, delta in deltas.items()]),
+    )
+    if updated == len(deltas):
+        return
+    present = set(ReportTally.objects.filter(key__in=deltas).values_list('key', flat=True))
+    for key in deltas.keys() - present:
+        tally, created = ReportTally.objects.get_or_create(
+            key=key, defaults={'count': VillaReport.objects.filter(**filters[key]).count()},
+        )
+        if not created:
+            # Another request created the row in the meantime
+            ReportTally.objects.filter(pk=tally.pk).update(count=F('count') + deltas[key])
+
+
+def report_tallies():
+    """Site-wide counts in the shape of VillaReportQuerySet.status_summary(), from ReportTally."""
+    summary = dict.fromkeys(TALLY_KEYS, 0)
+    summary.update(ReportTally.objects.values_list('key', 'count'))
+    return summary
+
+
+def count_reports(**filters):
+    """Recompute counters from VillaReport, as {user_id: {field: count}}."""
+    aggregates = {TOTAL_FIELD: Count('id')}
+    for value, field in STATUS_FIELDS.items():
+        aggregates[field] = Count('id', filter=Q(status=value))
+    rows = VillaReport.objects.filter(**filters).order_by().values('user_id').annotate(**aggregates)
+    return {row.pop('user_id'): row for row in rows}
+
+
+def find_drift():
+    """Compare stored counters with the reports table.
+
+    Returns (stale, missing): the profiles whose counters are wrong, with
+    their correct values already assigned, and the user ids that have
+    reports but no profile.
+    """
+    counts = count_reports()
+    zero = dict.fromkeys(COUNTER_FIELDS, 0)
+    stale = []
+    for profile in UserProfile.objects.only('user_id', *COUNTER_FIELDS).iterator(chunk_size=2000):
+        expected = counts.pop(profile.user_id, zero)
+        if any(getattr(profile, field) != value for field, value in expected.items()):
+            for field, value in expected.items():
+                setattr(profile, field, value)
+            stale.append(profile)
+    return stale, counts
+
+
+def find_tally_drift():
+    """{key: correct count} for every ReportTally that is wrong or missing."""
+    stored = dict(ReportTally.objects.values_list('key', 'count'))
+    return {key: count for key, count in VillaReport.objects.status_summary().items() if stored.get(key, 0) != count}
+
+
+def rebuild_report_counts(batch_size=500):
+    """Rewrite every counter and tally that has drifted; returns the number fixed."""
+    with transaction.atomic():
+        tallies = find_tally_drift()
+        for key, count in tallies.items():
+            ReportTally.objects.update_or_create(key=key, defaults={'count': count})
+        stale, missing = find_drift()
+        UserProfile.objects.bulk_update(stale, COUNTER_FIELDS, batch_size=batch_size)
+        UserProfile.objects.bulk_create(
+            [UserProfile(user_id=user_id, **counts) for user_id, counts in missing.items()],
+            batch_size=batch_size,
+        )
+        forget_profile(*[profile.user_id for profile in stale])
+    return len(stale) + len(missing) + len(tallies)
@@ -0,0 +1,201 @@
+import asyncio
+import json
+import logging
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from .models import Comment, VillaReport
+
+logger = logging.getLogger(__name__)
+
+# Pushed to every queue by Broker.close() so open streams end cleanly
+CLOSED = object()
+
+
+class Broker:
+    """In-process fan-out of report events to Server-Sent Events streams.
+
+    One watcher task polls the database every SSE_POLL_INTERVAL seconds for
+    comments and status changes on the reports that have subscribers, so
+    the database cost does not grow with the number of open pages. The
+    watcher only runs while someone is subscribed. Changes made by any
+    process (WSGI workers, the admin, management commands) are picked up.
+    """
+
+    def __init__(self):
+        self._subscribers = {}
+        self._watcher = None
+        self._last_comment_id = None
+        self._statuses = {}
+        self._checked_at = None
+
+    async def subscribe(self, report_id):
+        """Return a queue that receives the report's events until unsubscribed.
+
+        Every comment created after this returns is delivered, so a stream
+        that replays older comments once subscribed cannot miss one.
+        """
+        queue = asyncio.Queue(maxsize=settings.SSE_QUEUE_SIZE)
+        self._subscribers.setdefault(report_id, set()).add(queue)
+        if self._last_comment_id is None:
+            latest = await sync_to_async(latest_comment_id)()
+            if self._last_comment_id is None:
+                self._last_comment_id = latest
+        if self._watcher is None or self._watcher.done():
+            self._watcher = asyncio.get_running_loop().create_task(self._watch())
+        return queue
+
+    def unsubscribe(self, report_id, queue):
+        queues = self._subscribers.get(report_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[report_id]
+                self._statuses.pop(report_id, None)
+
+    def publish(self, report_id, event):
+        for queue in self._subscribers.get(report_id, ()):
+            if queue.full():
+                # A stalled client only loses its own oldest event
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    def subscriber_count(self):
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    async def close(self):
+        for queues in self._subscribers.values():
+            for queue in queues:
+                if queue.full():
+                    queue.get_nowait()
+                queue.put_nowait(CLOSED)
+        if self._watcher is not None:
+            self._watcher.cancel()
+            self._watcher = None
+
+    async def _watch(self):
+        try:
+            while self._subscribers:
+                try:
+                    events = await sync_to_async(self.poll)(set(self._subscribers))
+                except Exception:
+                    logger.exception('Report event poll failed')
+                    events = []
+                for report_id, event in events:
+                    self.publish(report_id, event)
+                await asyncio.sleep(settings.SSE_POLL_INTERVAL)
+        finally:
+            self._last_comment_id = None
+            self._checked_at = None
+
+    def poll(self, report_ids):
+        """Return (report_id, event) pairs for changes since the previous poll."""
+        events = []
+        if self._last_comment_id is None:
+            # Streams replay older comments themselves (Last-Event-ID)
+            self._last_comment_id = latest_comment_id()
+        comments = list(
+            Comment.objects.filter(id__gt=self._last_comment_id)
+            .select_related('user').order_by('id')[:settings.SSE_POLL_BATCH]
+        )
+        if comments:
+            self._last_comment_id = comments[-1].id
+        events += [
+            (comment.villa_report_id, comment_event(comment))
+            for comment in comments if comment.villa_report_id in report_ids
+        ]
+
+        # Known reports are only re-read if touched since the last poll (with
+        # a second of slack for clock resolution). A newly subscribed report's
+        # status is always published; clients apply status events idempotently.
+        now = timezone.now()
+        known = report_ids & self._statuses.keys()
+        rows = []
+        if known and self._checked_at is not None:
+            rows += VillaReport.objects.filter(
+                id__in=known, updated_at__gte=self._checked_at - timedelta(seconds=1),
+            ).values_list('id', 'status')
+        if report_ids - known:
+            rows += VillaReport.objects.filter(id__in=report_ids - known).values_list('id', 'status')
+        self._checked_at = now
+        for report_id, status in rows:
+            previous = self._statuses.get(report_id)
+            self._statuses[report_id] = status
+            if previous != status:
+                events.append((report_id, status_event(status)))
+        return events
+
+
+def latest_comment_id():
+    return Comment.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def comment_event(comment):
+    return {
+        'event': 'comment',
+        'id': comment.id,
+        'data': {
+            'id': comment.id,
+            'author': comment.user.get_full_name() or comment.user.username,
+            'is_admin': comment.is_admin_comment,
+            'comment': comment.comment,
+            'created_at': comment.created_at.isoformat(),
+        },
+    }
+
+
+def status_event(status):
+    report = VillaReport(status=status)
+    return {
+        'event': 'status',
+        'data': {'status': status, 'label': report.get_status_display(), 'color': report.get_status_color()},
+    }
+
+
+def format_event(event):
+    """Serialize an event in the text/event-stream wire format."""
+    lines = [f"event: {event['event']}"]
+    if 'id' in event:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"data: {json.dumps(event['data'])}")
+    return '\n'.join(lines) + '\n\n'
+
+
+async def report_stream(report_id, after=None):
+    """Yield a report's event stream: current status, missed comments, then live events.
+
+    after is the id of the newest comment the client already has (from
+    Last-Event-ID on reconnect); comments after it are replayed first.
+    """
+    queue = await broker.subscribe(report_id)
+    try:
+        yield f'retry: {settings.SSE_RETRY}\n\n'
+        status = await VillaReport.objects.filter(id=report_id).values_list('status', flat=True).afirst()
+        yield format_event(status_event(status))
+        seen = after or 0
+        if after is not None:
+            replay = Comment.objects.filter(villa_report_id=report_id, id__gt=after).select_related('user').order_by('id')
+            async for comment in replay:
+                seen = comment.id
+                yield format_event(comment_event(comment))
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), settings.SSE_KEEPALIVE)
+            except asyncio.TimeoutError:
+                # Keeps proxies from closing an idle connection
+                yield ': keepalive\n\n'
+                continue
+            if event is CLOSED:
+                return
+            if event['event'] == 'comment':
+                if event['id'] <= seen:
+                    continue
+                seen = event['id']
+            yield format_event(event)
+    finally:
+        broker.unsubscribe(report_id, queue)
+
+
+broker = Broker()
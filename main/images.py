@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import posixpath
+import re
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+from . import assets
+
+# Pillow only writes AVIF when built with libavif (or with pillow-avif-plugin)
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+SAVE_OPTIONS = {
+    'avif': {'quality': 55},
+    'webp': {'quality': 80, 'method': 4},
+    'jpeg': {'quality': 82, 'optimize': True, 'progressive': True},
+}
+
+
+# Files inside a content-hash directory (derivatives, the stored original)
+HASHED_PATH = re.compile(r'(?:^|/)[0-9a-f]{12}/[^/]+$')
+
+
+def supported_formats():
+    """The configured IMAGE_FORMATS this Pillow build can write, plus the JPEG fallback."""
+    writable = {extension.lstrip('.') for extension, fmt in Image.registered_extensions().items()
+                if fmt in Image.SAVE}
+    return [fmt for fmt in settings.IMAGE_FORMATS if fmt in writable] + ['jpeg']
+
+
+def image_dir(name):
+    if not name or name.startswith('/') or '..' in name.split('/'):
+        raise ValueError(f'Invalid image name: {name!r}')
+    return posixpath.join(settings.IMAGE_DIR, name)
+
+
+def ingest(name, source):
+    """Store a source image under MEDIA_ROOT and write its derivatives.
+
+    name is a slash-separated key such as 'home/villa-1'; source is a path
+    or a binary file object. Derivatives live in a directory named after the
+    source's content hash, so re-ingesting a changed image never serves
+    stale files and re-ingesting the same image is a no-op.
+    """
+    if hasattr(source, 'read'):
+        data = source.read()
+    else:
+        with open(source, 'rb') as file:
+            data = file.read()
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    current = load_manifest(name)
+    if current and current['hash'] == digest and all(
+        default_storage.exists(path) for path in _derivative_paths(name, current)
+    ):
+        return current
+
+    with Image.open(BytesIO(data)) as image:
+        source_format = image.format
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+
+    widths = sorted({min(width, image.width) for width in settings.IMAGE_WIDTHS})
+    manifest = {
+        'hash': digest,
+        'width': image.width,
+        'height': image.height,
+        'widths': widths,
+        'formats': supported_formats(),
+        'source_format': source_format.lower(),
+    }
+    original = posixpath.join(image_dir(name), digest, f'original.{source_format.lower()}')
+    default_storage.delete(original)
+    default_storage.save(original, ContentFile(data))
+    for width in widths:
+        resized = image if width == image.width else image.resize(
+            (width, round(image.height * width / image.width)), Image.LANCZOS, reducing_gap=3.0,
+        )
+        for fmt in manifest['formats']:
+            _save(resized, fmt, _derivative_path(name, digest, width, fmt))
+
+    _write_manifest(name, manifest)
+    # Derivatives of the previous version can go once the new manifest is live
+    if current and current['hash'] != digest:
+        for path in _derivative_paths(name, current):
+            default_storage.delete(path)
+        default_storage.delete(posixpath.join(image_dir(name), current['hash'], f"original.{current['source_format']}"))
+    return manifest
+
+
+def serve(request, path):
+    """Serve a file under MEDIA_ROOT/IMAGE_DIR when DEBUG is off (see SERVE_STATIC).
+
+    Only the image directory is exposed: attachments elsewhere under
+    MEDIA_ROOT go through their own permission-checked views.
+    """
+    return assets.serve(request, path, os.path.join(settings.MEDIA_ROOT, settings.IMAGE_DIR), HASHED_PATH)
+
+
+def srcsets(name, manifest):
+    """{format: 'url 480w, url 768w, ...'} for an ingested image."""
+    return {
+        fmt: ', '.join(
+            f"{default_storage.url(_derivative_path(name, manifest['hash'], width, fmt))} {width}w"
+            for width in manifest['widths']
+        )
+        for fmt in manifest['formats']
+    }
+
+
+def load_manifest(name):
+    """The ingested image's manifest, or None if it has not been ingested."""
+    path = posixpath.join(image_dir(name), 'manifest.json')
+    try:
+        modified = default_storage.get_modified_time(path)
+    except (FileNotFoundError, OSError):
+        return None
+    return _read_manifest(path, modified)
+
+
+@lru_cache(maxsize=256)
+def _read_manifest(path, modified):
+    # Keyed on the file's mtime, so a re-ingest is picked up by every process
+    with default_storage.open(path) as file:
+        return json.load(file)
+
+
+def _write_manifest(name, manifest):
+    path = posixpath.join(image_dir(name), 'manifest.json')
+    default_storage.delete(path)
+    default_storage.save(path, ContentFile(json.dumps(manifest).encode('utf-8')))
+
+
+def _derivative_path(name, digest, width, fmt):
+    extension = 'jpg' if fmt == 'jpeg' else fmt
+    return posixpath.join(image_dir(name), digest, f'{width}w.{extension}')
+
+
+def _derivative_paths(name, manifest):
+    return [
+        _derivative_path(name, manifest['hash'], width, fmt)
+        for width in manifest['widths'] for fmt in manifest['formats']
+    ]
+
+
+def _save(image, fmt, path):
+    if fmt == 'jpeg' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    # No exif= argument: derivatives never carry the source's metadata
+    image.save(buffer, format=fmt.upper(), **SAVE_OPTIONS[fmt])
+    default_storage.delete(path)
+    default_storage.save(path, ContentFile(buffer.getvalue()))
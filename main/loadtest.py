@@ -0,0 +1,91 @@
+"""HTTP load clients for `manage.py benchmark_site`.
+
+Only the standard library is used here: each client runs in a spawned
+process that never sets up Django, so clients and server do not share a GIL.
+"""
+import http.client
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+
+class SiteClient:
+    """A keep-alive HTTP connection that remembers cookies and sends the CSRF token."""
+
+    def __init__(self, base_url, cookies=None, csrf_cookie='csrftoken'):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port
+        self.connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        self.cookies = dict(cookies or {})
+        self.csrf_cookie = csrf_cookie
+
+    def request(self, method, path, data=None):
+        """Send one request; returns (status, body size)."""
+        headers = {}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{name}={value}' for name, value in self.cookies.items())
+        body = None
+        if data is not None:
+            body = urlencode(data)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            if self.csrf_cookie in self.cookies:
+                headers['X-CSRFToken'] = self.cookies[self.csrf_cookie]
+        try:
+            self.connection.request(method, path, body, headers)
+            response = self.connection.getresponse()
+            content = response.read()
+        except (http.client.HTTPException, OSError):
+            # Reconnect on the next request
+            self.connection.close()
+            raise
+        for header in response.headers.get_all('Set-Cookie') or []:
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+        return response.status, len(content)
+
+    def close(self):
+        self.connection.close()
+
+
+def run_client(base_url, spec, start_at, measure_from, end_at):
+    """Send spec's requests in a loop until end_at (time.time() values).
+
+    spec is {'cookies': {...}, 'requests': [[method, path, data], ...]};
+    the requests are cycled in order. Clients wait for start_at so they all
+    begin together, and only requests started after measure_from count.
+    Returns latencies in ms plus error, status and byte counts.
+    """
+    client = SiteClient(base_url, spec.get('cookies'), spec.get('csrf_cookie', 'csrftoken'))
+    requests = spec['requests']
+    if any(data is not None for method, path, data in requests):
+        # Pick up the CSRF cookie the way a browser would
+        client.request('GET', '/')
+    latencies = []
+    statuses = {}
+    errors = 0
+    size = 0
+    time.sleep(max(start_at - time.time(), 0))
+    index = 0
+    try:
+        while True:
+            now = time.time()
+            if now >= end_at:
+                break
+            method, path, data = requests[index % len(requests)]
+            index += 1
+            started = time.perf_counter()
+            try:
+                status, length = client.request(method, path, data)
+            except (http.client.HTTPException, OSError):
+                status, length = 0, 0
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if now < measure_from:
+                continue
+            latencies.append(elapsed_ms)
+            statuses[status] = statuses.get(status, 0) + 1
+            size += length
+            if not 200 <= status < 400:
+                errors += 1
+    finally:
+        client.close()
+    return {'latencies': latencies, 'statuses': statuses, 'errors': errors, 'bytes': size}
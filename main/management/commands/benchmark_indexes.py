@@ -0,0 +1,141 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from main.models import Review, VillaReport, Comment
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the report, comment and review queries with and without the composite indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10_000, help='Number of users to create')
+        parser.add_argument('--reports', type=int, default=1_000_000, help='Number of villa reports to create')
+        parser.add_argument('--comments', type=int, default=1_000_000, help='Number of comments to create')
+        parser.add_argument('--reviews', type=int, default=10_000, help='Number of reviews to create')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per query; the median is reported')
+        parser.add_argument('--batch-size', type=int, default=10_000, help='bulk_create batch size')
+
+    def handle(self, *args, **options):
+        self.options = options
+
+        # Work on a throwaway test database so real data is never touched
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.seed()
+            with_indexes = self.run_queries()
+            self.drop_indexes()
+            without_indexes = self.run_queries()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.stdout.write(f"\n{'Query':<34}{'Without (ms)':>14}{'With (ms)':>12}{'Speedup':>10}")
+        for name, with_ms in with_indexes.items():
+            without_ms = without_indexes[name]
+            speedup = without_ms / with_ms if with_ms else float('inf')
+            self.stdout.write(f'{name:<34}{without_ms:>14.2f}{with_ms:>12.2f}{speedup:>9.1f}x')
+
+    def seed(self):
+        users = self.options['users']
+        reports = self.options['reports']
+        comments = self.options['comments']
+        reviews = self.options['reviews']
+        batch_size = self.options['batch_size']
+        rng = random.Random(42)
+
+        started = time.perf_counter()
+        User.objects.bulk_create(
+            (User(username=f'bench{i}') for i in range(users)), batch_size=batch_size
+        )
+        user_ids = list(User.objects.values_list('id', flat=True))
+        # One long-standing owner holds 1% of all reports to exercise deep pages
+        self.owner_id = user_ids[0]
+        owner_reports = reports // 100
+
+        statuses = [value for value, label in VillaReport.STATUS_CHOICES]
+        priorities = [value for value, label in VillaReport.PRIORITY_LEVELS]
+        report_types = [value for value, label in VillaReport.REPORT_TYPES]
+        VillaReport.objects.bulk_create(
+            (
+                VillaReport(
+                    user_id=self.owner_id if i < owner_reports else rng.choice(user_ids),
+                    title=f'Report {i}',
+                    description='Benchmark report',
+                    location='Pool Area',
+                    status=rng.choice(statuses),
+                    priority=rng.choice(priorities),
+                    report_type=rng.choice(report_types),
+                )
+                for i in range(reports)
+            ),
+            batch_size=batch_size,
+        )
+        first_report, last_report = (
+            VillaReport.objects.order_by('id').values_list('id', flat=True)[0],
+            VillaReport.objects.order_by('-id').values_list('id', flat=True)[0],
+        )
+        self.report_id = first_report
+        Comment.objects.bulk_create(
+            (
+                Comment(
+                    villa_report_id=rng.randint(first_report, last_report),
+                    user_id=rng.choice(user_ids),
+                    comment='Benchmark comment',
+                    is_admin_comment=rng.random() < 0.5,
+                )
+                for i in range(comments)
+            ),
+            batch_size=batch_size,
+        )
+        Review.objects.bulk_create(
+            (
+                Review(name=f'Reviewer {i}', rating=5, comment='Great', is_approved=rng.random() < 0.1)
+                for i in range(reviews)
+            ),
+            batch_size=batch_size,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.stdout.write(
+            f'Seeded {users} users, {reports} reports, {comments} comments and {reviews} reviews '
+            f'in {time.perf_counter() - started:.1f}s'
+        )
+
+    def drop_indexes(self):
+        with connection.schema_editor() as schema_editor:
+            for model in (Review, VillaReport, Comment):
+                for index in model._meta.indexes:
+                    schema_editor.remove_index(model, index)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def run_queries(self):
+        owner_reports = VillaReport.objects.filter(user_id=self.owner_id)
+        last_page_offset = (owner_reports.count() // 10) * 10
+        queries = {
+            'villa_reports first page': lambda: list(owner_reports[:10]),
+            'villa_reports last page': lambda: list(owner_reports[last_page_offset:last_page_offset + 10]),
+            'villa_reports count': lambda: owner_reports.count(),
+            'dashboard recent reports': lambda: list(owner_reports[:5]),
+            'dashboard status summary': lambda: owner_reports.status_summary(),
+            'admin dashboard status summary': lambda: VillaReport.objects.status_summary(),
+            'admin dashboard recent reports': lambda: list(VillaReport.objects.select_related('user')[:10]),
+            'admin dashboard recent comments': lambda: list(Comment.objects.select_related('user')[:10]),
+            'report detail comments': lambda: list(
+                Comment.objects.filter(villa_report_id=self.report_id).select_related('user')
+            ),
+            'home approved reviews': lambda: list(Review.objects.filter(is_approved=True)[:6]),
+        }
+        results = {}
+        for name, query in queries.items():
+            timings = []
+            for _ in range(self.options['repeat']):
+                started = time.perf_counter()
+                query()
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = statistics.median(timings)
+        return results
@@ -0,0 +1,247 @@
+import json
+import multiprocessing
+import platform
+import subprocess
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, get_internal_wsgi_application
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.testcases import QuietWSGIRequestHandler
+from django.urls import reverse
+from django.utils import timezone
+from main.loadtest import run_client
+from main.management.commands.populate_data import SYNTHETIC_USER_PREFIX
+from main.models import Comment, UserProfile, VillaReport
+from main.perf import percentile
+
+ENDPOINTS = [
+    'home', 'dashboard', 'villa_reports', 'villa_report_detail',
+    'admin_dashboard', 'admin_report_detail', 'submit_contact', 'submit_review',
+]
+ADMIN_USERNAME = 'loadtest_admin'
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a benchmark database at scale (via populate_data), serve the site from it on a local '
+        'server and drive the key pages with concurrent clients; writes a JSON results file'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--db', default=str(settings.BASE_DIR / 'var' / 'benchmarks' / 'site.sqlite3'),
+                            help='SQLite file for the benchmark data; seeded on first use and reused after')
+        parser.add_argument('--reseed', action='store_true', help='Delete the benchmark database and seed it again')
+        parser.add_argument('--users', type=int, default=10_000, help='Synthetic users when seeding')
+        parser.add_argument('--reports', type=int, default=1_000_000, help='Synthetic reports when seeding')
+        parser.add_argument('--comments', type=int, default=5_000_000, help='Synthetic comments when seeding')
+        parser.add_argument('--clients', type=int, default=8, help='Concurrent client processes')
+        parser.add_argument('--duration', type=float, default=10.0, help='Measured seconds per endpoint')
+        parser.add_argument('--warmup', type=float, default=2.0, help='Unmeasured seconds before each endpoint')
+        parser.add_argument('--endpoints', default=','.join(ENDPOINTS),
+                            help='Comma-separated subset of: ' + ', '.join(ENDPOINTS))
+        parser.add_argument('--output', help='Results file (default: var/benchmarks/site-<time>-<commit>.json)')
+        parser.add_argument('--compare', help='Earlier results file to compare against')
+
+    def handle(self, *args, **options):
+        endpoints = [name.strip() for name in options['endpoints'].split(',') if name.strip()]
+        unknown = set(endpoints) - set(ENDPOINTS)
+        if unknown:
+            raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+        if options['clients'] < 1:
+            raise CommandError('--clients must be positive')
+        baseline = None
+        if options['compare']:
+            try:
+                baseline = json.loads(Path(options['compare']).read_text())
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Cannot read {options['compare']}: {exc}")
+
+        self.use_database(Path(options['db']).resolve(), options)
+        specs = self.build_specs(options['clients'])
+
+        results = {
+            'commit': git_commit(),
+            'started_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'config': {key: options[key] for key in ('clients', 'duration', 'warmup')},
+            'dataset': {
+                'users': User.objects.count(),
+                'reports': VillaReport.objects.count(),
+                'comments': Comment.objects.count(),
+            },
+            'endpoints': {},
+        }
+        # Production-like settings: no query logging, no debug pages
+        with override_settings(DEBUG=False, ALLOWED_HOSTS=['127.0.0.1']):
+            server = ThreadedWSGIServer(('127.0.0.1', 0), QuietWSGIRequestHandler, allow_reuse_address=True)
+            server.set_app(get_internal_wsgi_application())
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            base_url = f'http://127.0.0.1:{server.server_port}'
+            try:
+                with ProcessPoolExecutor(options['clients'], mp_context=multiprocessing.get_context('spawn')) as pool:
+                    # Start every client process before the first measurement
+                    list(pool.map(time.sleep, [0.2] * options['clients']))
+                    for name in endpoints:
+                        results['endpoints'][name] = self.run_endpoint(pool, base_url, name, specs[name], options)
+            finally:
+                server.shutdown()
+                server.server_close()
+
+        output = Path(options['output'] or (
+            settings.BASE_DIR / 'var' / 'benchmarks'
+            / f"site-{time.strftime('%Y%m%d-%H%M%S')}-{(results['commit'] or 'unknown')[:8]}.json"
+        ))
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(results, indent=2))
+        self.print_results(results, baseline)
+        self.stdout.write(self.style.SUCCESS(f'Results written to {output}'))
+
+    def use_database(self, path, options):
+        if path == Path(settings.DATABASES['default']['NAME']).resolve():
+            raise CommandError('--db must not be the project database')
+        if options['reseed']:
+            for suffix in ('', '-wal', '-shm'):
+                Path(f'{path}{suffix}').unlink(missing_ok=True)
+        fresh = not path.exists()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        connection.close()
+        # Server threads open their connections from the same settings
+        settings.DATABASES['default']['NAME'] = str(path)
+        connection.settings_dict['NAME'] = str(path)
+        call_command('migrate', verbosity=0)
+        if fresh:
+            self.stdout.write(f'Seeding {path}')
+            call_command(
+                'populate_data', users=options['users'], reports=options['reports'],
+                comments=options['comments'], stdout=self.stdout,
+            )
+
+    def build_specs(self, clients):
+        """Requests and login cookies for each client of each endpoint."""
+        admin, created = User.objects.get_or_create(
+            username=ADMIN_USERNAME, defaults={'is_staff': True, 'is_superuser': True},
+        )
+        owners = list(
+            UserProfile.objects.filter(user__username__startswith=SYNTHETIC_USER_PREFIX, reports_total__gt=0)
+            .order_by('user_id').select_related('user')[:clients]
+        )
+        if not owners:
+            raise CommandError('The benchmark database has no synthetic reports; run with --reseed')
+        report_ids = list(VillaReport.objects.order_by('-id').values_list('id', flat=True)[:200])
+
+        def cookies(user):
+            client = Client()
+            client.force_login(user)
+            return {name: morsel.value for name, morsel in client.cookies.items()}
+
+        admin_cookies = cookies(admin)
+        specs = {name: [] for name in ENDPOINTS}
+        for i in range(clients):
+            owner = owners[i % len(owners)].user
+            owner_cookies = cookies(owner)
+            owned = VillaReport.objects.filter(user=owner).values_list('id', flat=True)[:20]
+            specs['home'].append({'requests': [['GET', reverse('home'), None]]})
+            specs['dashboard'].append({'cookies': owner_cookies, 'requests': [['GET', reverse('dashboard'), None]]})
+            specs['villa_reports'].append(
+                {'cookies': owner_cookies, 'requests': [['GET', reverse('villa_reports'), None]]})
+            specs['villa_report_detail'].append({'cookies': owner_cookies, 'requests': [
+                ['GET', reverse('villa_report_detail', args=[report_id]), None] for report_id in owned
+            ]})
+            specs['admin_dashboard'].append(
+                {'cookies': admin_cookies, 'requests': [['GET', reverse('admin_dashboard'), None]]})
+            specs['admin_report_detail'].append({'cookies': admin_cookies, 'requests': [
+                ['GET', reverse('admin_report_detail', args=[report_id]), None]
+                for report_id in report_ids[i::clients] or report_ids
+            ]})
+            specs['submit_contact'].append({'requests': [['POST', reverse('submit_contact'), {
+                'name': f'Load client {i}', 'email': f'client{i}@example.com', 'message': 'Benchmark message',
+            }]]})
+            specs['submit_review'].append({'requests': [['POST', reverse('submit_review'), {
+                'name': f'Load client {i}', 'rating': 5, 'comment': 'Benchmark review',
+            }]]})
+        for spec in (spec for client_specs in specs.values() for spec in client_specs):
+            spec['csrf_cookie'] = settings.CSRF_COOKIE_NAME
+        return specs
+
+    def run_endpoint(self, pool, base_url, name, specs, options):
+        start_at = time.time() + 0.5
+        measure_from = start_at + options['warmup']
+        end_at = measure_from + options['duration']
+        outcomes = list(pool.map(
+            run_client, [base_url] * len(specs), specs,
+            [start_at] * len(specs), [measure_from] * len(specs), [end_at] * len(specs),
+        ))
+        latencies = sorted(latency for outcome in outcomes for latency in outcome['latencies'])
+        statuses = {}
+        for outcome in outcomes:
+            for status, count in outcome['statuses'].items():
+                statuses[str(status)] = statuses.get(str(status), 0) + count
+        requests = len(latencies)
+        result = {
+            'requests': requests,
+            'errors': sum(outcome['errors'] for outcome in outcomes),
+            'statuses': statuses,
+            'rps': round(requests / options['duration'], 1),
+            'bytes_per_request': round(sum(outcome['bytes'] for outcome in outcomes) / requests) if requests else None,
+            'latency_ms': {
+                'mean': rounded(sum(latencies) / requests if requests else None),
+                **{f'p{q}': rounded(percentile(latencies, q)) for q in (50, 95, 99)},
+                'max': rounded(latencies[-1] if latencies else None),
+            },
+        }
+        self.stdout.write(f"{name}: {result['rps']} req/s, p95 {result['latency_ms']['p95']} ms, "
+                          f"{result['errors']} errors")
+        return result
+
+    def print_results(self, results, baseline):
+        self.stdout.write(
+            f"\n{'Endpoint':<24}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}"
+            + (f"{'req/s vs base':>15}{'p95 vs base':>13}" if baseline else '')
+        )
+        for name, result in results['endpoints'].items():
+            latency = result['latency_ms']
+            line = (
+                f"{name:<24}{result['rps']:>9}{format_value(latency['p50']):>9}{format_value(latency['p95']):>9}"
+                f"{format_value(latency['p99']):>9}{result['errors']:>8}"
+            )
+            before = baseline['endpoints'].get(name) if baseline else None
+            if before:
+                line += f"{change(before['rps'], result['rps']):>15}"
+                line += f"{change(before['latency_ms']['p95'], latency['p95']):>13}"
+            self.stdout.write(line)
+        if baseline:
+            self.stdout.write(f"Baseline: commit {(baseline.get('commit') or 'unknown')[:8]}, "
+                              f"{baseline['dataset']['reports']} reports")
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def rounded(value):
+    return None if value is None else round(value, 2)
+
+
+def format_value(value):
+    return '-' if value is None else f'{value:.1f}'
+
+
+def change(before, after):
+    if not before or after is None:
+        return '-'
+    return f'{(after - before) / before * 100:+.0f}%'
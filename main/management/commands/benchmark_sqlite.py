@@ -0,0 +1,133 @@
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections, transaction
+from main.models import Contact, VillaReport
+
+
+class Command(BaseCommand):
+    help = 'Benchmark concurrent reads and writes on SQLite with default settings and with SQLITE_PRAGMAS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8, help='Concurrent reader threads')
+        parser.add_argument('--writers', type=int, default=4, help='Concurrent writer threads')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds per run')
+        parser.add_argument('--reports', type=int, default=50_000, help='Villa reports to seed')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('This benchmark only applies to SQLite')
+        self.options = options
+
+        # WAL needs a real file, so use a file-backed throwaway test database
+        old_name = connection.settings_dict['NAME']
+        workdir = tempfile.mkdtemp()
+        connection.settings_dict['TEST']['NAME'] = str(Path(workdir) / 'benchmark.sqlite3')
+        pragmas = settings.SQLITE_PRAGMAS
+        try:
+            settings.SQLITE_PRAGMAS = {}
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            self.seed()
+            runs = [
+                ('default (rollback journal)', {'journal_mode': 'delete'}),
+                ('tuned (SQLITE_PRAGMAS)', pragmas),
+            ]
+            results = []
+            for label, run_pragmas in runs:
+                settings.SQLITE_PRAGMAS = run_pragmas
+                connection.close()
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                results.append((label, self.run_load()))
+        finally:
+            settings.SQLITE_PRAGMAS = pragmas
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.stdout.write(
+            f"\n{'Configuration':<28}{'reads/s':>10}{'writes/s':>10}"
+            f"{'read p95':>10}{'write p95':>11}{'write p99':>11}{'errors':>8}"
+        )
+        for label, result in results:
+            self.stdout.write(
+                f"{label:<28}{result['reads_per_s']:>10.0f}{result['writes_per_s']:>10.0f}"
+                f"{result['read_p95']:>8.1f}ms{result['write_p95']:>9.1f}ms{result['write_p99']:>9.1f}ms"
+                f"{result['errors']:>8}"
+            )
+
+    def seed(self):
+        User.objects.bulk_create(User(username=f'bench{i}') for i in range(100))
+        user_ids = list(User.objects.values_list('id', flat=True))
+        VillaReport.objects.bulk_create(
+            (
+                VillaReport(
+                    user_id=user_ids[i % len(user_ids)], title=f'Report {i}', description='Benchmark',
+                    location='Pool', report_type='pool',
+                )
+                for i in range(self.options['reports'])
+            ),
+            batch_size=5_000,
+        )
+        self.user_ids = user_ids
+
+    def run_load(self):
+        stop = threading.Event()
+        read_times, write_times, errors = [], [], []
+
+        def reader(index):
+            user_id = self.user_ids[index % len(self.user_ids)]
+            try:
+                while not stop.is_set():
+                    started = time.perf_counter()
+                    # What the owner dashboard reads
+                    VillaReport.objects.filter(user_id=user_id).status_summary()
+                    list(VillaReport.objects.filter(user_id=user_id)[:5])
+                    read_times.append((time.perf_counter() - started) * 1000)
+            except OperationalError as exc:
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        def writer(index):
+            try:
+                while not stop.is_set():
+                    started = time.perf_counter()
+                    try:
+                        with transaction.atomic():
+                            Contact.objects.create(name=f'Writer {index}', email='bench@example.com', message='Hi')
+                    except OperationalError as exc:
+                        errors.append(exc)
+                        continue
+                    write_times.append((time.perf_counter() - started) * 1000)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=reader, args=(i,)) for i in range(self.options['readers'])]
+        threads += [threading.Thread(target=writer, args=(i,)) for i in range(self.options['writers'])]
+        for thread in threads:
+            thread.start()
+        time.sleep(self.options['duration'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        duration = self.options['duration']
+        return {
+            'reads_per_s': len(read_times) / duration,
+            'writes_per_s': len(write_times) / duration,
+            'read_p95': percentile(read_times, 95),
+            'write_p95': percentile(write_times, 95),
+            'write_p99': percentile(write_times, 99),
+            'errors': len(errors),
+        }
+
+
+def percentile(values, pct):
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100)[pct - 1]
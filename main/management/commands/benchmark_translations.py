@@ -0,0 +1,89 @@
+import re
+import statistics
+import time
+
+from django import template
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.template import engines
+from django.test import RequestFactory
+from main.forms import ContactForm, ReviewForm
+from main.templatetags.translation_tags import ITALIAN, get_catalogue
+
+# Loaded by the "per-call dict" variant as {% load legacy_translation_tags %}
+register = template.Library()
+
+
+@register.simple_tag
+def legacy_get_translation(text, language='it'):
+    # Stand-in for the old tag, which built its dictionary literal on every call
+    translations = dict(ITALIAN)
+    return translations.get(text, text)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark home.html rendering with the per-call translation dict, the compiled catalogue and {% translateblock %}'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--renders', type=int, default=300, help='Renders per variant')
+
+    def handle(self, *args, **options):
+        engine = engines['django'].engine
+        engine.template_libraries['legacy_translation_tags'] = register
+        source = engine.find_template('main/home.html')[0].source
+
+        # home.html hardcodes its Italian text; put each catalogue string back
+        # through the translation machinery to get a realistic call count
+        msgids = {translation: msgid for msgid, translation in ITALIAN.items() if msgid != translation}
+        pattern = re.compile(
+            r'>(\s*)(' + '|'.join(re.escape(text) for text in sorted(msgids, key=len, reverse=True)) + r')(\s*)<'
+        )
+
+        def rewrite(replacement):
+            return pattern.sub(lambda m: f'>{m.group(1)}{replacement(msgids[m.group(2)])}{m.group(3)}<', source)
+
+        calls = len(pattern.findall(source))
+        body_start = source.index('<body>')
+        block = rewrite(lambda msgid: f'[[{msgid}]]')
+        variants = {
+            'hardcoded text (as shipped)': source,
+            'per-call dict': rewrite(lambda msgid: f'{{% legacy_get_translation "{msgid}" %}}').replace(
+                '{% load translation_tags %}', '{% load translation_tags legacy_translation_tags %}'),
+            'compiled catalogue': rewrite(lambda msgid: f'{{% get_translation "{msgid}" %}}'),
+            'translateblock': (
+                block[:body_start] + '{% translateblock %}' + block[body_start:].replace(
+                    '</body>', '{% endtranslateblock %}</body>')
+            ),
+        }
+
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        context = {
+            'reviews': [], 'packages': [], 'contact_form': ContactForm(), 'review_form': ReviewForm(),
+            'fragment_cache_timeout': 0,
+        }
+        get_catalogue.cache_clear()
+        expected = None
+        self.stdout.write(f'{calls} translatable strings in home.html, {options["renders"]} renders per variant\n')
+        for label, variant in variants.items():
+            compiled = engines['django'].from_string(variant)
+            html = compiled.render(context, request)
+            if expected is None:
+                expected = normalize(html)
+            elif normalize(html) != expected:
+                self.stdout.write(self.style.WARNING(f'{label}: output differs from home.html'))
+            timings = []
+            for i in range(options['renders']):
+                started = time.perf_counter()
+                compiled.render(context, request)
+                timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(
+                f'{label:<30} median {statistics.median(timings):6.2f}ms  '
+                f'p95 {statistics.quantiles(timings, n=20)[-1]:6.2f}ms'
+            )
+
+
+def normalize(html):
+    # Apostrophes come out escaped from simple tags and CSRF tokens differ per render
+    html = html.replace('&#x27;', "'")
+    return re.sub(r'name="csrfmiddlewaretoken" value="[^"]+"', '', html)
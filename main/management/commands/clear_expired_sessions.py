@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from main.sessions import delete_expired_sessions, prune_session_cache
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete expired sessions in small batches and prune expired session cache files '
+        '(run nightly instead of clearsessions)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Sessions deleted per transaction (default 1000)')
+        parser.add_argument('--sleep', type=float, default=0,
+                            help='Seconds to pause between batches, to leave room for other writers')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        started = time.perf_counter()
+        deleted = delete_expired_sessions(options['batch_size'], options['sleep'])
+        pruned = prune_session_cache()
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted} expired sessions and {pruned} expired cache entries '
+            f'in {time.perf_counter() - started:.1f}s'
+        ))
@@ -0,0 +1,55 @@
+import io
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from main.models import VillaReport
+from main.reports_io import FORMATS, STATUSES, export_rows, write_rows
+
+
+class Command(BaseCommand):
+    help = 'Export villa reports to a CSV or JSON lines file, streaming in constant memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help="Output file, or '-' for standard output (default)")
+        parser.add_argument('--format', choices=sorted(set(FORMATS.values())),
+                            help='File format (default: from the file extension, csv for standard output)')
+        parser.add_argument('--user', help='Only reports owned by this username')
+        parser.add_argument('--status', choices=sorted(STATUSES), help='Only reports with this status')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched from the database at a time')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or FORMATS.get(os.path.splitext(path)[1].lower(), 'csv' if path == '-' else None)
+        if fmt is None:
+            raise CommandError('Cannot tell the format from the file name; pass --format')
+
+        reports = VillaReport.objects.all()
+        if options['user']:
+            reports = reports.filter(user__username=options['user'])
+        if options['status']:
+            reports = reports.filter(status=options['status'])
+
+        started = time.perf_counter()
+        if path != '-':
+            file = open(path, 'w', encoding='utf-8', newline='')
+        elif getattr(self.stdout, 'buffer', None) is not None:
+            # Encode straight into the stream under self.stdout (a terminal or pipe)
+            file = io.TextIOWrapper(self.stdout.buffer, encoding='utf-8', newline='', write_through=False)
+        else:
+            # A text-only stream, e.g. call_command(stdout=StringIO())
+            self.stdout.ending = ''
+            file = self.stdout
+        try:
+            count = write_rows(export_rows(reports, options['chunk_size']), file, fmt)
+        finally:
+            if path != '-':
+                file.close()
+            elif isinstance(file, io.TextIOWrapper):
+                file.flush()
+                file.detach()
+            else:
+                file.flush()
+        # Progress goes to stderr so it never mixes with exported data
+        elapsed = time.perf_counter() - started
+        self.stderr.write(f'Exported {count} reports in {elapsed:.1f}s ({count / max(elapsed, 1e-9):.0f}/s)')
@@ -0,0 +1,70 @@
+import io
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from main.counters import rebuild_report_counts
+from main.sla import rebuild_rollups
+from main.transitions import backfill_transitions
+from main.reports_io import FORMATS, ReportImporter, RowError, read_rows
+from main.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Import villa reports from a CSV or JSON lines file (as written by export_reports)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for standard input")
+        parser.add_argument('--format', choices=sorted(set(FORMATS.values())),
+                            help='File format (default: from the file extension)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Reports saved per transaction')
+        parser.add_argument('--create-users', action='store_true',
+                            help='Create owners that do not exist yet (with unusable passwords)')
+        parser.add_argument('--skip-invalid', action='store_true',
+                            help='Skip invalid rows instead of stopping at the first one')
+        parser.add_argument('--no-rebuild', action='store_true',
+                            help='Do not rebuild report counters, SLA rollups, status history and the search index afterwards')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or FORMATS.get(os.path.splitext(path)[1].lower())
+        if fmt is None:
+            raise CommandError('Cannot tell the format from the file name; pass --format')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        importer = ReportImporter(
+            batch_size=options['batch_size'], create_users=options['create_users'],
+            skip_invalid=options['skip_invalid'], progress=self.progress,
+        )
+        if path == '-':
+            file = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8-sig', newline='')
+        else:
+            try:
+                file = open(path, encoding='utf-8-sig', newline='')
+            except OSError as exc:
+                raise CommandError(f'Cannot read {path}: {exc}')
+        try:
+            with file:
+                importer.run(read_rows(file, fmt))
+        except RowError as exc:
+            raise CommandError(f'{exc} ({importer.imported} reports imported before it)')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {importer.imported} reports ({importer.rate:.0f}/s), '
+            f'created {importer.users_created} users, skipped {importer.skipped} rows'
+        ))
+
+        if importer.imported and not options['no_rebuild']:
+            # bulk_create sends no signals, so derived data is rebuilt once here
+            started = time.perf_counter()
+            rebuild_report_counts()
+            rebuild_rollups()
+            backfill_transitions()
+            get_search_backend().rebuild()
+            self.stdout.write(
+                f'Rebuilt report counters, SLA rollups, status history and search index ({time.perf_counter() - started:.1f}s)'
+            )
+
+    def progress(self, importer):
+        self.stdout.write(f'{importer.imported} reports imported ({importer.rate:.0f}/s)')
@@ -0,0 +1,45 @@
+import time
+from io import BytesIO
+from urllib.request import urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+from main.images import ingest
+
+# Source images behind the {% responsive_image %} tags in home.html
+HOME_IMAGES = {
+    'home/villa-1': 'https://images.unsplash.com/photo-1613490493576-7fde63acd811?auto=format&fit=crop&w=2071&q=80',
+    'home/villa-2': 'https://images.unsplash.com/photo-1600596542815-ffad4c1539a9?auto=format&fit=crop&w=2070&q=80',
+    'home/villa-3': 'https://images.unsplash.com/photo-1600607687939-ce8a6c25118c?auto=format&fit=crop&w=2053&q=80',
+    'home/about': 'https://images.unsplash.com/photo-1600585154340-be6161a56a0c?auto=format&fit=crop&w=2070&q=80',
+}
+
+
+class Command(BaseCommand):
+    help = 'Ingest source images into MEDIA_ROOT and generate their responsive derivatives'
+
+    def add_arguments(self, parser):
+        parser.add_argument('images', nargs='*', metavar='NAME=SOURCE', help='Image name and a file path or URL')
+        parser.add_argument('--home', action='store_true', help='Ingest the images used by the home page')
+
+    def handle(self, *args, **options):
+        images = dict(HOME_IMAGES) if options['home'] else {}
+        for item in options['images']:
+            name, sep, source = item.partition('=')
+            if not sep:
+                raise CommandError(f'Expected NAME=SOURCE, got {item!r}')
+            images[name] = source
+        if not images:
+            raise CommandError('Nothing to ingest: pass NAME=SOURCE arguments or --home')
+
+        for name, source in images.items():
+            started = time.perf_counter()
+            if source.startswith(('http://', 'https://')):
+                with urlopen(source, timeout=30) as response:
+                    source = BytesIO(response.read())
+            manifest = ingest(name, source)
+            self.stdout.write(
+                f"{name}: {manifest['width']}x{manifest['height']}, "
+                f"{len(manifest['widths'])} widths x {', '.join(manifest['formats'])} "
+                f"({time.perf_counter() - started:.1f}s)"
+            )
+        self.stdout.write(self.style.SUCCESS(f'Ingested {len(images)} images'))
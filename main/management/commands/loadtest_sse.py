@@ -0,0 +1,163 @@
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from main.events import broker
+from main.models import Comment, VillaReport
+
+
+class Command(BaseCommand):
+    help = 'Hold thousands of idle report event streams open and measure memory and fan-out latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=2000, help='Concurrent event streams')
+        parser.add_argument('--reports', type=int, default=20, help='Reports the streams are spread over')
+        parser.add_argument('--idle', type=float, default=5.0, help='Seconds to hold the streams idle')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('This load test only supports SQLite')
+        self.options = options
+
+        # No ASGI server is needed: the streams are driven through
+        # villacare.asgi.application in-process, on a throwaway database
+        old_name = connection.settings_dict['NAME']
+        workdir = tempfile.mkdtemp()
+        connection.settings_dict['TEST']['NAME'] = str(Path(workdir) / 'loadtest.sqlite3')
+        try:
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            cookie = self.seed()
+            asyncio.run(self.run_load(cookie))
+        finally:
+            connection.close()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def seed(self):
+        self.owner = User.objects.create_user('loadtest', password='loadtest')
+        self.report_ids = [
+            VillaReport.objects.create(
+                user=self.owner, title=f'Report {i}', description='Load test', location='Pool', report_type='pool',
+            ).id
+            for i in range(self.options['reports'])
+        ]
+        client = Client()
+        client.force_login(self.owner)
+        return f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+
+    async def run_load(self, cookie):
+        from villacare.asgi import application
+
+        total = self.options['connections']
+        streams = [Stream(self.report_ids[i % len(self.report_ids)], cookie) for i in range(total)]
+
+        baseline = rss()
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(stream.run(application)) for stream in streams]
+        await asyncio.gather(*(stream.ready.wait() for stream in streams))
+        connect_time = time.perf_counter() - started
+        failed = sum(stream.status != 200 for stream in streams)
+        if failed == total:
+            raise CommandError(f'No stream connected (HTTP {streams[0].status})')
+        await asyncio.sleep(self.options['idle'])
+        per_connection = (rss() - baseline) / total
+
+        # One comment and one status change on the first report; every
+        # stream subscribed to it should see both within a poll interval
+        report_id = self.report_ids[0]
+        watching = [stream for stream in streams if stream.report_id == report_id]
+        created = time.perf_counter()
+        await sync_to_async(self.make_changes)(report_id)
+        await asyncio.wait_for(
+            asyncio.gather(*(stream.changed.wait() for stream in watching)),
+            timeout=settings.SSE_POLL_INTERVAL * 10,
+        )
+        latencies = sorted((stream.changed_at - created) * 1000 for stream in watching)
+
+        for stream in streams:
+            stream.disconnect.set()
+        await asyncio.gather(*tasks)
+        leaked = broker.subscriber_count()
+        await broker.close()
+
+        self.stdout.write(f'Connections:            {total} over {len(self.report_ids)} reports ({failed} failed)')
+        self.stdout.write(f'Connect time:           {connect_time:.2f}s ({total / connect_time:.0f} streams/s)')
+        self.stdout.write(f'Memory per connection:  {per_connection:.1f} KiB (RSS growth)')
+        self.stdout.write(
+            f'Fan-out latency:        p50 {statistics.median(latencies):.0f}ms, '
+            f'p95 {latencies[int(len(latencies) * 0.95) - 1]:.0f}ms, max {latencies[-1]:.0f}ms '
+            f'to {len(watching)} streams (poll interval {settings.SSE_POLL_INTERVAL}s)'
+        )
+        self.stdout.write(f'Subscribers after close: {leaked}')
+        if leaked:
+            raise CommandError(f'{leaked} subscribers were not cleaned up')
+
+    def make_changes(self, report_id):
+        report = VillaReport.objects.get(id=report_id)
+        Comment.objects.create(villa_report=report, user=self.owner, comment='Load test comment')
+        report.status = 'in_progress'
+        report.save()
+
+
+def rss():
+    """Resident set size in KiB (Linux)."""
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024
+
+
+class Stream:
+    """One EventSource-like client speaking ASGI directly to the application."""
+
+    def __init__(self, report_id, cookie):
+        self.report_id = report_id
+        self.cookie = cookie.encode()
+        self.status = None
+        self.ready = asyncio.Event()
+        self.changed = asyncio.Event()
+        self.changed_at = None
+        self.disconnect = asyncio.Event()
+        self.events = set()
+        self.requested = False
+
+    async def run(self, application):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': f'/villa-report/{self.report_id}/events/', 'raw_path': b'',
+            'query_string': b'after=0', 'root_path': '', 'server': ('localhost', 80),
+            'client': ('127.0.0.1', 50000),
+            'headers': [(b'host', b'localhost'), (b'accept', b'text/event-stream'), (b'cookie', self.cookie)],
+        }
+        await application(scope, self.receive, self.send)
+        self.ready.set()
+
+    async def receive(self):
+        if not self.requested:
+            self.requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await self.disconnect.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        if message['type'] == 'http.response.start':
+            self.status = message['status']
+            if self.status != 200:
+                self.ready.set()
+            return
+        for chunk in message.get('body', b'').decode().split('\n\n'):
+            if chunk.startswith('event: status'):
+                self.ready.set()
+                if '"in_progress"' in chunk:
+                    self.events.add('status')
+            elif chunk.startswith('event: comment'):
+                self.events.add('comment')
+        if self.events == {'comment', 'status'} and not self.changed.is_set():
+            self.changed_at = time.perf_counter()
+            self.changed.set()
@@ -0,0 +1,62 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from main.perf import query_budget, read_records, summarize
+
+
+class Command(BaseCommand):
+    help = 'Summarize the request timings recorded by main.perf.PerfMiddleware, per view'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', help='Perf log to read (default: PERF_LOG_FILE)')
+        parser.add_argument('--since', type=float, metavar='MINUTES', help='Only requests from the last MINUTES')
+        parser.add_argument('--view', help='Only views whose name contains this text')
+        parser.add_argument('--min-requests', type=int, default=1, help='Hide views with fewer sampled requests')
+        parser.add_argument('--check', action='store_true',
+                            help='Exit with an error if any view went over its query budget')
+
+    def handle(self, *args, **options):
+        since = time.time() - options['since'] * 60 if options['since'] else None
+        records = read_records(options['log'], since=since)
+        if options['view']:
+            records = (record for record in records if options['view'] in record['view'])
+        summary = [entry for entry in summarize(records) if entry['requests'] >= options['min_requests']]
+        if not summary:
+            self.stdout.write(f"No requests recorded in {options['log'] or settings.PERF_LOG_FILE}")
+            return
+
+        self.stdout.write(
+            f"{'View':<44}{'reqs':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+            f"{'queries':>9}{'max q':>7}{'budget':>7}{'db p95':>8}{'tpl p95':>9}{'KB p50':>8}"
+        )
+        over_budget = []
+        for entry in summary:
+            budget = query_budget(entry['view'])
+            max_queries = entry['queries']['max']
+            over = max_queries is not None and max_queries > budget
+            if over:
+                over_budget.append(entry['view'])
+            size = entry['bytes'][50]
+            line = (
+                f"{entry['view'][:43]:<44}{entry['requests']:>6}"
+                f"{format_ms(entry['wall_ms'][50]):>9}{format_ms(entry['wall_ms'][95]):>9}"
+                f"{format_ms(entry['wall_ms'][99]):>9}{format_count(entry['queries'][50]):>9}"
+                f"{format_count(max_queries):>7}{budget:>7}{format_ms(entry['query_ms'][95]):>8}"
+                f"{format_ms(entry['template_ms'][95]):>9}{'-' if size is None else f'{size / 1024:.1f}':>8}"
+            )
+            self.stdout.write(self.style.ERROR(line) if over else line)
+
+        if over_budget:
+            message = f"{len(over_budget)} view(s) over their query budget: {', '.join(over_budget)}"
+            if options['check']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+
+
+def format_ms(value):
+    return '-' if value is None else f'{value:.1f}'
+
+
+def format_count(value):
+    return '-' if value is None else str(value)
@@ -0,0 +1,46 @@
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from main.scheduling import plan_week, week_start_for
+
+
+class Command(BaseCommand):
+    help = 'Plan open villa reports into technician visits for a week (main.scheduling)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--week', help='Any day of the week to plan, as YYYY-MM-DD (default: this week)')
+        parser.add_argument('--apply', action='store_true',
+                            help='Save technicians and scheduled dates (default: only print the plan)')
+
+    def handle(self, *args, **options):
+        week_start = None
+        if options['week']:
+            try:
+                week_start = week_start_for(date.fromisoformat(options['week']))
+            except ValueError:
+                raise CommandError('--week must be a date as YYYY-MM-DD')
+        plan = plan_week(week_start, apply=options['apply'])
+        if not plan.slots:
+            raise CommandError('No active technician works on the remaining days of that week')
+
+        assignments = plan.assignments()
+        self.stdout.write(f"{'Technician':<24}{'Day':<12}{'Jobs':>6}{'Villas':>8}{'Hours':>8}{'Load':>7}")
+        for slot in sorted(plan.slots.values(), key=lambda slot: (slot.technician.name, slot.day)):
+            jobs = sum(len(jobs) for jobs in slot.villas.values())
+            if jobs:
+                self.stdout.write(
+                    f'{slot.technician.name[:23]:<24}{slot.day.isoformat():<12}{jobs:>6}{len(slot.villas):>8}'
+                    f'{slot.used / 60:>8.1f}{slot.used / slot.capacity:>7.0%}'
+                )
+        visits = sum(len(slot.villas) for slot in plan.slots.values())
+        saved = (len(assignments) - visits) * settings.SCHEDULE_TRAVEL_MINUTES / 60
+        self.stdout.write(
+            f'Week of {plan.week_start}: {len(assignments)} reports in {visits} villa visits '
+            f'({saved:.1f} travel hours saved by grouping), {len(plan.unscheduled)} left unscheduled; '
+            f'solved in {plan.solve_seconds:.2f}s'
+        )
+        if options['apply']:
+            self.stdout.write(self.style.SUCCESS('Plan saved'))
+        else:
+            self.stdout.write('Dry run: pass --apply to save the plan')
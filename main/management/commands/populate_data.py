@@ -1,11 +1,82 @@
-from django.core.management.base import BaseCommand
+import random
+import time
+from array import array
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
+from django.db import transaction
+from main.counters import rebuild_report_counts
+from main.sla import rebuild_rollups
+from main.transitions import backfill_transitions
 from main.models import Package, Review, UserProfile, VillaReport, Comment
+from main.reports_io import keep_created_at
+from main.search import get_search_backend
 from django.utils import timezone
 
+# Synthetic users created with --users; they can log in with SYNTHETIC_PASSWORD
+SYNTHETIC_USER_PREFIX = 'loaduser'
+SYNTHETIC_PASSWORD = 'loadtest123'
+
+SAMPLE_REPORTS = [
+    {
+        'report_type': 'maintenance',
+        'priority': 'high',
+        'title': 'Air Conditioning Not Working',
+        'description': 'The AC unit in the master bedroom is not cooling properly. It makes strange noises and only blows warm air.',
+        'location': 'Master Bedroom',
+        'status': 'in_progress'
+    },
+    {
+        'report_type': 'cleaning',
+        'priority': 'medium',
+        'title': 'Deep Clean Request',
+        'description': 'Need a deep cleaning service for the entire villa, especially the kitchen and bathrooms.',
+        'location': 'Entire Villa',
+        'status': 'pending'
+    },
+    {
+        'report_type': 'pool',
+        'priority': 'low',
+        'title': 'Pool Maintenance',
+        'description': 'Regular pool maintenance and chemical balance check needed.',
+        'location': 'Pool Area',
+        'status': 'completed'
+    }
+]
+
+SAMPLE_COMMENTS = [
+    {
+        'report_title': 'Air Conditioning Not Working',
+        'comment': 'Thank you for creating this report. The AC has been making strange noises for a few days now.',
+        'is_admin_comment': False
+    },
+    {
+        'report_title': 'Air Conditioning Not Working',
+        'comment': 'We have scheduled a technician to visit tomorrow at 10 AM. They will check the AC unit and provide a solution.',
+        'is_admin_comment': True
+    },
+    {
+        'report_title': 'Deep Clean Request',
+        'comment': 'The villa needs a thorough cleaning, especially the kitchen and bathrooms.',
+        'is_admin_comment': False
+    }
+]
+
 
 class Command(BaseCommand):
-    help = 'Populate the database with sample data'
+    help = 'Populate the database with sample data, optionally plus synthetic data at scale'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=0,
+                            help=f'Synthetic users to add ({SYNTHETIC_USER_PREFIX}N, password {SYNTHETIC_PASSWORD!r})')
+        parser.add_argument('--reports', type=int, default=0, help='Synthetic villa reports to add, spread over the synthetic users')
+        parser.add_argument('--comments', type=int, default=0, help='Synthetic comments to add to the synthetic reports')
+        parser.add_argument('--batch-size', type=int, default=10_000, help='Rows per bulk_create')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed, so runs at the same scale match')
+        parser.add_argument('--no-index', action='store_true',
+                            help='Skip rebuilding the search index after adding synthetic data')
 
     def handle(self, *args, **options):
         # Create sample packages
@@ -140,35 +211,7 @@ class Command(BaseCommand):
                 )
             
             # Create sample villa reports
-            villa_reports_data = [
-                {
-                    'user': test_user,
-                    'report_type': 'maintenance',
-                    'priority': 'high',
-                    'title': 'Air Conditioning Not Working',
-                    'description': 'The AC unit in the master bedroom is not cooling properly. It makes strange noises and only blows warm air.',
-                    'location': 'Master Bedroom',
-                    'status': 'in_progress'
-                },
-                {
-                    'user': test_user,
-                    'report_type': 'cleaning',
-                    'priority': 'medium',
-                    'title': 'Deep Clean Request',
-                    'description': 'Need a deep cleaning service for the entire villa, especially the kitchen and bathrooms.',
-                    'location': 'Entire Villa',
-                    'status': 'pending'
-                },
-                {
-                    'user': test_user,
-                    'report_type': 'pool',
-                    'priority': 'low',
-                    'title': 'Pool Maintenance',
-                    'description': 'Regular pool maintenance and chemical balance check needed.',
-                    'location': 'Pool Area',
-                    'status': 'completed'
-                }
-            ]
+            villa_reports_data = [{'user': test_user, **report_data} for report_data in SAMPLE_REPORTS]
             
             for report_data in villa_reports_data:
                 report, created = VillaReport.objects.get_or_create(
@@ -186,25 +229,15 @@ class Command(BaseCommand):
                     )
             
             # Create sample comments
+            staff_user = User.objects.filter(is_staff=True).first()
             comments_data = [
                 {
-                    'villa_report': VillaReport.objects.filter(title='Air Conditioning Not Working').first(),
-                    'user': test_user,
-                    'comment': 'Thank you for creating this report. The AC has been making strange noises for a few days now.',
-                    'is_admin_comment': False
-                },
-                {
-                    'villa_report': VillaReport.objects.filter(title='Air Conditioning Not Working').first(),
-                    'user': User.objects.filter(is_staff=True).first(),
-                    'comment': 'We have scheduled a technician to visit tomorrow at 10 AM. They will check the AC unit and provide a solution.',
-                    'is_admin_comment': True
-                },
-                {
-                    'villa_report': VillaReport.objects.filter(title='Deep Clean Request').first(),
-                    'user': test_user,
-                    'comment': 'The villa needs a thorough cleaning, especially the kitchen and bathrooms.',
-                    'is_admin_comment': False
+                    'villa_report': VillaReport.objects.filter(title=comment_data['report_title']).first(),
+                    'user': staff_user if comment_data['is_admin_comment'] else test_user,
+                    'comment': comment_data['comment'],
+                    'is_admin_comment': comment_data['is_admin_comment'],
                 }
+                for comment_data in SAMPLE_COMMENTS
             ]
             
             for comment_data in comments_data:
@@ -232,3 +265,103 @@ class Command(BaseCommand):
         self.stdout.write(
             self.style.SUCCESS('Successfully populated database with sample data!')
         )
+
+        if options['users'] or options['reports'] or options['comments']:
+            self.add_synthetic_data(options)
+
+    def add_synthetic_data(self, options):
+        """Bulk-create synthetic users, reports and comments modelled on the samples above.
+
+        The same seed and scale produce the same data, so benchmark runs on
+        different commits compare like with like. bulk_create skips the
+        signals, so report counters, SLA rollups, status history and the search
+        index are rebuilt at the end.
+        """
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        started = time.perf_counter()
+
+        existing = User.objects.filter(username__startswith=SYNTHETIC_USER_PREFIX).count()
+        password = make_password(SYNTHETIC_PASSWORD)
+        for offset in range(0, options['users'], batch_size):
+            with transaction.atomic():
+                users = User.objects.bulk_create([
+                    User(
+                        username=f'{SYNTHETIC_USER_PREFIX}{n}', email=f'{SYNTHETIC_USER_PREFIX}{n}@example.com',
+                        first_name='Load', last_name=f'Tester {n}', password=password,
+                    )
+                    for n in range(existing + offset, existing + min(offset + batch_size, options['users']))
+                ])
+                UserProfile.objects.bulk_create([
+                    UserProfile(user=user, villa_address=f'{rng.randint(1, 400)} Villa Road', villa_type='Synthetic Villa')
+                    for user in users
+                ])
+        if options['users']:
+            self.stdout.write(f"Added {options['users']} synthetic users")
+
+        user_ids = list(
+            User.objects.filter(username__startswith=SYNTHETIC_USER_PREFIX).order_by('id').values_list('id', flat=True)
+        )
+        if options['reports'] and not user_ids:
+            raise CommandError('Synthetic reports need synthetic users; pass --users')
+        statuses = [value for value, label in VillaReport.STATUS_CHOICES]
+        now = timezone.now()
+        with keep_created_at():
+            for offset in range(0, options['reports'], batch_size):
+                reports = []
+                for i in range(offset, min(offset + batch_size, options['reports'])):
+                    sample = rng.choice(SAMPLE_REPORTS)
+                    user_id, status = rng.choice(user_ids), rng.choice(statuses)
+                    reports.append(VillaReport(**{
+                        **sample,
+                        'user_id': user_id,
+                        'title': f"{sample['title']} #{i}",
+                        'status': status,
+                        'created_at': now - timedelta(minutes=rng.randint(0, 365 * 24 * 60)),
+                        # bulk_create skips the signal that stamps it
+                        'completed_date': now if status == 'completed' else None,
+                    }))
+                with transaction.atomic():
+                    VillaReport.objects.bulk_create(reports)
+                self.progress('reports', offset + len(reports), options['reports'], batch_size)
+
+        if options['comments']:
+            # Two flat arrays instead of a million tuples
+            report_ids, owner_ids = array('q'), array('q')
+            for report_id, owner_id in (
+                VillaReport.objects.filter(user__username__startswith=SYNTHETIC_USER_PREFIX)
+                .order_by('id').values_list('id', 'user_id').iterator(chunk_size=batch_size)
+            ):
+                report_ids.append(report_id)
+                owner_ids.append(owner_id)
+            if not report_ids:
+                raise CommandError('Synthetic comments need synthetic reports; pass --reports')
+            staff_ids = list(User.objects.filter(is_staff=True).values_list('id', flat=True)) or [user_ids[0]]
+            for offset in range(0, options['comments'], batch_size):
+                comments = []
+                for i in range(offset, min(offset + batch_size, options['comments'])):
+                    index = rng.randrange(len(report_ids))
+                    sample = rng.choice(SAMPLE_COMMENTS)
+                    comments.append(Comment(
+                        villa_report_id=report_ids[index], comment=sample['comment'],
+                        user_id=rng.choice(staff_ids) if sample['is_admin_comment'] else owner_ids[index],
+                        is_admin_comment=sample['is_admin_comment'],
+                    ))
+                with transaction.atomic():
+                    Comment.objects.bulk_create(comments)
+                self.progress('comments', offset + len(comments), options['comments'], batch_size)
+
+        rebuild_report_counts()
+        rebuild_rollups()
+        backfill_transitions()
+        if not options['no_index']:
+            get_search_backend().rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Added synthetic data in {time.perf_counter() - started:.1f}s'
+        ))
+
+    def progress(self, name, done, total, batch_size):
+        # About ten lines per table
+        step = max(total // 10, batch_size)
+        if done == total or done // step != (done - batch_size) // step:
+            self.stdout.write(f'{done}/{total} {name}')
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from main.attachments import process
+from main.models import Attachment
+
+
+class Command(BaseCommand):
+    help = 'Strip metadata and build thumbnails for attachments left pending (e.g. after a restart)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--failed', action='store_true', help='Also retry attachments that failed')
+
+    def handle(self, *args, **options):
+        statuses = ['pending', 'failed'] if options['failed'] else ['pending']
+        ids = list(Attachment.objects.filter(status__in=statuses).values_list('id', flat=True))
+        for attachment_id in ids:
+            process(attachment_id)
+        ready = Attachment.objects.filter(id__in=ids, status='ready').count()
+        self.stdout.write(self.style.SUCCESS(f'Processed {len(ids)} attachments ({ready} ready)'))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from main.counters import find_drift, find_tally_drift, rebuild_report_counts
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the per-user report counters on UserProfile and the site-wide ReportTally rows, '
+        'or verify them with --verify'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Only report counters that disagree with the reports table; exit with an error if any do',
+        )
+
+    def handle(self, *args, **options):
+        if not options['verify']:
+            fixed = rebuild_report_counts()
+            self.stdout.write(self.style.SUCCESS(f'Report counters rebuilt ({fixed} profiles and tallies updated)'))
+            return
+
+        stale, missing = find_drift()
+        tallies = find_tally_drift()
+        for profile in stale:
+            self.stdout.write(f'user {profile.user_id}: counters out of date')
+        for user_id in missing:
+            self.stdout.write(f'user {user_id}: has reports but no profile')
+        for key in tallies:
+            self.stdout.write(f'tally {key}: out of date')
+        if stale or missing:
+            raise CommandError(
+                f'{len(stale) + len(missing)} users have wrong report counters; '
+                f'run rebuild_report_counters to fix them'
+            )
+        if tallies:
+            raise CommandError(f'{len(tallies)} report tallies are wrong; run rebuild_report_counters to fix them')
+        self.stdout.write(self.style.SUCCESS('Report counters are correct'))
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from main.sla import find_drift, months_back, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the monthly SLA rollups from the reports table (run nightly), '
+        'or verify them with --verify'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int,
+                            help='Only the last N months of reports (default: all of them)')
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Only report rollups that disagree with the reports table; exit with an error if any do',
+        )
+
+    def handle(self, *args, **options):
+        start = None
+        if options['months'] is not None:
+            if options['months'] < 1:
+                raise CommandError('--months must be positive')
+            start = months_back(options['months'])
+
+        started = time.perf_counter()
+        if not options['verify']:
+            fixed = rebuild_rollups(start)
+            self.stdout.write(self.style.SUCCESS(
+                f'SLA rollups rebuilt ({fixed} rows updated) in {time.perf_counter() - started:.1f}s'
+            ))
+            return
+
+        stale, missing = find_drift(start)
+        for row in stale:
+            self.stdout.write(f'{row}: totals out of date')
+        for row in missing:
+            self.stdout.write(f'{row}: missing')
+        if stale or missing:
+            raise CommandError(
+                f'{len(stale) + len(missing)} SLA rollup rows are wrong; run rollup_sla to fix them'
+            )
+        self.stdout.write(self.style.SUCCESS('SLA rollups are correct'))
@@ -0,0 +1,111 @@
+import multiprocessing
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.utils import timezone
+from main.tasks import claim, heartbeat, purge_finished, requeue_stale, run, task_stats, worker_name
+
+
+class Command(BaseCommand):
+    help = 'Run queued background tasks (main.tasks) on a thread or process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=settings.TASK_WORKER_CONCURRENCY,
+                            help='Tasks run at the same time')
+        parser.add_argument('--pool', choices=['thread', 'process'], default='thread',
+                            help='Threads suit I/O-bound tasks (email, HTTP); processes suit CPU-bound ones')
+        parser.add_argument('--poll-interval', type=float, default=settings.TASK_POLL_INTERVAL,
+                            help='Seconds between checks for due tasks when idle')
+        parser.add_argument('--once', action='store_true', help='Exit when no task is due')
+        parser.add_argument('--stats', action='store_true',
+                            help='Print per-task counts and timings for the last day and exit')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.print_stats()
+            return
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency must be positive')
+
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        name = worker_name()
+        requeued = requeue_stale()
+        if requeued:
+            self.stdout.write(f'Gave up on {requeued} tasks left running by a stopped worker')
+        self.stdout.write(f"Worker {name}: {options['concurrency']} {options['pool']}s")
+
+        concurrency = options['concurrency']
+        if options['pool'] == 'process':
+            # spawn, so children never inherit this process's database connections
+            executor = ProcessPoolExecutor(
+                concurrency, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup,
+            )
+        else:
+            executor = ThreadPoolExecutor(concurrency, thread_name_prefix='task')
+
+        running = {}
+        completed = 0
+        next_heartbeat = next_purge = time.monotonic()
+        with executor:
+            while not self.stopping:
+                if time.monotonic() >= next_heartbeat:
+                    # Keeps this worker's long tasks from counting as abandoned,
+                    # and gives up on other workers' silent or overrunning ones
+                    heartbeat(running.values())
+                    requeue_stale()
+                    next_heartbeat = time.monotonic() + settings.TASK_HEARTBEAT_INTERVAL
+                if time.monotonic() >= next_purge:
+                    purge_finished()
+                    next_purge = time.monotonic() + 3600
+                claimed = claim(concurrency - len(running), name) if len(running) < concurrency else []
+                for task_id in claimed:
+                    running[executor.submit(run, task_id)] = task_id
+                close_old_connections()
+                if not running:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+                # Claim again as soon as a slot frees up, or after a poll interval
+                done, _ = wait(running, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                for future in done:
+                    task_id = running.pop(future)
+                    if future.exception() is not None:
+                        self.stderr.write(f'Task #{task_id} crashed the worker: {future.exception()!r}')
+                    completed += 1
+            if running:
+                self.stdout.write(f'Stopping: waiting for {len(running)} running tasks')
+                wait(running)
+                completed += len(running)
+        self.stdout.write(self.style.SUCCESS(f'Worker {name} stopped after {completed} tasks'))
+
+    def stop(self, signum, frame):
+        self.stopping = True
+
+    def print_stats(self):
+        stats = task_stats(since=timezone.now() - timedelta(days=1))
+        if not stats:
+            self.stdout.write('No tasks in the last day')
+            return
+        self.stdout.write(
+            f"{'Task':<48}{'ok':>7}{'failed':>8}{'queued':>8}{'retries':>9}"
+            f"{'p50':>9}{'p95':>9}{'max':>9}{'wait':>9}"
+        )
+        for entry in stats:
+            timings = ''.join(
+                f'{entry[key]:>7.0f}ms' if entry[key] is not None else f"{'-':>9}"
+                for key in ('p50_ms', 'p95_ms', 'max_ms', 'wait_p50_ms')
+            )
+            self.stdout.write(
+                f"{entry['name']:<48}{entry.get('succeeded', 0):>7}{entry.get('failed', 0):>8}"
+                f"{entry.get('queued', 0) + entry.get('running', 0):>8}{entry['retries']:>9}{timings}"
+            )
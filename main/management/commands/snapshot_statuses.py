@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from main.transitions import take_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        'Store how many reports are in each status (run hourly or nightly), so counts '
+        'at a past moment only aggregate the status changes since the last snapshot'
+    )
+
+    def handle(self, *args, **options):
+        moment = take_snapshot()
+        self.stdout.write(self.style.SUCCESS(f'Status counts stored as of {moment:%Y-%m-%d %H:%M:%S}'))
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_comment'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['villa_report', '-created_at'], name='comment_report_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['-created_at'], name='comment_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['is_approved', '-created_at'], name='review_approved_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='villareport',
+            index=models.Index(fields=['user', '-created_at'], name='report_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='villareport',
+            index=models.Index(fields=['user', 'status', '-created_at'], name='report_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='villareport',
+            index=models.Index(fields=['-created_at'], name='report_created_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    # Full-text search uses SQLite FTS5; other databases fall back to
+    # main.search.DatabaseSearchBackend and need no extra table.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE main_search_index USING fts5("
+        "title, body, owner, report_id UNINDEXED, "
+        "tokenize = 'porter unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    schema_editor.execute(
+        "INSERT INTO main_search_index (rowid, title, body, owner, report_id) "
+        "SELECT id * 2, title, description || char(10) || location, 'u' || user_id, id "
+        "FROM main_villareport"
+    )
+    schema_editor.execute(
+        "INSERT INTO main_search_index (rowid, title, body, owner, report_id) "
+        "SELECT c.id * 2 + 1, '', c.comment, 'u' || r.user_id, r.id "
+        "FROM main_comment c JOIN main_villareport r ON r.id = c.villa_report_id"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS main_search_index")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_report_comment_review_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
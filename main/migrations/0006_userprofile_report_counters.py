@@ -0,0 +1,61 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:01
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_counters(apps, schema_editor):
+    UserProfile = apps.get_model('main', 'UserProfile')
+    VillaReport = apps.get_model('main', 'VillaReport')
+    statuses = ['pending', 'in_progress', 'completed', 'cancelled']
+    aggregates = {'reports_total': Count('id')}
+    for status in statuses:
+        aggregates[f'reports_{status}'] = Count('id', filter=Q(status=status))
+    rows = VillaReport.objects.order_by().values('user_id').annotate(**aggregates)
+    counts = {row.pop('user_id'): row for row in rows}
+    profiles = list(UserProfile.objects.filter(user_id__in=counts))
+    for profile in profiles:
+        for field, value in counts.pop(profile.user_id).items():
+            setattr(profile, field, value)
+    UserProfile.objects.bulk_update(profiles, list(aggregates), batch_size=500)
+    # Users with reports but no profile get one, so every counter has a row
+    UserProfile.objects.bulk_create(
+        [UserProfile(user_id=user_id, **values) for user_id, values in counts.items()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='reports_cancelled',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='reports_completed',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='reports_in_progress',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='reports_pending',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='reports_total',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:14
+
+import datetime
+import django.db.models.deletion
+import main.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_notification'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Technician',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('report_types', models.JSONField(blank=True, default=list, help_text='Report types this technician handles; empty for all')),
+                ('work_days', models.JSONField(default=main.models.default_work_days, help_text='Weekdays worked, 0 = Monday')),
+                ('day_start', models.TimeField(default=datetime.time(8, 0))),
+                ('day_end', models.TimeField(default=datetime.time(17, 0))),
+                ('is_active', models.BooleanField(default=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='villareport',
+            name='technician',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reports', to='main.technician'),
+        ),
+        migrations.AddIndex(
+            model_name='villareport',
+            index=models.Index(fields=['scheduled_date'], name='report_scheduled_idx'),
+        ),
+    ]
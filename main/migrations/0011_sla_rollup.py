@@ -0,0 +1,73 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:38
+
+import datetime
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+
+def backfill_rollups(apps, schema_editor):
+    Comment = apps.get_model('main', 'Comment')
+    SLARollup = apps.get_model('main', 'SLARollup')
+    VillaReport = apps.get_model('main', 'VillaReport')
+    first_response = Subquery(
+        Comment.objects.filter(villa_report=OuterRef('pk'), is_admin_comment=True)
+        .order_by('created_at').values('created_at')[:1]
+    )
+    rows = VillaReport.objects.annotate(first_response=first_response).order_by().values_list(
+        'report_type', 'priority', 'created_at', 'status', 'completed_date', 'updated_at', 'first_response',
+    )
+    rollups = {}
+    for report_type, priority, created_at, status, completed_date, updated_at, responded_at in rows.iterator():
+        key = (timezone.localdate(created_at).replace(day=1), report_type, priority)
+        row = rollups.get(key)
+        if row is None:
+            row = rollups[key] = SLARollup(month=key[0], report_type=report_type, priority=priority)
+        row.reports += 1
+        if responded_at is not None:
+            row.responded += 1
+            row.response_time += responded_at - created_at
+            row.response_met += responded_at - created_at <= datetime.timedelta(
+                hours=settings.SLA_RESPONSE_TARGET_HOURS[priority])
+        if status == 'completed':
+            duration = (completed_date or updated_at) - created_at
+            row.completed += 1
+            row.completion_time += duration
+            row.completion_met += duration <= datetime.timedelta(hours=settings.SLA_COMPLETION_TARGET_HOURS[priority])
+        elif status == 'cancelled':
+            row.cancelled += 1
+    SLARollup.objects.bulk_create(rollups.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_technician_scheduling'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SLARollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month the reports were created in')),
+                ('report_type', models.CharField(choices=[('maintenance', 'Maintenance Issue'), ('cleaning', 'Cleaning Request'), ('security', 'Security Concern'), ('landscaping', 'Landscaping'), ('pool', 'Pool/Spa Issue'), ('emergency', 'Emergency'), ('other', 'Other')], max_length=20)),
+                ('priority', models.CharField(choices=[('low', 'Low'), ('medium', 'Medium'), ('high', 'High'), ('urgent', 'Urgent')], max_length=10)),
+                ('reports', models.IntegerField(default=0)),
+                ('responded', models.IntegerField(default=0)),
+                ('response_time', models.DurationField(default=datetime.timedelta)),
+                ('response_met', models.IntegerField(default=0)),
+                ('completed', models.IntegerField(default=0)),
+                ('completion_time', models.DurationField(default=datetime.timedelta)),
+                ('completion_met', models.IntegerField(default=0)),
+                ('cancelled', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['month', 'report_type', 'priority'],
+                'constraints': [models.UniqueConstraint(fields=('month', 'report_type', 'priority'), name='sla_rollup_unique')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
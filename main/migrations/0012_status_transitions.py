@@ -0,0 +1,54 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:51
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_transitions(apps, schema_editor):
+    # Existing reports get their creation as pending and, if they have moved
+    # on, one change to their current status
+    StatusTransition = apps.get_model('main', 'StatusTransition')
+    VillaReport = apps.get_model('main', 'VillaReport')
+    codes = {'pending': 1, 'in_progress': 2, 'completed': 3, 'cancelled': 4}
+    transitions = []
+    rows = VillaReport.objects.order_by('pk').values_list('id', 'status', 'created_at', 'completed_date', 'updated_at')
+    for report_id, status, created_at, completed_date, updated_at in rows.iterator():
+        transitions.append(StatusTransition(report_id=report_id, to_status=codes['pending'], at=created_at))
+        if status != 'pending':
+            transitions.append(StatusTransition(
+                report_id=report_id, from_status=codes['pending'], to_status=codes[status],
+                at=max(completed_date or updated_at, created_at),
+            ))
+        if len(transitions) >= 5000:
+            StatusTransition.objects.bulk_create(transitions)
+            transitions = []
+    StatusTransition.objects.bulk_create(transitions)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_sla_rollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatusTransition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.PositiveSmallIntegerField(blank=True, choices=[(1, 'Pending'), (2, 'In Progress'), (3, 'Completed'), (4, 'Cancelled')], null=True)),
+                ('to_status', models.PositiveSmallIntegerField(choices=[(1, 'Pending'), (2, 'In Progress'), (3, 'Completed'), (4, 'Cancelled')])),
+                ('at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('changed_by', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('report', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='transitions', to='main.villareport')),
+            ],
+            options={
+                'ordering': ['at', 'id'],
+                'indexes': [models.Index(fields=['report', 'at'], name='transition_report_at_idx'), models.Index(fields=['at', 'from_status', 'to_status'], name='transition_at_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_transitions, migrations.RunPython.noop),
+    ]
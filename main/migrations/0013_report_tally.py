@@ -0,0 +1,34 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:37
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_tallies(apps, schema_editor):
+    # Same keys as VillaReportQuerySet.status_summary()
+    ReportTally = apps.get_model('main', 'ReportTally')
+    VillaReport = apps.get_model('main', 'VillaReport')
+    tallies = [ReportTally(key='total', count=VillaReport.objects.count())]
+    for field in ('status', 'priority', 'report_type'):
+        rows = VillaReport.objects.order_by().values_list(field).annotate(count=Count('id'))
+        tallies += [ReportTally(key=f'{field}_{value}', count=count) for value, count in rows]
+    ReportTally.objects.bulk_create(tallies)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_status_transitions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportTally',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=50, unique=True)),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_tallies, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_notification_claims'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='statustransition',
+            name='report',
+            field=models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='transitions', to='main.villareport'),
+        ),
+        migrations.AlterField(
+            model_name='statustransition',
+            name='to_status',
+            field=models.PositiveSmallIntegerField(blank=True, choices=[(1, 'Pending'), (2, 'In Progress'), (3, 'Completed'), (4, 'Cancelled')], null=True),
+        ),
+        migrations.CreateModel(
+            name='StatusSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('at', models.DateTimeField()),
+                ('status', models.PositiveSmallIntegerField(choices=[(1, 'Pending'), (2, 'In Progress'), (3, 'Completed'), (4, 'Cancelled')])),
+                ('count', models.IntegerField()),
+            ],
+            options={
+                'ordering': ['-at', 'status'],
+                'constraints': [models.UniqueConstraint(fields=('at', 'status'), name='status_snapshot_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations
+from django.db.models import F
+
+
+def backfill_completed_date(apps, schema_editor):
+    # Reports completed before completed_date was stamped on completion were
+    # last saved when they were closed, so updated_at is their completion time
+    VillaReport = apps.get_model('main', 'VillaReport')
+    VillaReport.objects.filter(status='completed', completed_date__isnull=True).update(
+        completed_date=F('updated_at'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0015_status_history_outlives_reports'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_completed_date, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,9 @@
+import os
+import uuid
+from datetime import time, timedelta
+
 from django.db import models
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.contrib.auth.models import User
 from django.utils import timezone
@@ -31,6 +36,10 @@ class Review(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Approved reviews on the home page
+            models.Index(fields=['is_approved', '-created_at'], name='review_approved_created_idx'),
+        ]
 
 
 class Package(models.Model):
@@ -64,14 +73,82 @@ class UserProfile(models.Model):
     subscription_package = models.ForeignKey(Package, on_delete=models.SET_NULL, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Report counters, maintained by main.counters from the VillaReport signals
+    reports_total = models.IntegerField(default=0, editable=False)
+    reports_pending = models.IntegerField(default=0, editable=False)
+    reports_in_progress = models.IntegerField(default=0, editable=False)
+    reports_completed = models.IntegerField(default=0, editable=False)
+    reports_cancelled = models.IntegerField(default=0, editable=False)
 
     def __str__(self):
         return f"{self.user.username} - Profile"
 
+    def report_counts(self):
+        """Counters in the same shape as VillaReportQuerySet.status_summary()."""
+        counts = {'total': self.reports_total}
+        for value, label in VillaReport.STATUS_CHOICES:
+            counts[f'status_{value}'] = getattr(self, f'reports_{value}')
+        return counts
+
     class Meta:
         ordering = ['-created_at']
 
 
+class ReportTally(models.Model):
+    """A site-wide report count, maintained by main.counters from the VillaReport signals.
+
+    Keys have the same names as VillaReportQuerySet.status_summary()
+    ('total', 'status_pending', 'priority_urgent', ...), so the admin
+    dashboard reads a handful of rows instead of counting the reports table.
+    """
+
+    key = models.CharField(max_length=50, unique=True)
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.key}: {self.count}"
+
+
+class VillaReportQuerySet(models.QuerySet):
+    def status_summary(self):
+        """Count reports per status, priority and type in a single query.
+
+        Returns a dict with a 'total' key plus one '<field>_<value>' key per
+        choice, e.g. 'status_pending', 'priority_urgent', 'report_type_pool'.
+        """
+        aggregates = {'total': models.Count('id')}
+        for field, choices in (
+            ('status', self.model.STATUS_CHOICES),
+            ('priority', self.model.PRIORITY_LEVELS),
+            ('report_type', self.model.REPORT_TYPES),
+        ):
+            for value, label in choices:
+                aggregates[f'{field}_{value}'] = models.Count('id', filter=models.Q(**{field: value}))
+        return self.order_by().aggregate(**aggregates)
+
+
+def default_work_days():
+    return [0, 1, 2, 3, 4]
+
+
+class Technician(models.Model):
+    """A field technician whose working days main.scheduling plans visits into."""
+
+    name = models.CharField(max_length=100)
+    report_types = models.JSONField(default=list, blank=True,
+                                    help_text="Report types this technician handles; empty for all")
+    work_days = models.JSONField(default=default_work_days, help_text="Weekdays worked, 0 = Monday")
+    day_start = models.TimeField(default=time(8))
+    day_end = models.TimeField(default=time(17))
+    is_active = models.BooleanField(default=True)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        ordering = ['name']
+
+
 class VillaReport(models.Model):
     REPORT_TYPES = [
         ('maintenance', 'Maintenance Issue'),
@@ -97,6 +174,14 @@ class VillaReport(models.Model):
         ('cancelled', 'Cancelled'),
     ]
 
+    # Allowed status changes (main.transitions); closed reports can be reopened
+    STATUS_TRANSITIONS = {
+        'pending': {'in_progress', 'completed', 'cancelled'},
+        'in_progress': {'pending', 'completed', 'cancelled'},
+        'completed': {'in_progress'},
+        'cancelled': {'pending'},
+    }
+
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     report_type = models.CharField(max_length=20, choices=REPORT_TYPES)
     priority = models.CharField(max_length=10, choices=PRIORITY_LEVELS, default='medium')
@@ -108,13 +193,54 @@ class VillaReport(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     scheduled_date = models.DateTimeField(null=True, blank=True)
+    technician = models.ForeignKey(Technician, on_delete=models.SET_NULL, null=True, blank=True, related_name='reports')
     completed_date = models.DateTimeField(null=True, blank=True)
 
+    objects = VillaReportQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.user.username} - {self.title} ({self.get_status_display()})"
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Owner report lists and dashboards, newest first
+            models.Index(fields=['user', '-created_at'], name='report_user_created_idx'),
+            models.Index(fields=['user', 'status', '-created_at'], name='report_user_status_idx'),
+            # Admin dashboard: recent reports
+            models.Index(fields=['-created_at'], name='report_created_idx'),
+            # Re-planning reads one week of scheduled visits
+            models.Index(fields=['scheduled_date'], name='report_scheduled_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The status as loaded, so clean() can check the transition a form makes
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+
+    def clean(self):
+        super().clean()
+        old_status = getattr(self, '_loaded_status', None)
+        self.check_transition(old_status)
+        # Completing a report stamps the date; one that stays completed must keep it
+        if self.status == old_status == 'completed' and self.completed_date is None:
+            raise ValidationError(
+                {'completed_date': 'A completed report needs its completion date.'}, code='required',
+            )
+
+    def check_transition(self, old_status):
+        """Raise ValidationError if the report may not move from old_status to its status."""
+        if old_status is None or old_status == self.status:
+            return
+        if self.status not in self.STATUS_TRANSITIONS.get(old_status, ()):
+            labels = dict(self.STATUS_CHOICES)
+            raise ValidationError(
+                {'status': f"A report can't go from {labels.get(old_status, old_status)} "
+                           f"to {labels.get(self.status, self.status)}."},
+                code='invalid_transition',
+            )
 
     def get_priority_color(self):
         colors = {
@@ -147,4 +273,224 @@ class Comment(models.Model):
         return f"{self.user.username} - {self.villa_report.title}"
 
     class Meta:
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+        indexes = [
+            # Comment threads on the report detail pages
+            models.Index(fields=['villa_report', '-created_at'], name='comment_report_created_idx'),
+            # Admin dashboard: recent comments
+            models.Index(fields=['-created_at'], name='comment_created_idx'),
+        ]
+
+class StatusTransition(models.Model):
+    """One status change of a VillaReport, appended by main.transitions.
+
+    Rows are only ever inserted, so the table is kept narrow: statuses are
+    small integer codes and there are just two indexes, (report, at) for a
+    report's history and the status at a time T, and (at, from, to) so
+    status counts at T are an index-only scan.
+    """
+
+    # Stored codes; never renumber, only add
+    STATUS_CODES = {'pending': 1, 'in_progress': 2, 'completed': 3, 'cancelled': 4}
+    STATUS_CODE_CHOICES = [(1, 'Pending'), (2, 'In Progress'), (3, 'Completed'), (4, 'Cancelled')]
+
+    # History outlives the report: deleting one appends a transition to
+    # null and leaves the rows, so there is no constraint and no cascade
+    report = models.ForeignKey(
+        VillaReport, on_delete=models.DO_NOTHING, db_constraint=False, related_name='transitions', db_index=False,
+    )
+    # Null for the report's creation
+    from_status = models.PositiveSmallIntegerField(choices=STATUS_CODE_CHOICES, null=True, blank=True)
+    # Null for its deletion
+    to_status = models.PositiveSmallIntegerField(choices=STATUS_CODE_CHOICES, null=True, blank=True)
+    at = models.DateTimeField(default=timezone.now)
+    # Unindexed to keep inserts cheap; deleting a user scans the table
+    changed_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', db_index=False,
+    )
+
+    def __str__(self):
+        return (
+            f"{self.report_id}: {self.get_from_status_display() or 'new'} -> "
+            f"{self.get_to_status_display() or 'deleted'}"
+        )
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Status transitions are append-only')
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError('Status transitions are append-only')
+
+    class Meta:
+        ordering = ['at', 'id']
+        indexes = [
+            models.Index(fields=['report', 'at'], name='transition_report_at_idx'),
+            models.Index(fields=['at', 'from_status', 'to_status'], name='transition_at_idx'),
+        ]
+
+
+class StatusSnapshot(models.Model):
+    """How many reports were in a status at a moment, written by main.transitions.take_snapshot.
+
+    status_counts_at() starts from the latest snapshot before the moment
+    it is asked about and aggregates only the transitions since, so the
+    work stays bounded by how often snapshots are taken.
+    """
+
+    at = models.DateTimeField()
+    status = models.PositiveSmallIntegerField(choices=StatusTransition.STATUS_CODE_CHOICES)
+    count = models.IntegerField()
+
+    def __str__(self):
+        return f"{self.at:%Y-%m-%d %H:%M} {self.get_status_display()}: {self.count}"
+
+    class Meta:
+        ordering = ['-at', 'status']
+        constraints = [
+            models.UniqueConstraint(fields=['at', 'status'], name='status_snapshot_unique'),
+        ]
+
+
+def attachment_upload_to(instance, filename):
+    # The client's filename is kept in original_name; on disk only the
+    # extension survives, so names never collide or leak
+    extension = os.path.splitext(filename)[1].lower()
+    return f'attachments/{instance.villa_report_id}/{uuid.uuid4().hex}{extension}'
+
+
+class Attachment(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Processing'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
+
+    villa_report = models.ForeignKey(VillaReport, on_delete=models.CASCADE, related_name='attachments')
+    comment = models.ForeignKey(Comment, on_delete=models.SET_NULL, null=True, blank=True, related_name='attachments')
+    uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE)
+    file = models.FileField(upload_to=attachment_upload_to)
+    thumbnail = models.FileField(upload_to='attachments/thumbnails/', blank=True)
+    original_name = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    size = models.PositiveBigIntegerField(default=0)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.original_name} ({self.villa_report_id})"
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            # Photo grid on the report detail pages
+            models.Index(fields=['villa_report', 'created_at'], name='attachment_report_created_idx'),
+        ]
+
+
+class Task(models.Model):
+    """A deferred call queued by main.tasks and run by `manage.py run_worker`."""
+
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+
+    name = models.CharField(max_length=200, help_text="Dotted path of the task function")
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    # Enqueueing a key that already exists returns the existing task
+    idempotency_key = models.CharField(max_length=200, null=True, blank=True, unique=True)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_at = models.DateTimeField(default=timezone.now)
+    # Seconds a run may take before it is given up on
+    timeout = models.PositiveIntegerField(default=3600)
+    claimed_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Refreshed by the worker while the task runs
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration_ms = models.FloatField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.get_status_display()})"
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Workers claim due tasks in run_at order
+            models.Index(fields=['status', 'run_at'], name='task_status_run_at_idx'),
+        ]
+
+
+class Notification(models.Model):
+    """A report update waiting to be emailed to its owner by main.notifications."""
+
+    KIND_CHOICES = [
+        ('status', 'Status change'),
+        ('comment', 'Comment'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
+    villa_report = models.ForeignKey(VillaReport, on_delete=models.CASCADE, related_name='notifications')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    comment = models.ForeignKey(Comment, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    old_status = models.CharField(max_length=20, blank=True)
+    new_status = models.CharField(max_length=20, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Set by the delivery that is sending it; a claim older than
+    # NOTIFICATION_CLAIM_TIMEOUT is taken over by the next delivery
+    claimed_by = models.CharField(max_length=100, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.user.username} - {self.get_kind_display()} ({self.villa_report_id})"
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            # Delivery picks up unsent notifications
+            models.Index(fields=['sent_at', 'user'], name='notification_sent_user_idx'),
+        ]
+
+
+class SLARollup(models.Model):
+    """SLA totals for the reports created in one month, per type and priority.
+
+    Kept up to date by main.sla from the VillaReport and Comment signals and
+    recomputed nightly by `manage.py rollup_sla`, so analytics never have to
+    scan the reports table.
+    """
+
+    month = models.DateField(help_text="First day of the month the reports were created in")
+    report_type = models.CharField(max_length=20, choices=VillaReport.REPORT_TYPES)
+    priority = models.CharField(max_length=10, choices=VillaReport.PRIORITY_LEVELS)
+    reports = models.IntegerField(default=0)
+    # First staff comment
+    responded = models.IntegerField(default=0)
+    response_time = models.DurationField(default=timedelta)
+    response_met = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    completion_time = models.DurationField(default=timedelta)
+    completion_met = models.IntegerField(default=0)
+    cancelled = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} {self.report_type}/{self.priority}"
+
+    class Meta:
+        ordering = ['month', 'report_type', 'priority']
+        constraints = [
+            models.UniqueConstraint(fields=['month', 'report_type', 'priority'], name='sla_rollup_unique'),
+        ]
@@ -0,0 +1,178 @@
+import threading
+import time
+import uuid
+import weakref
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+from .models import Notification, VillaReport
+from .tasks import task, worker_name
+
+STATUS_LABELS = dict(VillaReport.STATUS_CHOICES)
+# This thread's delivery callback for the open transaction, if any
+_pending = threading.local()
+
+
+class DeliveryCallback:
+    """on_commit callback that schedules one delivery for a transaction.
+
+    Django drops the callbacks of a transaction (or savepoint) that rolls
+    back, so once nothing but a weak reference holds this object, no
+    delivery is pending.
+    """
+
+    ran = False
+
+    def __call__(self):
+        self.ran = True
+        schedule_delivery()
+
+
+def notify(user_id, villa_report_id, kind, **fields):
+    """Record an update for a report owner and make sure a delivery is queued.
+
+    Only a row is written here; the email goes out from a background task,
+    so a bulk edit of a hundred reports costs a hundred inserts and one
+    queued delivery instead of a hundred SMTP round trips.
+    """
+    Notification.objects.create(user_id=user_id, villa_report_id=villa_report_id, kind=kind, **fields)
+    # One delivery per transaction, however many notifications it writes
+    # (e.g. a list_editable save in the admin)
+    reference = getattr(_pending, 'callback', None)
+    callback = reference() if reference else None
+    if callback is None or callback.ran:
+        callback = DeliveryCallback()
+        _pending.callback = weakref.ref(callback)
+        transaction.on_commit(callback)
+
+
+def schedule_delivery():
+    """Queue send_notifications for the end of the current digest window.
+
+    Every notification committed within the same NOTIFICATION_DIGEST_WINDOW
+    seconds shares one task (by idempotency key), so a burst of updates
+    reaches each owner as a single digest. Eager tasks run straight away,
+    so there is no window to share.
+    """
+    window = settings.NOTIFICATION_DIGEST_WINDOW
+    if not window or settings.TASKS_EAGER:
+        send_notifications.enqueue()
+        return
+    window_end = (int(time.time() // window) + 1) * window
+    send_notifications.enqueue(
+        idempotency_key=f'notifications:{window_end}', delay=window_end - time.time(),
+    )
+
+
+@task(max_attempts=5)
+def send_notifications():
+    deliver_pending()
+
+
+def deliver_pending(batch_size=None):
+    """Email every unsent notification, one message per owner; returns how many were sent.
+
+    Owners are handled batch_size at a time, and all of their messages go
+    over a single connection to the mail server that is opened only once
+    there is something to send. A batch is claimed before sending and only
+    marked sent afterwards: if sending fails the claim is released so the
+    task's retry sends it again, and if the worker dies the claim expires
+    after NOTIFICATION_CLAIM_TIMEOUT.
+    """
+    batch_size = batch_size or settings.NOTIFICATION_BATCH_SIZE
+    connection = None
+    sent = 0
+    try:
+        while True:
+            stale = timezone.now() - timedelta(seconds=settings.NOTIFICATION_CLAIM_TIMEOUT)
+            unsent = Notification.objects.filter(
+                Q(claimed_at__isnull=True) | Q(claimed_at__lt=stale), sent_at__isnull=True,
+            )
+            user_ids = list(unsent.order_by('user_id').values_list('user_id', flat=True).distinct()[:batch_size])
+            if not user_ids:
+                break
+            # The token marks this batch, so a concurrent delivery never
+            # sends the same notifications twice
+            token = f'{worker_name()}:{uuid.uuid4().hex[:8]}'
+            unsent.filter(user_id__in=user_ids).update(claimed_by=token, claimed_at=timezone.now())
+            claimed = Notification.objects.filter(claimed_by=token, sent_at__isnull=True)
+            batch = list(
+                claimed.select_related('user', 'villa_report', 'comment__user').order_by('user_id', 'created_at', 'id')
+            )
+            messages = build_messages(batch)
+            if messages:
+                if connection is None:
+                    connection = get_connection()
+                    connection.open()
+                try:
+                    sent += connection.send_messages(messages) or 0
+                except Exception:
+                    claimed.update(claimed_by='', claimed_at=None)
+                    raise
+            # Owners without an email address are done too
+            claimed.update(sent_at=timezone.now())
+    finally:
+        if connection is not None:
+            connection.close()
+    return sent
+
+
+def build_messages(notifications):
+    """One EmailMessage per owner with an email address, for notifications ordered by user."""
+    by_user = {}
+    for notification in notifications:
+        by_user.setdefault(notification.user_id, []).append(notification)
+    messages = []
+    for user_notifications in by_user.values():
+        user = user_notifications[0].user
+        if not user.email:
+            continue
+        reports = digest(user_notifications)
+        if reports:
+            messages.append(digest_message(user, reports))
+    return messages
+
+
+def digest(notifications):
+    """Collapse one owner's notifications into a list of per-report updates.
+
+    Several status changes to the same report show as one change from the
+    first old status to the last new one, and are dropped if they cancel out.
+    """
+    reports = {}
+    for notification in notifications:
+        entry = reports.setdefault(notification.villa_report_id, {
+            'report': notification.villa_report, 'old_status': None, 'new_status': None, 'comments': [],
+        })
+        if notification.kind == 'status':
+            if entry['old_status'] is None:
+                entry['old_status'] = notification.old_status
+            entry['new_status'] = notification.new_status
+        elif notification.comment is not None:
+            entry['comments'].append(notification.comment)
+    updates = []
+    for entry in reports.values():
+        if entry['old_status'] == entry['new_status']:
+            entry['old_status'] = entry['new_status'] = None
+        if entry['new_status'] is None and not entry['comments']:
+            continue
+        entry['old_status_label'] = STATUS_LABELS.get(entry['old_status'], entry['old_status'])
+        entry['new_status_label'] = STATUS_LABELS.get(entry['new_status'], entry['new_status'])
+        entry['url'] = settings.SITE_URL + reverse('villa_report_detail', args=[entry['report'].pk])
+        updates.append(entry)
+    return updates
+
+
+def digest_message(user, reports):
+    if len(reports) == 1:
+        subject = f'Update on your villa report "{reports[0]["report"].title}"'
+    else:
+        subject = f'Updates on {len(reports)} of your villa reports'
+    body = render_to_string('main/email/report_updates.txt', {'user': user, 'reports': reports})
+    return EmailMessage(subject, body, settings.DEFAULT_FROM_EMAIL, [user.email])
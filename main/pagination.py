@@ -0,0 +1,95 @@
+import json
+
+from django.utils.dateparse import parse_datetime
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+
+class CursorPage:
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Keyset paginator over (created_at, id), newest first.
+
+    Unlike django.core.paginator.Paginator it never runs COUNT(*) or OFFSET:
+    each page is a range scan starting right after the row named by the
+    cursor, so page N costs the same as page 1. Cursors are opaque tokens
+    exposed as page.next_cursor / page.previous_cursor.
+    """
+
+    def __init__(self, queryset, per_page, date_field='created_at'):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.date_field = date_field
+
+    def get_page(self, cursor=None):
+        """Return the page after (or before) cursor; invalid cursors give the first page."""
+        position = self.decode_cursor(cursor) if cursor else None
+        if position is None:
+            return self._page_after(None)
+        direction, created, pk = position
+        if direction == 'prev':
+            return self._page_before((created, pk))
+        return self._page_after((created, pk))
+
+    def _page_after(self, position):
+        queryset = self.queryset.order_by(f'-{self.date_field}', '-pk')
+        if position is not None:
+            created, pk = position
+            # Equivalent to (date < created OR (date = created AND pk < pk)), but
+            # written as a single range so the (…, -created_at) indexes are used
+            queryset = queryset.filter(
+                **{f'{self.date_field}__lte': created}
+            ).exclude(**{self.date_field: created, 'pk__gte': pk})
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        next_cursor = self.encode_cursor('next', rows[-1]) if has_more else None
+        previous_cursor = self.encode_cursor('prev', rows[0]) if position is not None and rows else None
+        return CursorPage(rows, next_cursor, previous_cursor)
+
+    def _page_before(self, position):
+        created, pk = position
+        queryset = self.queryset.order_by(self.date_field, 'pk').filter(
+            **{f'{self.date_field}__gte': created}
+        ).exclude(**{self.date_field: created, 'pk__lte': pk})
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page][::-1]
+        if not rows:
+            return self._page_after(None)
+        next_cursor = self.encode_cursor('next', rows[-1])
+        previous_cursor = self.encode_cursor('prev', rows[0]) if has_more else None
+        return CursorPage(rows, next_cursor, previous_cursor)
+
+    def encode_cursor(self, direction, obj):
+        value = json.dumps([direction, getattr(obj, self.date_field).isoformat(), obj.pk])
+        return urlsafe_base64_encode(value.encode())
+
+    def decode_cursor(self, cursor):
+        try:
+            direction, created, pk = json.loads(urlsafe_base64_decode(cursor))
+            created = parse_datetime(created)
+        except (TypeError, ValueError):
+            return None
+        if direction not in ('next', 'prev') or created is None or not isinstance(pk, int):
+            return None
+        return direction, created, pk
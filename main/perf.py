@@ -0,0 +1,235 @@
+import atexit
+import glob
+import json
+import logging
+import math
+import os
+import queue
+import random
+import threading
+import time
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+# The sample being recorded for the current request, if any
+_current = ContextVar('perf_sample', default=None)
+# (PERF_LOG_FILE, pid) -> (QueueHandler, QueueListener)
+_handlers = {}
+_handlers_lock = threading.Lock()
+
+
+class Sample:
+    """Timings collected for one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.query_ms = 0.0
+        self.template_ms = 0.0
+
+    def record_query(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.query_ms += (time.perf_counter() - started) * 1000
+
+    def as_record(self, request, response, track_queries=True):
+        match = request.resolver_match
+        return {
+            'ts': round(time.time(), 3),
+            'view': match.view_name if match else 'unresolved',
+            'method': request.method,
+            'status': response.status_code,
+            'wall_ms': round((time.perf_counter() - self.started) * 1000, 3),
+            'queries': self.queries if track_queries else None,
+            'query_ms': round(self.query_ms, 3) if track_queries else None,
+            'template_ms': round(self.template_ms, 3),
+            'bytes': None if response.streaming else len(response.content),
+        }
+
+
+class PerfMiddleware:
+    """Record wall time, queries, template time and size for sampled requests.
+
+    A PERF_SAMPLE_RATE share of requests is written as one JSON line each
+    to a rotating per-process copy of PERF_LOG_FILE, which `manage.py
+    perf_report` reads. Records are queued and written by a background
+    thread, so requests never wait on the disk.
+    With the rate at 0 the middleware removes itself from the stack at
+    startup, so it costs nothing.
+
+    Async views (the report event streams) run their queries on other
+    threads, so for them only wall time, template time and size are kept.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.sample_rate = settings.PERF_SAMPLE_RATE
+        if not self.sample_rate:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+        sample = Sample()
+        token = _current.set(sample)
+        try:
+            with connection.execute_wrapper(sample.record_query):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        write_record(sample.as_record(request, response))
+        return response
+
+    async def __acall__(self, request):
+        if random.random() >= self.sample_rate:
+            return await self.get_response(request)
+        sample = Sample()
+        token = _current.set(sample)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        write_record(sample.as_record(request, response, track_queries=False))
+        return response
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        sample = _current.get()
+        if sample is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            sample.template_ms += (time.perf_counter() - started) * 1000
+
+
+class PerfDjangoTemplates(DjangoTemplates):
+    """The Django template backend, timing top-level renders for PerfMiddleware.
+
+    Templates pulled in with {% include %} or {% extends %} render inside
+    their parent, so each request's template time is counted once.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+def process_log_file(path, pid=None):
+    """The file one process logs to: perf.log becomes perf-<pid>.log.
+
+    RotatingFileHandler is not safe with several processes rotating the same
+    file, so each process rotates its own.
+    """
+    root, ext = os.path.splitext(os.fspath(path))
+    return f'{root}-{os.getpid() if pid is None else pid}{ext}'
+
+
+def get_handler(path):
+    """A QueueHandler whose records a listener thread writes to this process's log file."""
+    key = (os.fspath(path), os.getpid())
+    with _handlers_lock:
+        if key not in _handlers:
+            os.makedirs(os.path.dirname(key[0]), exist_ok=True)
+            handler = RotatingFileHandler(
+                process_log_file(path), maxBytes=settings.PERF_LOG_MAX_BYTES,
+                backupCount=settings.PERF_LOG_BACKUPS, encoding='utf-8', delay=True,
+            )
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            records = queue.SimpleQueue()
+            listener = QueueListener(records, handler)
+            listener.start()
+            _handlers[key] = (QueueHandler(records), listener)
+        return _handlers[key][0]
+
+
+@atexit.register
+def close_handlers():
+    """Write out every queued record and close the log files."""
+    with _handlers_lock:
+        # Listeners inherited from a parent process have no thread here
+        keys = [key for key in _handlers if key[1] == os.getpid()]
+        handlers = [_handlers.pop(key) for key in keys]
+    for queue_handler, listener in handlers:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+def write_record(record):
+    get_handler(settings.PERF_LOG_FILE).handle(logging.makeLogRecord({'msg': json.dumps(record)}))
+
+
+def read_records(path=None, since=None):
+    """Yield the records in every process's perf log and its rotated files, oldest file first."""
+    path = os.fspath(path or settings.PERF_LOG_FILE)
+    root, ext = os.path.splitext(path)
+    files = []
+    # The shared log older versions wrote to, then one log per process
+    for current in [path, *sorted(glob.glob(f'{glob.escape(root)}-*{glob.escape(ext)}'))]:
+        files += [f'{current}.{n}' for n in range(settings.PERF_LOG_BACKUPS, 0, -1)] + [current]
+    for name in files:
+        if not os.path.exists(name):
+            continue
+        with open(name, encoding='utf-8') as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A line cut short by a crash or a rotation in progress
+                    continue
+                if since is None or record['ts'] >= since:
+                    yield record
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return None
+    return values[max(math.ceil(len(values) * q / 100) - 1, 0)]
+
+
+def summarize(records):
+    """Per-view request counts and percentiles, slowest p95 first."""
+    views = {}
+    for record in records:
+        views.setdefault(record['view'], []).append(record)
+    summary = []
+    for view, samples in views.items():
+        entry = {'view': view, 'requests': len(samples)}
+        for field in ('wall_ms', 'queries', 'query_ms', 'template_ms', 'bytes'):
+            values = sorted(sample[field] for sample in samples if sample.get(field) is not None)
+            entry[field] = {q: percentile(values, q) for q in (50, 95, 99)}
+            entry[field]['max'] = values[-1] if values else None
+        summary.append(entry)
+    return sorted(summary, key=lambda entry: entry['wall_ms'][95] or 0, reverse=True)
+
+
+def query_budget(view):
+    return settings.PERF_QUERY_BUDGETS.get(view, settings.PERF_DEFAULT_QUERY_BUDGET)
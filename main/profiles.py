@@ -0,0 +1,61 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.functional import SimpleLazyObject
+from .models import UserProfile
+
+
+def profile_cache_key(user_id):
+    return f'profile:{user_id}'
+
+
+def get_profile(user):
+    """The user's profile, from the cache or (created if missing) from the database.
+
+    Returns None for anonymous users.
+    """
+    if not user.is_authenticated:
+        return None
+    key = profile_cache_key(user.pk)
+    profile = cache.get(key)
+    if profile is None:
+        # By user_id, so the cached copy doesn't carry the User with it
+        profile, created = UserProfile.objects.get_or_create(user_id=user.pk)
+        cache.set(key, profile, settings.PROFILE_CACHE_TIMEOUT)
+    profile.user = user
+    return profile
+
+
+def forget_profile(*user_ids):
+    """Drop cached profiles now and again after commit.
+
+    The second delete stops a concurrent request from re-caching the old
+    row before this transaction commits.
+    """
+    keys = [profile_cache_key(user_id) for user_id in user_ids]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+class ProfileMiddleware:
+    """Give each request a lazy request.profile, loaded at most once per request.
+
+    Must come after AuthenticationMiddleware. For anonymous users the
+    profile is falsy. Profiles are cached per user for
+    PROFILE_CACHE_TIMEOUT seconds; saving or deleting a profile and report
+    counter changes (main.counters) invalidate the entry.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        request.profile = SimpleLazyObject(lambda: get_profile(request.user))
+        return self.get_response(request)
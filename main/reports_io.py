@@ -0,0 +1,366 @@
+import csv
+import io
+import json
+import re
+import time
+import zipfile
+from contextlib import contextmanager
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import reset_queries, transaction
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import VillaReport
+
+# Column order of exported files; import_reports reads the same columns
+# (id and updated_at are ignored, imported reports get new ones)
+COLUMNS = [
+    'id', 'username', 'report_type', 'priority', 'title', 'description', 'location', 'status',
+    'admin_notes', 'created_at', 'updated_at', 'scheduled_date', 'completed_date',
+]
+EXPORT_FIELDS = ['user__username' if column == 'username' else column for column in COLUMNS]
+DATE_COLUMNS = ['created_at', 'scheduled_date', 'completed_date']
+FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+
+REPORT_TYPES = {value for value, label in VillaReport.REPORT_TYPES}
+PRIORITIES = {value for value, label in VillaReport.PRIORITY_LEVELS}
+STATUSES = {value for value, label in VillaReport.STATUS_CHOICES}
+
+
+class RowError(ValueError):
+    pass
+
+
+def export_rows(queryset, chunk_size=2000):
+    """Yield each report as a tuple in COLUMNS order, chunk_size rows per fetch.
+
+    values_list() with iterator() skips model instances and the result
+    cache, so memory stays flat however many reports are exported.
+    """
+    for row in queryset.order_by('id').values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size):
+        yield tuple(value.isoformat() if isinstance(value, datetime) else value for value in row)
+
+
+def write_rows(rows, file, fmt):
+    """Write export_rows() output to a text file as CSV or JSON lines; returns the row count."""
+    count = 0
+    if fmt == 'csv':
+        writer = csv.writer(file)
+        writer.writerow(COLUMNS)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in rows:
+            file.write(json.dumps(dict(zip(COLUMNS, row)), ensure_ascii=False))
+            file.write('\n')
+            count += 1
+    return count
+
+
+# Spreadsheet apps run a cell starting with one of these as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@')
+
+
+def spreadsheet_safe(value):
+    """Prefix text a spreadsheet would read as a formula with ', so it shows as text."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def stream_csv(rows, rows_per_chunk=500):
+    """Yield CSV bytes (with a BOM, so Excel detects UTF-8) a few hundred rows at a time.
+
+    The file is meant to be opened in a spreadsheet, so text cells that
+    would run as formulas are escaped with spreadsheet_safe().
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    # The header goes out before the first database fetch
+    yield ('\ufeff' + buffer.getvalue()).encode('utf-8')
+    buffer.seek(0)
+    buffer.truncate()
+    for count, row in enumerate(rows, 1):
+        writer.writerow([spreadsheet_safe(value) for value in row])
+        if count % rows_per_chunk == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+class _ZipSink:
+    """Write-only file for zipfile that hands the written bytes back on drain()."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Reports" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>'
+    ),
+}
+# Characters XML 1.0 does not allow, even escaped
+XML_INVALID = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+
+def _xlsx_row(values):
+    cells = []
+    for value in values:
+        if value is None:
+            cells.append('<c/>')
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            cells.append(f'<c><v>{value}</v></c>')
+        else:
+            text = escape(XML_INVALID.sub('', str(value)))
+            cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+    return f'<row>{"".join(cells)}</row>'
+
+
+def stream_xlsx(rows, rows_per_chunk=500):
+    """Yield a single-sheet .xlsx workbook as it is written.
+
+    The sheet uses inline strings, so no shared string table has to be
+    built in memory, and zipfile writes to a non-seekable sink using data
+    descriptors, so each compressed chunk can be sent as soon as it exists.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as workbook:
+        for name, content in XLSX_PARTS.items():
+            workbook.writestr(name, content)
+        with workbook.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                .encode('utf-8')
+            )
+            sheet.write(_xlsx_row(COLUMNS).encode('utf-8'))
+            yield sink.drain()
+            lines = []
+            for row in rows:
+                lines.append(_xlsx_row(row))
+                if len(lines) == rows_per_chunk:
+                    sheet.write(''.join(lines).encode('utf-8'))
+                    lines = []
+                    yield sink.drain()
+            sheet.write((''.join(lines) + '</sheetData></worksheet>').encode('utf-8'))
+    yield sink.drain()
+
+
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def export_response(queryset, fmt, chunk_size=2000):
+    """Stream a report queryset as a CSV or XLSX download."""
+    stream = stream_csv if fmt == 'csv' else stream_xlsx
+    response = StreamingHttpResponse(
+        stream(export_rows(queryset, chunk_size)), content_type=EXPORT_CONTENT_TYPES[fmt],
+    )
+    response['Content-Disposition'] = f'attachment; filename="villa-reports-{timezone.now():%Y%m%d-%H%M}.{fmt}"'
+    return response
+
+
+def read_rows(file, fmt):
+    """Yield (line number, row dict) from a CSV or JSON lines text file."""
+    if fmt == 'csv':
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(file, 1):
+            if line.strip():
+                try:
+                    row = json.loads(line)
+                except ValueError as exc:
+                    raise RowError(f'line {line_number}: invalid JSON ({exc})') from None
+                yield line_number, row
+
+
+@contextmanager
+def keep_created_at():
+    """Let bulk_create store the created_at of historical reports.
+
+    auto_now_add would otherwise overwrite it with the import time.
+    """
+    field = VillaReport._meta.get_field('created_at')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+class ReportImporter:
+    """Build VillaReports from rows and save them with bulk_create.
+
+    Rows are buffered until batch_size is reached; each batch resolves its
+    usernames with one query (previously seen users are remembered) and is
+    saved in its own transaction. Invalid rows raise RowError, or are
+    counted in skipped when skip_invalid is set.
+    """
+
+    def __init__(self, batch_size=5000, create_users=False, skip_invalid=False, progress=None):
+        self.batch_size = batch_size
+        self.create_users = create_users
+        self.skip_invalid = skip_invalid
+        self.progress = progress
+        self.user_ids = {}
+        self.pending = []
+        self.imported = 0
+        self.skipped = 0
+        self.users_created = 0
+        self.started = time.perf_counter()
+
+    def run(self, rows):
+        with keep_created_at():
+            for line_number, row in rows:
+                self.add(line_number, row)
+            self.flush()
+        return self.imported
+
+    def add(self, line_number, row):
+        try:
+            username, report = self.build(row)
+        except RowError as exc:
+            if not self.skip_invalid:
+                raise RowError(f'line {line_number}: {exc}') from None
+            self.skipped += 1
+            return
+        self.pending.append((line_number, username, report))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def build(self, row):
+        username = str(row.get('username') or '').strip()
+        if not username:
+            raise RowError('username is required')
+        values = {
+            'title': str(row.get('title') or '').strip(),
+            'description': row.get('description') or '',
+            'location': row.get('location') or '',
+            'report_type': row.get('report_type') or '',
+            'priority': row.get('priority') or 'medium',
+            'status': row.get('status') or 'pending',
+            'admin_notes': row.get('admin_notes') or '',
+        }
+        if not values['title']:
+            raise RowError('title is required')
+        for name, allowed in (('report_type', REPORT_TYPES), ('priority', PRIORITIES), ('status', STATUSES)):
+            if values[name] not in allowed:
+                raise RowError(f'invalid {name} {values[name]!r}')
+        for name in DATE_COLUMNS:
+            values[name] = parse_timestamp(row.get(name), name)
+        values['created_at'] = values['created_at'] or timezone.now()
+        if values['status'] == 'completed' and values['completed_date'] is None:
+            # bulk_create skips the signal that stamps it
+            values['completed_date'] = timezone.now()
+        return username, VillaReport(**values)
+
+    def flush(self):
+        if not self.pending:
+            return
+        with transaction.atomic():
+            self.resolve_users({username for line_number, username, report in self.pending})
+            reports = []
+            for line_number, username, report in self.pending:
+                report.user_id = self.user_ids.get(username)
+                if report.user_id is None:
+                    if not self.skip_invalid:
+                        raise RowError(f'line {line_number}: unknown user {username!r}')
+                    self.skipped += 1
+                    continue
+                reports.append(report)
+            VillaReport.objects.bulk_create(reports, batch_size=self.batch_size)
+        self.imported += len(reports)
+        self.pending = []
+        if settings.DEBUG:
+            # Every INSERT would otherwise stay in connection.queries
+            reset_queries()
+        if self.progress:
+            self.progress(self)
+
+    def resolve_users(self, usernames):
+        missing = usernames - self.user_ids.keys()
+        if not missing:
+            return
+        self.user_ids.update(User.objects.filter(username__in=missing).values_list('username', 'id'))
+        missing -= self.user_ids.keys()
+        if missing and self.create_users:
+            # Owners log in after a password reset; one hash for the whole batch
+            password = make_password(None)
+            users = User.objects.bulk_create([User(username=username, password=password) for username in missing])
+            if all(user.pk for user in users):
+                self.user_ids.update((user.username, user.pk) for user in users)
+            else:
+                # Databases without INSERT ... RETURNING don't set the ids
+                self.user_ids.update(User.objects.filter(username__in=missing).values_list('username', 'id'))
+            self.users_created += len(missing)
+
+    @property
+    def rate(self):
+        return self.imported / max(time.perf_counter() - self.started, 1e-9)
+
+
+def parse_timestamp(value, name):
+    if not value:
+        return None
+    try:
+        parsed = parse_datetime(value) if isinstance(value, str) else None
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise RowError(f'invalid {name} {value!r}')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
@@ -0,0 +1,323 @@
+import heapq
+import itertools
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import Technician, VillaReport
+from .tasks import task
+
+OPEN_STATUSES = ('pending', 'in_progress')
+PRIORITY_RANK = {'urgent': 0, 'high': 1, 'medium': 2, 'low': 3}
+
+
+class Job:
+    __slots__ = ('id', 'report_type', 'rank', 'created_at', 'villa', 'minutes', 'start', 'stored')
+
+    def __init__(self, id, report_type, priority, created_at, villa, stored, now):
+        self.id = id
+        self.report_type = report_type
+        self.created_at = created_at
+        # Urgency: emergencies count as urgent, and waiting jobs move up one
+        # priority level every SCHEDULE_AGING_DAYS (never above high)
+        rank = 0 if report_type == 'emergency' else PRIORITY_RANK.get(priority, 2)
+        if rank > 1 and settings.SCHEDULE_AGING_DAYS:
+            rank = max(rank - (now - created_at).days // settings.SCHEDULE_AGING_DAYS, 1)
+        self.rank = rank
+        self.villa = villa
+        self.minutes = settings.SCHEDULE_JOB_MINUTES.get(report_type, settings.SCHEDULE_DEFAULT_JOB_MINUTES)
+        self.start = None
+        # (technician_id, scheduled_date) as last saved
+        self.stored = stored
+
+    @property
+    def sort_key(self):
+        return (self.rank, self.created_at, self.id)
+
+
+class Slot:
+    """One technician's working day: the visits planned for it and the time left."""
+
+    __slots__ = ('technician', 'day', 'start', 'capacity', 'used', 'villas')
+
+    def __init__(self, technician, day):
+        self.technician = technician
+        self.day = day
+        self.start = timezone.make_aware(datetime.combine(day, technician.day_start))
+        end = timezone.make_aware(datetime.combine(day, technician.day_end))
+        self.capacity = (end - self.start).total_seconds() / 60
+        self.used = 0
+        # villa -> jobs, in visiting order
+        self.villas = {}
+
+    @property
+    def free(self):
+        return self.capacity - self.used
+
+    def handles(self, job):
+        return not self.technician.report_types or job.report_type in self.technician.report_types
+
+    def cost(self, job):
+        # Travel is paid once per villa per day
+        return job.minutes + (0 if job.villa in self.villas else settings.SCHEDULE_TRAVEL_MINUTES)
+
+    def fits(self, job):
+        return self.used + self.cost(job) <= self.capacity
+
+    def add(self, job):
+        self.used += self.cost(job)
+        self.villas.setdefault(job.villa, []).append(job)
+
+    def remove(self, job):
+        self.villas[job.villa].remove(job)
+        self.used -= job.minutes
+        if not self.villas[job.villa]:
+            del self.villas[job.villa]
+            self.used -= settings.SCHEDULE_TRAVEL_MINUTES
+
+    def timeline(self):
+        """Set each job's start time: villa by villa, travelling before each villa."""
+        current = self.start
+        for jobs in self.villas.values():
+            current += timedelta(minutes=settings.SCHEDULE_TRAVEL_MINUTES)
+            for job in jobs:
+                job.start = current
+                current += timedelta(minutes=job.minutes)
+
+
+class Plan:
+    """Technician assignments for the open reports in one week.
+
+    Jobs are placed greedily in priority/urgency order, each on the earliest
+    day with a technician who handles its type and has time left, preferring
+    a technician already visiting that villa, then the one with the most
+    time free. Once a villa gets a visit, its other open jobs are pulled
+    into the same visit while the day has room, so travel is paid once per
+    villa instead of once per job. Each day keeps a heap of technicians by
+    free time per skill set, so placing a job does not scan every
+    technician.
+    """
+
+    def __init__(self, week_start, technicians, now=None):
+        self.week_start = week_start
+        self.now = now or timezone.now()
+        first_day = max(week_start, timezone.localdate(self.now))
+        self.days = [
+            week_start + timedelta(days=offset) for offset in range(7)
+            if week_start + timedelta(days=offset) >= first_day
+        ]
+        self.slots = {
+            (technician.id, day): Slot(technician, day)
+            for day in self.days for technician in technicians if day.weekday() in technician.work_days
+        }
+        self.skill_sets = {frozenset(technician.report_types) for technician in technicians}
+        self.counter = itertools.count()
+        # (day, skill set) -> heap of (-free minutes, tiebreak, slot); entries
+        # go stale as slots fill up and are refreshed when they reach the top
+        self.heaps = {}
+        for slot in self.slots.values():
+            self.push(slot)
+        # (day, villa) -> slots visiting that villa
+        self.visiting = {}
+        self.placed = {}
+        self.unscheduled = []
+        self.changed = set()
+        self.solve_seconds = 0
+
+    @classmethod
+    def for_week(cls, week_start, now=None):
+        return cls(week_start, list(Technician.objects.filter(is_active=True)), now=now)
+
+    @property
+    def week_range(self):
+        start = timezone.make_aware(datetime.combine(self.week_start, datetime.min.time()))
+        return start, start + timedelta(days=7)
+
+    def load_jobs(self, reports):
+        """Jobs for reports, from a queryset of VillaReports."""
+        rows = reports.values_list(
+            'id', 'report_type', 'priority', 'created_at', 'user_id', 'user__userprofile__villa_address',
+            'technician_id', 'scheduled_date',
+        )
+        return [
+            # Owners without an address each count as their own villa
+            Job(id, report_type, priority, created_at, villa.strip().lower() if villa else f'user:{user_id}',
+                (technician_id, scheduled_date), self.now)
+            for id, report_type, priority, created_at, user_id, villa, technician_id, scheduled_date in rows
+        ]
+
+    def open_reports(self):
+        """Open reports this week's plan covers: unscheduled, already in the week, or missed.
+
+        A visit whose day has passed while the report is still open was
+        missed, so the report needs planning again like an unscheduled one.
+        """
+        start, end = self.week_range
+        today = timezone.make_aware(datetime.combine(timezone.localdate(self.now), datetime.min.time()))
+        return VillaReport.objects.filter(status__in=OPEN_STATUSES).filter(
+            Q(scheduled_date__isnull=True) | Q(scheduled_date__lt=today)
+            | Q(scheduled_date__gte=start, scheduled_date__lt=end)
+        )
+
+    def solve(self, jobs):
+        started = time.perf_counter()
+        jobs = sorted(jobs, key=lambda job: job.sort_key)
+        by_villa = {}
+        for job in jobs:
+            by_villa.setdefault(job.villa, []).append(job)
+        for job in jobs:
+            if job.id in self.placed:
+                continue
+            slot = self.place(job)
+            if slot is None:
+                self.unscheduled.append(job)
+                continue
+            # Fill the rest of this visit with the villa's other jobs
+            for other in by_villa[job.villa]:
+                if other.id not in self.placed and slot.handles(other) and slot.fits(other):
+                    self.assign(other, slot)
+        self.solve_seconds += time.perf_counter() - started
+        return self
+
+    def place(self, job):
+        for day in self.days:
+            slot = next((
+                slot for slot in self.visiting.get((day, job.villa), ())
+                if slot.handles(job) and slot.fits(job)
+            ), None)
+            if slot is None:
+                # If the most free technician of a skill set has no room,
+                # nobody in that set has
+                candidates = [
+                    self.most_free(day, skills) for skills in self.skill_sets
+                    if not skills or job.report_type in skills
+                ]
+                slot = max(
+                    (slot for slot in candidates if slot is not None and slot.fits(job)),
+                    key=lambda slot: (slot.free, -slot.technician.id), default=None,
+                )
+            if slot is not None:
+                self.assign(job, slot)
+                return slot
+        return None
+
+    def push(self, slot):
+        heap = self.heaps.setdefault((slot.day, frozenset(slot.technician.report_types)), [])
+        heapq.heappush(heap, (-slot.free, next(self.counter), slot))
+
+    def most_free(self, day, skills):
+        heap = self.heaps.get((day, skills))
+        while heap:
+            free, _, slot = heap[0]
+            if -free == slot.free:
+                return slot
+            heapq.heapreplace(heap, (-slot.free, next(self.counter), slot))
+        return None
+
+    def add(self, job, slot):
+        """Put a job into a visit as already saved (no re-timing)."""
+        if job.villa not in slot.villas:
+            self.visiting.setdefault((slot.day, job.villa), []).append(slot)
+        slot.add(job)
+        self.placed[job.id] = (job, slot)
+
+    def assign(self, job, slot):
+        self.add(job, slot)
+        self.changed.add(slot)
+
+    def unassign(self, report_id):
+        if report_id not in self.placed:
+            return
+        job, slot = self.placed.pop(report_id)
+        slot.remove(job)
+        if job.villa not in slot.villas:
+            self.visiting[(slot.day, job.villa)].remove(slot)
+        # The slot gained time: its heap entries are now too low to be refreshed
+        self.push(slot)
+        self.changed.add(slot)
+
+    def assignments(self):
+        """{report_id: (technician_id, start)} for every placed job; re-times changed visits."""
+        for slot in self.changed:
+            slot.timeline()
+        self.changed.clear()
+        return {job.id: (slot.technician.id, job.start) for job, slot in self.placed.values()}
+
+    def apply(self):
+        """Save technicians and scheduled dates that changed; returns the number of reports updated.
+
+        Reports left unscheduled are cleared so they show up as unplanned.
+        """
+        assignments = self.assignments()
+        reports = [
+            VillaReport(id=job.id, technician_id=assignments[job.id][0], scheduled_date=assignments[job.id][1])
+            for job, slot in self.placed.values() if job.stored != assignments[job.id]
+        ] + [
+            VillaReport(id=job.id, technician_id=None, scheduled_date=None)
+            for job in self.unscheduled if job.stored != (None, None)
+        ]
+        # bulk_update: scheduling changes no status, so no signals are needed
+        VillaReport.objects.bulk_update(reports, ['technician', 'scheduled_date'], batch_size=500)
+        for job, slot in self.placed.values():
+            job.stored = assignments[job.id]
+        for job in self.unscheduled:
+            job.stored = (None, None)
+        return len(reports)
+
+
+def week_start_for(day):
+    return day - timedelta(days=day.weekday())
+
+
+def plan_week(week_start=None, apply=False):
+    """Plan every open report into the week starting on week_start (default: this week)."""
+    plan = Plan.for_week(week_start or week_start_for(timezone.localdate()))
+    plan.solve(plan.load_jobs(plan.open_reports()))
+    if apply:
+        with transaction.atomic():
+            plan.apply()
+    return plan
+
+
+def replan_report(report_id):
+    """Re-plan one changed report without re-solving the week.
+
+    The week's plan is rebuilt from the stored assignments, the report is
+    taken out of its visit and, if still open, placed again by the same
+    rules. Only the visits it left or joined are re-timed, and only reports
+    whose technician or start time changed are written. Returns the
+    report's (technician_id, start), or None if it is not planned.
+    """
+    report = VillaReport.objects.filter(pk=report_id).values('scheduled_date', 'status').first()
+    if report is None:
+        return None
+    # A missed visit is planned again from this week on
+    day = max(timezone.localdate(report['scheduled_date'] or timezone.now()), timezone.localdate())
+    plan = Plan.for_week(week_start_for(day))
+    start, end = plan.week_range
+    # The report itself may just have been closed: load it to free its time.
+    # Closed reports keep their technician as a record of who did the work.
+    planned = VillaReport.objects.filter(
+        Q(status__in=OPEN_STATUSES) | Q(pk=report_id),
+        technician__isnull=False, scheduled_date__gte=start, scheduled_date__lt=end,
+    ).order_by('scheduled_date')
+    for job in plan.load_jobs(planned):
+        technician_id, job.start = job.stored
+        slot = plan.slots.get((technician_id, timezone.localdate(job.start)))
+        if slot is not None:
+            plan.add(job, slot)
+
+    plan.unassign(report_id)
+    if report['status'] in OPEN_STATUSES:
+        plan.solve(plan.load_jobs(VillaReport.objects.filter(pk=report_id)))
+    with transaction.atomic():
+        plan.apply()
+    return plan.assignments().get(report_id)
+
+
+@task
+def replan_report_task(report_id):
+    replan_report(report_id)
@@ -0,0 +1,214 @@
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.module_loading import import_string
+from django.utils.safestring import mark_safe
+from django.utils.text import Truncator
+from .models import VillaReport, Comment
+
+
+# Control characters FTS5 wraps around matches; swapped for <mark> after escaping
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+
+
+class SearchResult:
+    def __init__(self, kind, object_id, report_id, title, snippet, rank=0.0):
+        self.kind = kind
+        self.object_id = object_id
+        self.report_id = report_id
+        self.title = title
+        self.snippet = snippet
+        self.rank = rank
+        self.report = None
+
+
+class BaseSearchBackend:
+    """Interface shared by the search backends (see settings.SEARCH_BACKEND)."""
+
+    def index_report(self, report):
+        pass
+
+    def index_comment(self, comment):
+        pass
+
+    def remove_report(self, report_id):
+        pass
+
+    def remove_comment(self, comment_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def search(self, query, owner=None, limit=20):
+        raise NotImplementedError
+
+    def filter_reports(self, queryset, query):
+        """Restrict a VillaReport queryset to reports matching query."""
+        raise NotImplementedError
+
+    def attach_reports(self, results):
+        reports = VillaReport.objects.select_related('user').in_bulk({result.report_id for result in results})
+        for result in results:
+            result.report = reports.get(result.report_id)
+            if not result.title and result.report:
+                result.title = escape(result.report.title)
+        return [result for result in results if result.report]
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """Fallback for databases without a full-text engine: plain icontains scans."""
+
+    def search(self, query, owner=None, limit=20):
+        reports = self.filter_reports(VillaReport.objects.all(), query)
+        comments = Comment.objects.filter(comment__icontains=query)
+        if owner is not None:
+            reports = reports.filter(user=owner)
+            comments = comments.filter(villa_report__user=owner)
+        results = [
+            SearchResult('report', report.id, report.id, escape(report.title),
+                         escape(Truncator(report.description).words(30)))
+            for report in reports[:limit]
+        ]
+        results += [
+            SearchResult('comment', comment.id, comment.villa_report_id, '',
+                         escape(Truncator(comment.comment).words(30)))
+            for comment in comments[:limit - len(results)]
+        ]
+        return self.attach_reports(results)
+
+    def filter_reports(self, queryset, query):
+        return queryset.filter(
+            Q(title__icontains=query) | Q(description__icontains=query) | Q(location__icontains=query)
+        )
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """SQLite FTS5 inverted index, kept current by the signals in main/signals.py.
+
+    Reports and comments share one table: a report is stored at rowid 2 * id
+    and a comment at 2 * id + 1, so updates and deletes are rowid lookups.
+    The owner column holds a 'u<user id>' token so per-owner searches are
+    answered by the index instead of a post-filter.
+    """
+
+    table = 'main_search_index'
+
+    def index_report(self, report):
+        owner = f'u{report.user_id}'
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT owner FROM {self.table} WHERE rowid = %s', [report.id * 2])
+            row = cursor.fetchone()
+            self._upsert(cursor, report.id * 2, report.title,
+                         f'{report.description}\n{report.location}', owner, report.id)
+        if row and row[0] != owner:
+            # Report was reassigned: its comments must follow the new owner
+            for comment in Comment.objects.filter(villa_report=report):
+                comment.villa_report = report
+                self.index_comment(comment)
+
+    def index_comment(self, comment):
+        with connection.cursor() as cursor:
+            self._upsert(cursor, comment.id * 2 + 1, '', comment.comment,
+                         f'u{comment.villa_report.user_id}', comment.villa_report_id)
+
+    def remove_report(self, report_id):
+        self._delete(report_id * 2)
+
+    def remove_comment(self, comment_id):
+        self._delete(comment_id * 2 + 1)
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.execute(
+                f"INSERT INTO {self.table} (rowid, title, body, owner, report_id) "
+                f"SELECT id * 2, title, description || char(10) || location, 'u' || user_id, id "
+                f"FROM {VillaReport._meta.db_table}"
+            )
+            cursor.execute(
+                f"INSERT INTO {self.table} (rowid, title, body, owner, report_id) "
+                f"SELECT c.id * 2 + 1, '', c.comment, 'u' || r.user_id, r.id "
+                f"FROM {Comment._meta.db_table} c JOIN {VillaReport._meta.db_table} r ON r.id = c.villa_report_id"
+            )
+            cursor.execute(f"INSERT INTO {self.table} ({self.table}) VALUES ('optimize')")
+
+    def search(self, query, owner=None, limit=20):
+        match = self.build_match(query, owner)
+        if not match:
+            return []
+        with connection.cursor() as cursor:
+            # Scoring every match of a very common word is linear in the corpus,
+            # so bm25 only ranks the newest SEARCH_RANK_WINDOW matching rows
+            cursor.execute(
+                f"SELECT rowid, report_id, "
+                f"highlight({self.table}, 0, %s, %s), "
+                f"snippet({self.table}, 1, %s, %s, '…', 24), "
+                f"bm25({self.table}, 10.0, 1.0, 0.0) AS score "
+                f"FROM {self.table} WHERE {self.table} MATCH %s AND rowid >= ("
+                f"SELECT min(rowid) FROM (SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s "
+                f"ORDER BY rowid DESC LIMIT %s)) "
+                f"ORDER BY score LIMIT %s",
+                [HIGHLIGHT_START, HIGHLIGHT_END, HIGHLIGHT_START, HIGHLIGHT_END,
+                 match, match, settings.SEARCH_RANK_WINDOW, limit],
+            )
+            rows = cursor.fetchall()
+        results = [
+            SearchResult(
+                'comment' if rowid % 2 else 'report', rowid // 2, report_id,
+                self.render_highlight(title), self.render_highlight(snippet), score,
+            )
+            for rowid, report_id, title, snippet, score in rows
+        ]
+        return self.attach_reports(results)
+
+    def filter_reports(self, queryset, query):
+        match = self.build_match(query)
+        if not match:
+            return queryset.none()
+        return queryset.filter(
+            pk__in=RawSQL(f'SELECT report_id FROM {self.table} WHERE {self.table} MATCH %s', [match])
+        )
+
+    def build_match(self, query, owner=None):
+        """Turn free text into a safe FTS5 query.
+
+        Every word must match (after stemming); a trailing '*' makes a word a
+        prefix search. Prefixes are opt-in because expanding long prefixes
+        merges many doclists and is far slower than exact terms.
+        """
+        terms = re.findall(r'(\w+)(\*?)', query)
+        if not terms:
+            return ''
+        match = '{title body}: (' + ' '.join(f'"{term}"{star}' for term, star in terms) + ')'
+        if owner is not None:
+            # The owner's (short) doclist goes first so FTS5 intersects from it
+            match = f'owner: "u{owner.pk}" AND {match}'
+        return match
+
+    def render_highlight(self, text):
+        return mark_safe(
+            escape(text or '').replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>')
+        )
+
+    def _upsert(self, cursor, rowid, title, body, owner, report_id):
+        cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [rowid])
+        cursor.execute(
+            f'INSERT INTO {self.table} (rowid, title, body, owner, report_id) VALUES (%s, %s, %s, %s, %s)',
+            [rowid, title, body, owner, report_id],
+        )
+
+    def _delete(self, rowid):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [rowid])
+
+
+@lru_cache(maxsize=None)
+def get_search_backend():
+    return import_string(settings.SEARCH_BACKEND)()
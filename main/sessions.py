@@ -0,0 +1,101 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.db import transaction
+from django.utils import timezone
+
+
+def user_cache():
+    # The session cache: it must reach every worker for the same reason
+    return caches[settings.SESSION_CACHE_ALIAS]
+
+
+def user_cache_key(user_id):
+    return f'auth-user:{user_id}'
+
+
+def forget_user(user_id):
+    """Drop a cached user now and again after commit (see main.profiles.forget_profile)."""
+    key = user_cache_key(user_id)
+    user_cache().delete(key)
+    transaction.on_commit(lambda: user_cache().delete(key))
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend that loads the logged-in user from the session cache.
+
+    With the cached_db session engine this leaves an authenticated request
+    with no session or user query. Django still checks the session's
+    password hash against the cached user. Saving or deleting a user
+    (including the last_login update on every login) drops the cached
+    copy, and AUTH_USER_CACHE_TIMEOUT bounds its age.
+    """
+
+    def get_user(self, user_id):
+        key = user_cache_key(user_id)
+        user = user_cache().get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is None:
+                return None
+            user_cache().set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+        return user if self.user_can_authenticate(user) else None
+
+
+class SessionFileCache(FileBasedCache):
+    """FileBasedCache without the directory scan on every write.
+
+    The stock backend lists the whole directory in set() to enforce
+    MAX_ENTRIES, so each login gets slower as sessions pile up. Here
+    expired entries are removed by prune() instead, which
+    clear_expired_sessions runs, so the directory holds about as many
+    files as there are live sessions and cached users.
+    """
+
+    def _cull(self):
+        pass
+
+    def prune(self):
+        """Delete expired entries; returns how many were removed."""
+        removed = 0
+        for fname in self._list_cache_files():
+            try:
+                with open(fname, 'rb') as file:
+                    # Deletes the file when it has expired
+                    removed += self._is_expired(file)
+            except FileNotFoundError:
+                # Removed by another process
+                pass
+        return removed
+
+
+def prune_session_cache():
+    """Remove expired entries from the session cache, if it keeps them on disk."""
+    cache = caches[settings.SESSION_CACHE_ALIAS]
+    return cache.prune() if isinstance(cache, SessionFileCache) else 0
+
+
+def delete_expired_sessions(batch_size=1000, pause=0, now=None):
+    """Delete expired sessions in batches; returns the number deleted.
+
+    Each batch is a short transaction of its own, selected through the
+    expire_date index, so logins and other writers get the database
+    between batches instead of waiting behind one long DELETE. pause
+    sleeps that many seconds between batches. Cached copies of the
+    sessions are removed separately by prune_session_cache().
+    """
+    now = now or timezone.now()
+    expired = Session.objects.filter(expire_date__lt=now).order_by('expire_date')
+    deleted = 0
+    while True:
+        keys = list(expired.values_list('session_key', flat=True)[:batch_size])
+        if not keys:
+            return deleted
+        deleted += Session.objects.filter(session_key__in=keys).delete()[0]
+        if pause:
+            time.sleep(pause)
+
@@ -0,0 +1,223 @@
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from .models import Attachment, Review, Package, VillaReport, Comment, UserProfile
+from .counters import adjust_report_counts, move_report_counts, move_report_tallies
+from .notifications import notify
+from .profiles import forget_profile
+from .sessions import forget_user
+from .scheduling import replan_report_task
+from .search import get_search_backend
+from .sla import add_to_rollup, move_report, record_response, report_share
+from .transitions import begin, record, record_deletion
+
+
+# Fragment names used by the {% cache %} blocks in main/home.html
+HOME_PACKAGES_FRAGMENT = 'home_packages'
+HOME_REVIEWS_FRAGMENT = 'home_reviews'
+
+
+def invalidate_fragment(fragment_name):
+    # Delete after commit so a concurrent request can't re-cache stale rows
+    key = make_template_fragment_key(fragment_name)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+@receiver([post_save, post_delete], sender=Package)
+def invalidate_home_packages(sender, **kwargs):
+    invalidate_fragment(HOME_PACKAGES_FRAGMENT)
+
+
+@receiver([post_save, post_delete], sender=Review)
+def invalidate_home_reviews(sender, **kwargs):
+    invalidate_fragment(HOME_REVIEWS_FRAGMENT)
+
+
+@receiver([post_save, post_delete], sender=settings.AUTH_USER_MODEL)
+def invalidate_user(sender, instance, **kwargs):
+    forget_user(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def invalidate_profile(sender, instance, **kwargs):
+    forget_profile(instance.user_id)
+
+
+@receiver(post_save, sender=VillaReport)
+def index_report(sender, instance, **kwargs):
+    get_search_backend().index_report(instance)
+
+
+@receiver(post_delete, sender=VillaReport)
+def unindex_report(sender, instance, **kwargs):
+    get_search_backend().remove_report(instance.pk)
+
+
+@receiver(pre_save, sender=VillaReport)
+def remember_counted_state(sender, instance, raw, update_fields, **kwargs):
+    # Read the stored owner and status so post_save knows which counters to move.
+    # The instance may be stale (e.g. an admin form), so ask the database.
+    # The same read tells the scheduler whether a planned visit needs moving,
+    # and the SLA rollups which totals the report counted towards.
+    instance._counted_state = instance._planned_state = instance._sla_state = None
+    if raw or instance._state.adding:
+        return
+    if update_fields is not None and not (
+            {'user', 'status', 'priority', 'report_type', 'completed_date'} & set(update_fields)):
+        return
+    stored = (
+        VillaReport.objects.filter(pk=instance.pk)
+        .values_list('user_id', 'status', 'priority', 'report_type', 'completed_date').first()
+    )
+    if stored:
+        instance._counted_state, instance._planned_state = stored[:2], stored[2:4]
+        instance._sla_state = stored[1:]
+
+
+@receiver(pre_save, sender=VillaReport)
+def begin_transition(sender, instance, raw, **kwargs):
+    # Runs after remember_counted_state, which read the stored status and
+    # completed_date (unless update_fields leaves both alone)
+    instance._transition = None
+    if raw:
+        return
+    if instance._state.adding:
+        old_status = completed_date = None
+    elif instance._counted_state:
+        old_status, completed_date = instance._counted_state[1], instance._sla_state[3]
+    else:
+        return
+    at = begin(instance, old_status, completed_date)
+    if at is not None:
+        instance._transition = (old_status, at)
+
+
+@receiver(post_save, sender=VillaReport)
+def record_transition(sender, instance, raw, update_fields, **kwargs):
+    if raw or not getattr(instance, '_transition', None):
+        return
+    old_status, at = instance._transition
+    record(instance, old_status, at, update_fields)
+    instance._loaded_status = instance.status
+
+
+@receiver(post_delete, sender=VillaReport)
+def record_report_deletion(sender, instance, **kwargs):
+    record_deletion(instance)
+
+
+@receiver(post_save, sender=VillaReport)
+def count_report(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    state = (instance.status, instance.priority, instance.report_type)
+    if created:
+        adjust_report_counts(instance.user_id, instance.status, 1)
+        move_report_tallies(None, state)
+    elif getattr(instance, '_counted_state', None):
+        old_user_id, old_status = instance._counted_state
+        move_report_counts(old_user_id, old_status, instance.user_id, instance.status)
+        move_report_tallies((old_status, *instance._planned_state), state)
+
+
+@receiver(post_save, sender=VillaReport)
+def notify_status_change(sender, instance, created, raw, **kwargs):
+    if raw or created or not getattr(instance, '_counted_state', None):
+        return
+    old_status = instance._counted_state[1]
+    if old_status != instance.status:
+        notify(instance.user_id, instance.pk, 'status', old_status=old_status, new_status=instance.status)
+
+
+@receiver(post_save, sender=VillaReport)
+def replan_report(sender, instance, created, raw, **kwargs):
+    # Re-plan just this report when it leaves the open statuses or its
+    # priority or type changes; new urgent work is fitted into this week
+    if raw:
+        return
+    if created:
+        if instance.priority == 'urgent' or instance.report_type == 'emergency':
+            replan_report_task.enqueue(instance.pk)
+        return
+    if instance.technician_id is None or not getattr(instance, '_counted_state', None):
+        return
+    if (instance._counted_state[1] != instance.status
+            or instance._planned_state != (instance.priority, instance.report_type)):
+        replan_report_task.enqueue(instance.pk)
+
+
+@receiver(post_delete, sender=VillaReport)
+def uncount_report(sender, instance, **kwargs):
+    # Never create a profile here: the user may be in the middle of being deleted
+    adjust_report_counts(instance.user_id, instance.status, -1, create=False)
+    move_report_tallies((instance.status, instance.priority, instance.report_type), None)
+
+
+@receiver(post_save, sender=VillaReport)
+def roll_up_report(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    if created:
+        move_report(None, instance)
+    elif getattr(instance, '_sla_state', None):
+        move_report(instance._sla_state, instance)
+
+
+@receiver(pre_delete, sender=VillaReport)
+def remember_report_share(sender, instance, **kwargs):
+    # Before the cascade deletes its comments, so the first response is still there
+    instance._sla_share = report_share(instance)
+
+
+@receiver(post_delete, sender=VillaReport)
+def unroll_report(sender, instance, **kwargs):
+    if getattr(instance, '_sla_share', None):
+        add_to_rollup(*instance._sla_share, sign=-1)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, **kwargs):
+    get_search_backend().index_comment(instance)
+
+
+@receiver(post_save, sender=Comment)
+def notify_admin_comment(sender, instance, created, raw, **kwargs):
+    # Owners hear about staff replies; their own comments need no email
+    if raw or not created or not instance.is_admin_comment:
+        return
+    owner_id = instance.villa_report.user_id
+    if owner_id != instance.user_id:
+        notify(owner_id, instance.villa_report_id, 'comment', comment=instance)
+
+
+@receiver(post_save, sender=Comment)
+def roll_up_response(sender, instance, created, raw, **kwargs):
+    # Edits and deletions of staff comments are left to the nightly rollup_sla
+    if raw or not created or not instance.is_admin_comment:
+        return
+    record_response(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    get_search_backend().remove_comment(instance.pk)
+
+
+@receiver(post_delete, sender=Attachment)
+def delete_attachment_files(sender, instance, **kwargs):
+    # Only once the delete is committed, so a rollback can't orphan the row
+    files = [field for field in (instance.file, instance.thumbnail) if field]
+    transaction.on_commit(lambda: [field.storage.delete(field.name) for field in files])
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
@@ -0,0 +1,277 @@
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+from django.utils import timezone
+from .models import Comment, SLARollup, VillaReport
+
+TOTAL_FIELDS = [
+    'reports', 'responded', 'response_time', 'response_met',
+    'completed', 'completion_time', 'completion_met', 'cancelled',
+]
+# Summed durations; everything else is a count
+TIME_FIELDS = {'response_time', 'completion_time'}
+
+
+def zero(field):
+    return timedelta() if field in TIME_FIELDS else 0
+
+
+def month_of(moment):
+    return timezone.localdate(moment).replace(day=1)
+
+
+def rollup_key(report_type, priority, created_at):
+    return (month_of(created_at), report_type, priority)
+
+
+def report_totals(priority, created_at, status, completed_at, first_response=None):
+    """One report's share of its rollup row."""
+    totals = {'reports': 1}
+    if first_response is not None:
+        totals.update(response_totals(priority, created_at, first_response))
+    if status == 'completed':
+        if completed_at is None:
+            raise ValueError('A completed report has no completed_date')
+        duration = completed_at - created_at
+        totals['completed'] = 1
+        totals['completion_time'] = duration
+        totals['completion_met'] = int(duration <= timedelta(hours=settings.SLA_COMPLETION_TARGET_HOURS[priority]))
+    elif status == 'cancelled':
+        totals['cancelled'] = 1
+    return totals
+
+
+def response_totals(priority, created_at, first_response):
+    duration = first_response - created_at
+    return {
+        'responded': 1,
+        'response_time': duration,
+        'response_met': int(duration <= timedelta(hours=settings.SLA_RESPONSE_TARGET_HOURS[priority])),
+    }
+
+
+def first_responses():
+    """Subquery: the time of a report's first staff comment."""
+    return Subquery(
+        Comment.objects.filter(villa_report=OuterRef('pk'), is_admin_comment=True)
+        .order_by('created_at').values('created_at')[:1]
+    )
+
+
+def first_response(report_id):
+    return (
+        Comment.objects.filter(villa_report_id=report_id, is_admin_comment=True)
+        .order_by('created_at').values_list('created_at', flat=True).first()
+    )
+
+
+def add_to_rollup(key, totals, sign=1):
+    """Add (or with sign=-1, take away) totals from a rollup row with one UPDATE.
+
+    A missing row is computed from the reports table, which already includes
+    the change being counted.
+    """
+    updates = {field: F(field) + sign * value for field, value in totals.items() if value}
+    if not updates:
+        return
+    month, report_type, priority = key
+    rows = SLARollup.objects.filter(month=month, report_type=report_type, priority=priority)
+    if rows.update(**updates, updated_at=timezone.now()):
+        return
+    computed = compute_rollups(month, next_month(month), report_type=report_type, priority=priority)
+    row, created = SLARollup.objects.get_or_create(
+        month=month, report_type=report_type, priority=priority, defaults=computed.get(key, {}),
+    )
+    if not created:
+        # Another request created the row in the meantime
+        rows.update(**updates)
+
+
+def move_report(old_state, report):
+    """Move a saved report's share between rollups after a change.
+
+    old_state is the stored (status, priority, report_type, completed_date)
+    before the save, or None for a new report.
+    """
+    new_key = rollup_key(report.report_type, report.priority, report.created_at)
+    new_totals = report_totals(report.priority, report.created_at, report.status, report.completed_date)
+    if old_state is None:
+        add_to_rollup(new_key, new_totals)
+        return
+    status, priority, report_type, completed_date = old_state
+    if old_state == (report.status, report.priority, report.report_type, report.completed_date):
+        return
+    old_key = rollup_key(report_type, priority, report.created_at)
+    old_totals = report_totals(priority, report.created_at, status, completed_date)
+    if old_key != new_key:
+        # The response moves too, and its target depends on the priority
+        responded_at = first_response(report.pk)
+        if responded_at is not None:
+            old_totals.update(response_totals(priority, report.created_at, responded_at))
+            new_totals.update(response_totals(report.priority, report.created_at, responded_at))
+        add_to_rollup(old_key, old_totals, sign=-1)
+        add_to_rollup(new_key, new_totals)
+        return
+    add_to_rollup(new_key, {
+        field: new_totals.get(field, zero(field)) - old_totals.get(field, zero(field)) for field in TOTAL_FIELDS
+    })
+
+
+def report_share(report):
+    """A report's full share, including its response, read before it is deleted."""
+    return rollup_key(report.report_type, report.priority, report.created_at), report_totals(
+        report.priority, report.created_at, report.status, report.completed_date, first_response(report.pk),
+    )
+
+
+def record_response(comment):
+    """Count a staff comment if it is the report's first one."""
+    earlier = Comment.objects.filter(
+        villa_report_id=comment.villa_report_id, is_admin_comment=True, created_at__lte=comment.created_at,
+    ).exclude(pk=comment.pk)
+    if earlier.exists():
+        return
+    report = comment.villa_report
+    add_to_rollup(
+        rollup_key(report.report_type, report.priority, report.created_at),
+        response_totals(report.priority, report.created_at, comment.created_at),
+    )
+
+
+def next_month(month):
+    return (month + timedelta(days=32)).replace(day=1)
+
+
+def months_back(months):
+    """The first day of the month `months` months ago, counting this month."""
+    month = timezone.localdate().replace(day=1)
+    for _ in range(months - 1):
+        month = (month - timedelta(days=1)).replace(day=1)
+    return month
+
+
+def month_start(month):
+    return timezone.make_aware(datetime.combine(month, datetime.min.time()))
+
+
+def compute_rollups(start=None, end=None, **filters):
+    """Recompute rollups from the reports table, as {(month, type, priority): totals}.
+
+    start and end are months (first days) bounding the reports' creation
+    dates; filters narrow the reports further. Reports are streamed with
+    their first staff comment (a correlated subquery on the comment index)
+    and added up with report_totals(), the same function the signals use,
+    so a rebuild can never disagree with the incremental updates.
+    """
+    reports = VillaReport.objects.filter(**filters)
+    if start:
+        reports = reports.filter(created_at__gte=month_start(start))
+    if end:
+        reports = reports.filter(created_at__lt=month_start(end))
+    rows = reports.annotate(first_response=first_responses()).order_by().values_list(
+        'report_type', 'priority', 'created_at', 'status', 'completed_date', 'first_response',
+    )
+    local = timezone.get_current_timezone()
+    rollups = {}
+    for report_type, priority, created_at, status, completed_date, responded_at in rows.iterator(chunk_size=5000):
+        key = (created_at.astimezone(local).date().replace(day=1), report_type, priority)
+        totals = rollups.get(key)
+        if totals is None:
+            totals = rollups[key] = {field: zero(field) for field in TOTAL_FIELDS}
+        for field, value in report_totals(priority, created_at, status, completed_date, responded_at).items():
+            totals[field] += value
+    return rollups
+
+
+def find_drift(start=None, end=None):
+    """Compare stored rollups with the reports table.
+
+    Returns (stale, missing): the rows whose totals are wrong, with the
+    correct values already assigned, and the rows that should exist but
+    don't. Rows whose reports have all gone stay, with zero totals.
+    """
+    computed = compute_rollups(start, end)
+    stored = SLARollup.objects.all()
+    if start:
+        stored = stored.filter(month__gte=start)
+    if end:
+        stored = stored.filter(month__lt=end)
+    zeros = {field: zero(field) for field in TOTAL_FIELDS}
+    stale = []
+    for row in stored.iterator():
+        expected = computed.pop((row.month, row.report_type, row.priority), zeros)
+        if any(getattr(row, field) != value for field, value in expected.items()):
+            for field, value in expected.items():
+                setattr(row, field, value)
+            stale.append(row)
+    missing = [
+        SLARollup(month=month, report_type=report_type, priority=priority, **totals)
+        for (month, report_type, priority), totals in computed.items()
+    ]
+    return stale, missing
+
+
+def rebuild_rollups(start=None, end=None, batch_size=500):
+    """Rewrite every rollup row that has drifted; returns the number of rows fixed."""
+    with transaction.atomic():
+        stale, missing = find_drift(start, end)
+        for row in stale:
+            row.updated_at = timezone.now()
+        SLARollup.objects.bulk_update(stale, [*TOTAL_FIELDS, 'updated_at'], batch_size=batch_size)
+        SLARollup.objects.bulk_create(missing, batch_size=batch_size)
+    return len(stale) + len(missing)
+
+
+def summarize(rows):
+    """Derived figures for a group of rollup totals (dicts or SLARollups)."""
+    totals = {field: zero(field) for field in TOTAL_FIELDS}
+    for row in rows:
+        for field in TOTAL_FIELDS:
+            totals[field] += row[field] if isinstance(row, dict) else getattr(row, field)
+    responded, completed = totals['responded'], totals['completed']
+    return {
+        **totals,
+        'open': totals['reports'] - completed - totals['cancelled'],
+        'response_hours': totals['response_time'].total_seconds() / responded / 3600 if responded else None,
+        'response_met_pct': 100 * totals['response_met'] / responded if responded else None,
+        'completion_hours': totals['completion_time'].total_seconds() / completed / 3600 if completed else None,
+        'completion_met_pct': 100 * totals['completion_met'] / completed if completed else None,
+    }
+
+
+def analytics(months, report_type=None):
+    """Per-month, per-type and per-priority SLA figures for the last `months` months.
+
+    Reads at most months x types x priorities rollup rows, however many
+    reports there are.
+    """
+    start, end = months_back(months), next_month(timezone.localdate().replace(day=1))
+    rows = SLARollup.objects.filter(month__gte=start, month__lt=end)
+    if report_type:
+        rows = rows.filter(report_type=report_type)
+    rows = list(rows.values('month', 'report_type', 'priority', *TOTAL_FIELDS))
+
+    by_month = {}
+    month = start
+    while month < end:
+        by_month[month] = []
+        month = next_month(month)
+    by_type, by_priority = {}, {}
+    for row in rows:
+        by_month[row['month']].append(row)
+        by_type.setdefault(row['report_type'], []).append(row)
+        by_priority.setdefault(row['priority'], []).append(row)
+    types = dict(VillaReport.REPORT_TYPES)
+    priorities = dict(VillaReport.PRIORITY_LEVELS)
+    return {
+        'start': start,
+        'total': summarize(rows),
+        'months': [{'month': month, **summarize(month_rows)} for month, month_rows in by_month.items()],
+        'types': [{'label': types[value], **summarize(by_type[value])} for value in types if value in by_type],
+        'priorities': [
+            {'label': priorities[value], **summarize(by_priority[value])}
+            for value in reversed(priorities) if value in by_priority
+        ],
+    }
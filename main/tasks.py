@@ -0,0 +1,262 @@
+import logging
+import os
+import random
+import socket
+import statistics
+import time
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import Task
+from .perf import percentile
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+class TaskFunction:
+    """A function that can be called directly or queued with enqueue()."""
+
+    def __init__(self, func, name, max_attempts, retry_delay, timeout):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.timeout = timeout
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def enqueue(self, *args, idempotency_key=None, delay=0, **kwargs):
+        return enqueue(self, args, kwargs, idempotency_key=idempotency_key, delay=delay)
+
+    def __repr__(self):
+        return f'<TaskFunction {self.name}>'
+
+
+def task(func=None, *, max_attempts=None, retry_delay=None, timeout=None):
+    """Register a function as a background task.
+
+    Usage::
+
+        @task(max_attempts=5)
+        def send_digest(user_id):
+            ...
+
+        send_digest.enqueue(user.id, idempotency_key=f'digest:{user.id}:{day}')
+
+    Arguments must be JSON serializable. The task is stored under its dotted
+    path, so the worker imports it on demand. A run taking longer than
+    timeout seconds (default TASK_TIMEOUT) is given up on and retried.
+    """
+    def register(func):
+        name = f'{func.__module__}.{func.__qualname__}'
+        _registry[name] = TaskFunction(
+            func, name,
+            max_attempts or settings.TASK_MAX_ATTEMPTS,
+            settings.TASK_RETRY_DELAY if retry_delay is None else retry_delay,
+            timeout or settings.TASK_TIMEOUT,
+        )
+        return _registry[name]
+    return register(func) if func is not None else register
+
+
+def get_task(name):
+    if name not in _registry:
+        # Importing the module registers its tasks
+        import_string(name)
+    return _registry[name]
+
+
+def enqueue(task_function, args=(), kwargs=None, idempotency_key=None, delay=0):
+    """Queue a call; returns the Task row.
+
+    The row is written in the caller's transaction, so a task enqueued by a
+    view that later fails is rolled back with it. With an idempotency key,
+    a task that was already queued under that key (in any state) is
+    returned instead of a new one.
+    """
+    values = {
+        'name': task_function.name,
+        'args': list(args),
+        'kwargs': kwargs or {},
+        'max_attempts': task_function.max_attempts,
+        'timeout': task_function.timeout,
+        'run_at': timezone.now() + timedelta(seconds=delay),
+    }
+    if idempotency_key is None:
+        queued = Task.objects.create(**values)
+    else:
+        try:
+            with transaction.atomic():
+                queued = Task.objects.create(idempotency_key=idempotency_key, **values)
+        except IntegrityError:
+            return Task.objects.get(idempotency_key=idempotency_key)
+    if settings.TASKS_EAGER:
+        transaction.on_commit(lambda: run_eagerly(queued.pk))
+    return queued
+
+
+def run_eagerly(task_id):
+    # Without a worker (tests, local development) tasks run after commit
+    now = timezone.now()
+    if Task.objects.filter(pk=task_id, status='queued').update(
+        status='running', attempts=F('attempts') + 1, started_at=now, heartbeat_at=now, claimed_by='eager',
+    ):
+        execute(task_id)
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim(limit, worker=None):
+    """Mark up to limit due tasks as running for this worker; returns their ids.
+
+    One UPDATE claims the whole batch, tagged with a fresh token, so
+    concurrent workers never run the same task even on SQLite, which has no
+    SELECT ... FOR UPDATE SKIP LOCKED.
+    """
+    now = timezone.now()
+    due = Task.objects.filter(status='queued', run_at__lte=now).order_by('run_at', 'id').values('id')[:limit]
+    token = f'{worker or worker_name()}:{uuid.uuid4().hex[:8]}'
+    claimed = Task.objects.filter(id__in=list(due.values_list('id', flat=True)), status='queued').update(
+        status='running', claimed_by=token, started_at=now, heartbeat_at=now, attempts=F('attempts') + 1,
+    )
+    if not claimed:
+        return []
+    return list(Task.objects.filter(claimed_by=token, status='running').values_list('id', flat=True))
+
+
+def run(task_id):
+    """Executor entry point: run one claimed task in a pool thread or process."""
+    close_old_connections()
+    try:
+        execute(task_id)
+    finally:
+        close_old_connections()
+
+
+def execute(task_id):
+    """Run a claimed task and record its outcome and duration.
+
+    Failures are retried with exponential backoff until max_attempts is
+    reached, then the task is marked failed with its traceback. The
+    outcome is only recorded while this run still holds the claim: a run
+    that was given up on (see requeue_stale) has no say any more.
+    """
+    queued = Task.objects.get(pk=task_id)
+    claimed = Task.objects.filter(pk=task_id, status='running', claimed_by=queued.claimed_by)
+    started = time.perf_counter()
+    try:
+        get_task(queued.name).func(*queued.args, **queued.kwargs)
+    except Exception:
+        duration_ms = (time.perf_counter() - started) * 1000
+        error = traceback.format_exc()
+        try:
+            retry_delay = get_task(queued.name).retry_delay
+        except (ImportError, KeyError):
+            retry_delay = None
+        if retry_delay is not None and queued.attempts < queued.max_attempts:
+            logger.warning('Task %s #%s failed (attempt %s), retrying', queued.name, task_id, queued.attempts)
+            claimed.update(
+                status='queued', last_error=error, duration_ms=duration_ms,
+                run_at=timezone.now() + timedelta(seconds=backoff(queued.attempts, retry_delay)),
+            )
+        else:
+            logger.error('Task %s #%s failed permanently\n%s', queued.name, task_id, error)
+            claimed.update(status='failed', last_error=error, duration_ms=duration_ms, finished_at=timezone.now())
+        return False
+    if not claimed.update(
+        status='succeeded', duration_ms=(time.perf_counter() - started) * 1000, finished_at=timezone.now(),
+    ):
+        logger.warning('Task %s #%s finished after it was given up on; result dropped', queued.name, task_id)
+    return True
+
+
+def backoff(attempt, base):
+    """Seconds to wait before retry number attempt: doubling, capped, with jitter."""
+    delay = min(base * 2 ** (attempt - 1), settings.TASK_MAX_RETRY_DELAY)
+    return delay * random.uniform(0.5, 1.0)
+
+
+def heartbeat(task_ids):
+    """Mark tasks this worker is still running as alive."""
+    if task_ids:
+        Task.objects.filter(pk__in=list(task_ids), status='running').update(heartbeat_at=timezone.now())
+
+
+def requeue_stale(stale_after=None):
+    """Give up on running tasks whose worker went silent or that ran past their timeout.
+
+    A live worker sends heartbeats (see heartbeat()), so only tasks with
+    no heartbeat for stale_after seconds (default TASK_STALE_AFTER) or
+    running longer than their own timeout are affected, however long they
+    have been running. The lost run was one of the task's attempts: the
+    task is queued again, or marked failed once it has used max_attempts.
+    Returns how many tasks were given up on.
+    """
+    now = timezone.now()
+    silent_since = now - timedelta(seconds=stale_after or settings.TASK_STALE_AFTER)
+    given_up = 0
+    # Only running tasks, so a handful of rows per worker
+    rows = Task.objects.filter(status='running').values_list(
+        'id', 'name', 'claimed_by', 'started_at', 'heartbeat_at', 'timeout', 'attempts', 'max_attempts',
+    )
+    for task_id, name, claimed_by, started_at, heartbeat_at, timeout, attempts, max_attempts in rows:
+        if started_at + timedelta(seconds=timeout) < now:
+            error = f'Timed out after {timeout}s'
+        elif (heartbeat_at or started_at) < silent_since:
+            error = f'Worker {claimed_by} stopped responding'
+        else:
+            continue
+        claimed = Task.objects.filter(pk=task_id, status='running', claimed_by=claimed_by)
+        if attempts >= max_attempts:
+            logger.error('Task %s #%s failed permanently: %s', name, task_id, error)
+            given_up += claimed.update(status='failed', last_error=error, finished_at=now)
+        else:
+            logger.warning('Task %s #%s requeued (attempt %s): %s', name, task_id, attempts, error)
+            given_up += claimed.update(status='queued', last_error=error, run_at=now)
+    return given_up
+
+
+def purge_finished(days=None):
+    """Delete succeeded tasks older than TASK_RETENTION_DAYS; returns how many."""
+    days = settings.TASK_RETENTION_DAYS if days is None else days
+    deleted, _ = Task.objects.filter(
+        status='succeeded', finished_at__lt=timezone.now() - timedelta(days=days),
+    ).delete()
+    return deleted
+
+
+def task_stats(since=None):
+    """Per-task counts and timing percentiles (ms) for tasks created since since."""
+    tasks = Task.objects.all()
+    if since is not None:
+        tasks = tasks.filter(created_at__gte=since)
+    stats = {}
+    rows = tasks.order_by().values_list('name', 'status', 'attempts', 'duration_ms', 'run_at', 'started_at')
+    for name, status, attempts, duration_ms, run_at, started_at in rows.iterator(chunk_size=2000):
+        entry = stats.setdefault(name, {'name': name, 'durations': [], 'waits': [], 'retries': 0})
+        entry[status] = entry.get(status, 0) + 1
+        entry['retries'] += max(attempts - 1, 0)
+        if status == 'succeeded' and duration_ms is not None:
+            entry['durations'].append(duration_ms)
+            entry['waits'].append(max((started_at - run_at).total_seconds() * 1000, 0))
+    for entry in stats.values():
+        durations = sorted(entry.pop('durations'))
+        waits = sorted(entry.pop('waits'))
+        entry.update(
+            p50_ms=statistics.median(durations) if durations else None,
+            p95_ms=percentile(durations, 95),
+            max_ms=durations[-1] if durations else None,
+            wait_p50_ms=statistics.median(waits) if waits else None,
+        )
+    return sorted(stats.values(), key=lambda entry: entry['name'])
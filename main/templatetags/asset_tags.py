@@ -0,0 +1,36 @@
+from functools import lru_cache
+
+from django import template
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.utils.safestring import mark_safe
+from main.assets import extract_critical_css
+
+register = template.Library()
+
+
+@lru_cache(maxsize=None)
+def critical_css(path):
+    """Critical rules of a stylesheet, extracted once per process.
+
+    Reads the collected file when collectstatic has run, otherwise the
+    source file found by the staticfiles finders.
+    """
+    try:
+        with staticfiles_storage.open(staticfiles_storage.stored_name(path)) as file:
+            css = file.read().decode('utf-8')
+    except (OSError, ValueError):
+        source = finders.find(path)
+        if not source:
+            return ''
+        with open(source, encoding='utf-8') as file:
+            css = file.read()
+    # The contents go inside <style>, where '</' could close the element early
+    return extract_critical_css(css, settings.CRITICAL_CSS_SELECTORS).replace('</', '<\\/')
+
+
+@register.simple_tag
+def inline_critical_css(path):
+    """Usage: <style>{% inline_critical_css 'css/style.css' %}</style>"""
+    return mark_safe(critical_css(path))
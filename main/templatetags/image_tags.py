@@ -0,0 +1,37 @@
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html, format_html_join
+from main.images import MIME_TYPES, load_manifest, srcsets
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(name, alt, sizes='100vw', loading='lazy', fallback='', **attrs):
+    """Render an ingested image as <picture> with one srcset per format.
+
+    Usage::
+
+        {% responsive_image 'home/villa-1' 'Luxury Villa' sizes='(min-width: 1200px) 1140px, 100vw' class='w-100' %}
+
+    Images below the fold keep the default loading='lazy'; pass
+    loading='eager' for the largest above-the-fold image. Until the image
+    has been ingested, a plain <img> pointing at fallback is rendered.
+    """
+    attrs.update(alt=alt, loading=loading, decoding='async')
+    manifest = load_manifest(name)
+    if manifest is None:
+        return format_html('<img src="{}"{}>', fallback, flatatt(attrs))
+
+    sets = srcsets(name, manifest)
+    jpeg = sets.pop('jpeg')
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        ((MIME_TYPES[fmt], srcset, sizes) for fmt, srcset in sets.items()),
+    )
+    # width/height let the browser reserve space before the image arrives
+    attrs.update(
+        srcset=jpeg, sizes=sizes, width=manifest['width'], height=manifest['height'],
+        src=jpeg.split(', ')[0].rsplit(' ', 1)[0],
+    )
+    return format_html('<picture>{}<img{}></picture>', sources, flatatt(attrs))
@@ -1,60 +1,196 @@
+import ast
+import os
+import re
+from functools import lru_cache
+from pathlib import Path
+from types import MappingProxyType
+
 from django import template
+from django.conf import settings
+from django.template.base import TextNode
 from django.utils.translation import gettext as _
 
 register = template.Library()
 
+# Built-in Italian strings. They take precedence over locale/it/.../django.po
+# so pages render exactly as they did before the .po files were loaded.
+ITALIAN = MappingProxyType({
+    'Home': 'Casa',
+    'About': 'Chi Siamo',
+    'Services': 'Servizi',
+    'Packages': 'Pacchetti',
+    'Contact': 'Contatto',
+    'Reviews': 'Recensioni',
+    'Login': 'Accedi',
+    'Register': 'Registrati',
+    'Dashboard': 'Dashboard',
+    'My Reports': 'I Miei Report',
+    'Profile': 'Profilo',
+    'Logout': 'Esci',
+    'Admin Dashboard': 'Dashboard Admin',
+    'Create Report': 'Crea Report',
+    'Django Admin': 'Django Admin',
+    'VillaCare': 'VillaCare',
+    'Luxury Villa Service Excellence': 'Eccellenza nei Servizi Villa di Lusso',
+    'Experience the pinnacle of villa care services. We provide comprehensive maintenance, management, and care solutions for your luxury properties with unmatched attention to detail.': 'Sperimenta l\'apice dei servizi di cura della villa. Forniamo soluzioni complete di manutenzione, gestione e cura per le tue proprietà di lusso con un\'attenzione ai dettagli senza pari.',
+    'View Packages': 'Visualizza Pacchetti',
+    'Get Started': 'Inizia',
+    'Our Work': 'Il Nostro Lavoro',
+    'About VillaCare': 'Chi Siamo VillaCare',
+    'Excellence in luxury villa care and management': 'Eccellenza nella cura e gestione di ville di lusso',
+    'Our Services': 'I Nostri Servizi',
+    'Comprehensive villa care solutions tailored to your needs': 'Soluzioni complete di cura della villa su misura per le tue esigenze',
+    'Maintenance & Repairs': 'Manutenzione e Riparazioni',
+    'Landscaping & Garden Care': 'Paesaggistica e Cura del Giardino',
+    'Security & Monitoring': 'Sicurezza e Monitoraggio',
+    'Concierge Services': 'Servizi di Concierge',
+    'Pool & Spa Maintenance': 'Manutenzione Piscina e Spa',
+    'Property Management': 'Gestione Proprietà',
+    'Service Packages': 'Pacchetti di Servizio',
+    'Choose the perfect package for your villa care needs': 'Scegli il pacchetto perfetto per le tue esigenze di cura della villa',
+    'Contact Us': 'Contattaci',
+    'Get in touch for personalized villa care solutions': 'Mettiti in contatto per soluzioni personalizzate di cura della villa',
+    'Your Name': 'Il Tuo Nome',
+    'Your Email': 'La Tua Email',
+    'Your Message': 'Il Tuo Messaggio',
+    'Send Message': 'Invia Messaggio',
+    'Client Reviews': 'Recensioni Clienti',
+    'What our luxury villa owners say about us': 'Cosa dicono di noi i proprietari di ville di lusso',
+    'Share Your Experience': 'Condividi la Tua Esperienza',
+    'Your Review': 'La Tua Recensione',
+    'Submit Review': 'Invia Recensione',
+    'Quick Links': 'Link Rapidi',
+    'Contact Info': 'Informazioni di Contatto',
+    'Search services...': 'Cerca servizi...',
+    'Search': 'Cerca',
+    '© 2024 VillaCare. All rights reserved. | Luxury Villa Care Services': '© 2024 VillaCare. Tutti i diritti riservati. | Servizi di Cura Villa di Lusso',})
+
+LANGUAGE_CODE = re.compile(r'[A-Za-z]{2,3}(?:[_-][A-Za-z0-9]+)*')
+PO_STRING = re.compile(r'^(msgctxt|msgid|msgid_plural|msgstr)\s+(".*")$')
+
+
+def parse_po(path):
+    """Read singular, non-fuzzy msgid -> msgstr pairs from a .po file."""
+    entries = {}
+    entry, key, fuzzy = {}, None, False
+
+    def finish():
+        msgid, msgstr = entry.get('msgid'), entry.get('msgstr')
+        if msgid and msgstr and not fuzzy and 'msgctxt' not in entry and 'msgid_plural' not in entry:
+            entries[msgid] = msgstr
+
+    for line in Path(path).read_text(encoding='utf-8').splitlines():
+        line = line.strip()
+        match = PO_STRING.match(line)
+        if line.startswith('"') and key:
+            # Continuation line of a multi-line string
+            entry[key] += ast.literal_eval(line)
+            continue
+        if 'msgstr' in entry and (not match or match.group(1) in ('msgctxt', 'msgid')):
+            # A blank line, comment or new msgid ends the previous entry
+            finish()
+            entry, key, fuzzy = {}, None, False
+        if line.startswith('#,') and 'fuzzy' in line:
+            fuzzy = True
+        elif match:
+            key = match.group(1)
+            entry[key] = ast.literal_eval(match.group(2))
+    finish()
+    return entries
+
+
+@lru_cache(maxsize=32)
+def get_catalogue(language):
+    """Immutable msgid -> translation mapping for language, built once per process."""
+    catalogue = {}
+    # Language codes become path components, so only plain codes are looked up
+    for locale_path in settings.LOCALE_PATHS if LANGUAGE_CODE.fullmatch(language) else ():
+        po_file = os.path.join(locale_path, language, 'LC_MESSAGES', 'django.po')
+        if os.path.exists(po_file):
+            catalogue.update(parse_po(po_file))
+    if language == 'it':
+        catalogue.update(ITALIAN)
+    return MappingProxyType(catalogue)
+
+
 @register.simple_tag
 def get_translation(text, language='it'):
-    """Simple translation function for template use - Italian only"""
-    translations = {
-        'Home': 'Casa',
-        'About': 'Chi Siamo',
-        'Services': 'Servizi',
-        'Packages': 'Pacchetti',
-        'Contact': 'Contatto',
-        'Reviews': 'Recensioni',
-        'Login': 'Accedi',
-        'Register': 'Registrati',
-        'Dashboard': 'Dashboard',
-        'My Reports': 'I Miei Report',
-        'Profile': 'Profilo',
-        'Logout': 'Esci',
-        'Admin Dashboard': 'Dashboard Admin',
-        'Create Report': 'Crea Report',
-        'Django Admin': 'Django Admin',
-        'VillaCare': 'VillaCare',
-        'Luxury Villa Service Excellence': 'Eccellenza nei Servizi Villa di Lusso',
-        'Experience the pinnacle of villa care services. We provide comprehensive maintenance, management, and care solutions for your luxury properties with unmatched attention to detail.': 'Sperimenta l\'apice dei servizi di cura della villa. Forniamo soluzioni complete di manutenzione, gestione e cura per le tue proprietà di lusso con un\'attenzione ai dettagli senza pari.',
-        'View Packages': 'Visualizza Pacchetti',
-        'Get Started': 'Inizia',
-        'Our Work': 'Il Nostro Lavoro',
-        'About VillaCare': 'Chi Siamo VillaCare',
-        'Excellence in luxury villa care and management': 'Eccellenza nella cura e gestione di ville di lusso',
-        'Our Services': 'I Nostri Servizi',
-        'Comprehensive villa care solutions tailored to your needs': 'Soluzioni complete di cura della villa su misura per le tue esigenze',
-        'Maintenance & Repairs': 'Manutenzione e Riparazioni',
-        'Landscaping & Garden Care': 'Paesaggistica e Cura del Giardino',
-        'Security & Monitoring': 'Sicurezza e Monitoraggio',
-        'Concierge Services': 'Servizi di Concierge',
-        'Pool & Spa Maintenance': 'Manutenzione Piscina e Spa',
-        'Property Management': 'Gestione Proprietà',
-        'Service Packages': 'Pacchetti di Servizio',
-        'Choose the perfect package for your villa care needs': 'Scegli il pacchetto perfetto per le tue esigenze di cura della villa',
-        'Contact Us': 'Contattaci',
-        'Get in touch for personalized villa care solutions': 'Mettiti in contatto per soluzioni personalizzate di cura della villa',
-        'Your Name': 'Il Tuo Nome',
-        'Your Email': 'La Tua Email',
-        'Your Message': 'Il Tuo Messaggio',
-        'Send Message': 'Invia Messaggio',
-        'Client Reviews': 'Recensioni Clienti',
-        'What our luxury villa owners say about us': 'Cosa dicono di noi i proprietari di ville di lusso',
-        'Share Your Experience': 'Condividi la Tua Esperienza',
-        'Your Review': 'La Tua Recensione',
-        'Submit Review': 'Invia Recensione',
-        'Quick Links': 'Link Rapidi',
-        'Contact Info': 'Informazioni di Contatto',
-        'Search services...': 'Cerca servizi...',
-        'Search': 'Cerca',
-        '© 2024 VillaCare. All rights reserved. | Luxury Villa Care Services': '© 2024 VillaCare. Tutti i diritti riservati. | Servizi di Cura Villa di Lusso',
-    }
-    return translations.get(text, text)
+    """Simple translation function for template use"""
+    return get_catalogue(language).get(text, text)
+
+
+MARKER = re.compile(r'\[\[(.+?)\]\]')
+
+
+class TranslatedTextNode(TextNode):
+    """Template text split at parse time into literals and [[msgid]] markers."""
+
+    def __init__(self, s):
+        super().__init__(s)
+        self.parts = MARKER.split(s)
+
+    def render(self, context):
+        catalogue = context.render_context.get(TranslateBlockNode.catalogue_key)
+        if catalogue is None:
+            return self.s
+        # Odd positions hold the msgids captured by MARKER
+        return ''.join(
+            catalogue.get(part, part) if index % 2 else part
+            for index, part in enumerate(self.parts)
+        )
+
+    def render_annotated(self, context):
+        # TextNode short-circuits this to return self.s
+        return self.render(context)
+
+
+class TranslateBlockNode(template.Node):
+    catalogue_key = 'translation_tags.catalogue'
+
+    def __init__(self, nodelist, language):
+        self.nodelist = nodelist
+        self.language = language
+
+    def render(self, context):
+        if self.language is not None:
+            language = self.language.resolve(context)
+        else:
+            language = context.get('LANGUAGE_CODE') or settings.LANGUAGE_CODE
+        with context.render_context.push(**{self.catalogue_key: get_catalogue(language)}):
+            return self.nodelist.render(context)
+
+
+def compile_markers(nodelist):
+    for index, node in enumerate(nodelist):
+        if isinstance(node, TextNode) and '[[' in node.s:
+            nodelist[index] = TranslatedTextNode(node.s)
+        # {% if %} keeps its branches in conditions_nodelists, not child_nodelists
+        for condition, child in getattr(node, 'conditions_nodelists', ()):
+            compile_markers(child)
+        for attr in node.child_nodelists:
+            child = getattr(node, attr, None)
+            if child and not isinstance(node, TranslateBlockNode):
+                compile_markers(child)
+
+
+@register.tag
+def translateblock(parser, token):
+    """Translate every [[msgid]] in the enclosed template text in one pass.
+
+    Usage::
+
+        {% translateblock %}<a href="#home">[[Home]]</a>{% endtranslateblock %}
+        {% translateblock 'en' %}...{% endtranslateblock %}
+
+    Markers are found when the template is compiled, so rendering only does
+    one catalogue lookup per marker. Markers inside variables are not
+    translated. The language defaults to LANGUAGE_CODE.
+    """
+    bits = token.split_contents()
+    if len(bits) > 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes at most one argument (the language)")
+    language = parser.compile_filter(bits[1]) if len(bits) == 2 else None
+    nodelist = parser.parse(('endtranslateblock',))
+    parser.delete_first_token()
+    compile_markers(nodelist)
+    return TranslateBlockNode(nodelist, language)
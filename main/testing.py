@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """DiscoverRunner with a private in-memory session cache.
+
+    The default file tier would otherwise share var/session_cache with the
+    development server.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.session_cache = override_settings(CACHES={
+            **settings.CACHES,
+            settings.SESSION_CACHE_ALIAS: settings.SESSION_CACHE_TIERS['locmem'],
+        })
+        self.session_cache.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.session_cache.disable()
+        super().teardown_test_environment(**kwargs)
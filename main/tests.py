@@ -1,3 +1,1865 @@
-from django.test import TestCase
+import asyncio
+import csv
+import datetime
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from importlib import import_module
+from pathlib import Path
+from io import BytesIO, StringIO
+from unittest.mock import patch
+from xml.etree import ElementTree
 
-# Create your tests here.
+from django.apps import apps
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache, caches
+from django.core.exceptions import ValidationError
+from django.core.mail.backends.locmem import EmailBackend as LocmemEmailBackend
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.models import F
+from django.template import engines
+from django.test.utils import CaptureQueriesContext
+from django.test import (
+    AsyncRequestFactory, Client, LiveServerTestCase, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase,
+    override_settings,
+)
+from django.urls import reverse
+from django.utils import timezone
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.sessions.backends.cached_db import SessionStore
+from django.contrib.sessions.models import Session
+from .models import (
+    Attachment, Contact, Review, Package, UserProfile, VillaReport, Comment, Task, Notification, Technician,
+    SLARollup, StatusSnapshot, StatusTransition,
+)
+from .admin import UserProfileAdmin
+from .pagination import CursorPaginator
+from . import views, write_queue
+from PIL import Image
+from .assets import extract_critical_css, minify_css, minify_js
+from .counters import report_tallies
+from .events import Broker, broker, report_stream
+from .reports_io import COLUMNS
+from .tasks import claim, execute, heartbeat, requeue_stale, task, task_stats
+from .images import ingest, load_manifest
+from .loadtest import run_client
+from .notifications import DeliveryCallback, deliver_pending, notify
+from .perf import close_handlers, percentile, process_log_file, read_records, write_record
+from .profiles import ProfileMiddleware
+from .sessions import SessionFileCache
+from .scheduling import plan_week, replan_report, week_start_for
+from .sla import find_drift, rebuild_rollups, report_totals
+from .templatetags.asset_tags import critical_css
+from .transitions import backfill_transitions, status_at, status_counts_at, take_snapshot, with_status_at
+from .templatetags.translation_tags import get_catalogue, parse_po
+from .write_queue import BatchWriter
+
+
+class HomeFragmentCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Package.objects.create(
+            name='Essential Care', package_type='weekly', description='Basic care',
+            price=299, features='Garden care',
+        )
+        Review.objects.create(name='Sarah', rating=5, comment='Great', is_approved=True)
+
+    def test_cached_fragments_skip_queries(self):
+        self.client.get(reverse('home'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('home'))
+        self.assertContains(response, 'Essential Care')
+        self.assertContains(response, 'Sarah')
+
+    def test_package_change_invalidates_fragment(self):
+        self.client.get(reverse('home'))
+        with self.captureOnCommitCallbacks(execute=True):
+            Package.objects.create(
+                name='Luxury Care', package_type='yearly', description='Everything',
+                price=12999, features='Concierge',
+            )
+        self.assertContains(self.client.get(reverse('home')), 'Luxury Care')
+
+    def test_review_approval_invalidates_fragment(self):
+        review = Review.objects.create(name='Michael', rating=4, comment='Good')
+        self.assertNotContains(self.client.get(reverse('home')), 'Michael')
+        with self.captureOnCommitCallbacks(execute=True):
+            review.is_approved = True
+            review.save()
+        self.assertContains(self.client.get(reverse('home')), 'Michael')
+
+
+class StatusSummaryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner', password='pass12345')
+        other = User.objects.create_user('other', password='pass12345')
+        for user, status, priority, report_type in [
+            (self.user, 'pending', 'high', 'maintenance'),
+            (self.user, 'pending', 'low', 'pool'),
+            (self.user, 'completed', 'high', 'pool'),
+            (other, 'in_progress', 'urgent', 'emergency'),
+        ]:
+            VillaReport.objects.create(
+                user=user, status=status, priority=priority, report_type=report_type,
+                title='Report', description='Details', location='Kitchen',
+            )
+
+    def test_summary_is_single_query(self):
+        with self.assertNumQueries(1):
+            summary = VillaReport.objects.status_summary()
+        self.assertEqual(summary['total'], 4)
+        self.assertEqual(summary['status_pending'], 2)
+        self.assertEqual(summary['status_in_progress'], 1)
+        self.assertEqual(summary['status_cancelled'], 0)
+        self.assertEqual(summary['priority_high'], 2)
+        self.assertEqual(summary['report_type_pool'], 2)
+
+    def test_summary_respects_filters(self):
+        summary = VillaReport.objects.filter(user=self.user).status_summary()
+        self.assertEqual(summary['total'], 3)
+        self.assertEqual(summary['status_completed'], 1)
+        self.assertEqual(summary['priority_urgent'], 0)
+
+
+class QueryBudgetTests(TestCase):
+    """Each view must run a fixed number of queries regardless of data size."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('staff', password='pass12345', is_staff=True, is_superuser=True)
+        cls.owner = User.objects.create_user('owner', password='pass12345', first_name='John')
+        users = User.objects.bulk_create([User(username=f'client{i}') for i in range(10)])
+        UserProfile.objects.bulk_create([UserProfile(user=user) for user in users + [cls.owner]])
+        VillaReport.objects.bulk_create([
+            VillaReport(
+                user=user, title=f'Report {i}', description='Details', location='Pool',
+                report_type='pool', priority='high', status='pending',
+            )
+            for user in users + [cls.owner] for i in range(30)
+        ])
+        cls.report = VillaReport.objects.filter(user=cls.owner).first()
+        Comment.objects.bulk_create([
+            Comment(villa_report=report, user=user, comment='Update')
+            for report in VillaReport.objects.all()
+            for user in (report.user, cls.admin)
+        ])
+
+    def setUp(self):
+        # Cached profiles would hide the query that loads them
+        cache.clear()
+
+    def assertViewQueries(self, num, url, user):
+        self.client.force_login(user)
+        with self.assertNumQueries(num):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_dashboard(self):
+        self.assertViewQueries(3, reverse('dashboard'), self.owner)
+        # The user and profile now come from the cache
+        with self.assertNumQueries(1):
+            self.client.get(reverse('dashboard'))
+
+    def test_villa_reports(self):
+        self.assertViewQueries(2, reverse('villa_reports'), self.owner)
+
+    def test_villa_report_detail(self):
+        self.assertViewQueries(4, reverse('villa_report_detail', args=[self.report.id]), self.owner)
+
+    def test_admin_dashboard(self):
+        self.assertViewQueries(4, reverse('admin_dashboard'), self.admin)
+
+    def test_admin_report_detail(self):
+        self.assertViewQueries(4, reverse('admin_report_detail', args=[self.report.id]), self.admin)
+
+    def test_admin_villareport_changelist(self):
+        self.assertViewQueries(4, reverse('admin:main_villareport_changelist'), self.admin)
+
+    def test_admin_comment_changelist(self):
+        self.assertViewQueries(4, reverse('admin:main_comment_changelist'), self.admin)
+
+    def test_admin_userprofile_changelist(self):
+        self.assertViewQueries(6, reverse('admin:main_userprofile_changelist'), self.admin)
+
+
+class CursorPaginatorTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner', password='pass12345')
+        VillaReport.objects.bulk_create([
+            VillaReport(user=self.user, title=f'Report {i}', description='Details', location='Pool', report_type='pool')
+            for i in range(25)
+        ])
+        # Force timestamp ties so ordering has to fall back to the id
+        VillaReport.objects.filter(id__in=VillaReport.objects.order_by('id').values('id')[:8]).update(
+            created_at=VillaReport.objects.order_by('id').first().created_at
+        )
+        self.expected = list(VillaReport.objects.order_by('-created_at', '-id'))
+        self.paginator = CursorPaginator(VillaReport.objects.filter(user=self.user), 10)
+
+    def test_walk_forward_and_back(self):
+        first = self.paginator.get_page()
+        self.assertFalse(first.has_previous())
+        second = self.paginator.get_page(first.next_cursor)
+        third = self.paginator.get_page(second.next_cursor)
+        self.assertFalse(third.has_next())
+        self.assertEqual(list(first) + list(second) + list(third), self.expected)
+
+        back = self.paginator.get_page(third.previous_cursor)
+        self.assertEqual(list(back), list(second))
+        top = self.paginator.get_page(back.previous_cursor)
+        self.assertEqual(list(top), list(first))
+        self.assertFalse(top.has_previous())
+
+    def test_invalid_cursor_returns_first_page(self):
+        self.assertEqual(list(self.paginator.get_page('not-a-cursor')), self.expected[:10])
+
+    def test_deep_page_is_single_query(self):
+        cursor = self.paginator.encode_cursor('next', self.expected[19])
+        with self.assertNumQueries(1):
+            page = self.paginator.get_page(cursor)
+        self.assertEqual(list(page), self.expected[20:])
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner')
+        cls.other = User.objects.create_user('other')
+        cls.admin = User.objects.create_user('staff', is_staff=True)
+        cls.pool = VillaReport.objects.create(
+            user=cls.owner, title='Pool pump failure', description='The <b>pump</b> is leaking',
+            location='Pool Area', report_type='pool',
+        )
+        cls.garden = VillaReport.objects.create(
+            user=cls.other, title='Garden lights', description='Lights near the pool are off',
+            location='Garden', report_type='landscaping',
+        )
+        Comment.objects.create(villa_report=cls.garden, user=cls.admin, comment='Electrician booked')
+
+    def search(self, user, query):
+        self.client.force_login(user)
+        return self.client.get(reverse('search'), {'q': query})
+
+    def test_owner_only_sees_own_reports(self):
+        response = self.search(self.owner, 'pool')
+        self.assertEqual([r.report_id for r in response.context['results']], [self.pool.id])
+
+    def test_staff_results_are_ranked_and_highlighted(self):
+        results = self.search(self.admin, 'pool').context['results']
+        # A title match outranks a match in the description
+        self.assertEqual([r.report_id for r in results], [self.pool.id, self.garden.id])
+        self.assertIn('<mark>Pool</mark>', results[0].title)
+        self.assertIn('&lt;b&gt;', results[0].snippet)
+
+    def test_comments_are_indexed_and_removed(self):
+        results = self.search(self.admin, 'electrician').context['results']
+        self.assertEqual([(r.kind, r.report_id) for r in results], [('comment', self.garden.id)])
+        self.garden.comments.all().delete()
+        self.assertEqual(self.search(self.admin, 'electrician').context['results'], [])
+
+    def test_updates_and_reassignment_are_reindexed(self):
+        self.garden.title = 'Outdoor lighting'
+        self.garden.user = self.owner
+        self.garden.save()
+        results = self.search(self.admin, 'outdoor').context['results']
+        self.assertEqual([r.report_id for r in results], [self.garden.id])
+        results = self.search(self.owner, 'electrician').context['results']
+        self.assertEqual([r.report_id for r in results], [self.garden.id])
+
+    def test_query_syntax_is_escaped(self):
+        response = self.search(self.admin, 'pool" OR (NEAR')
+        self.assertEqual(response.status_code, 200)
+
+    def test_stemming_and_explicit_prefix(self):
+        self.assertEqual(len(self.search(self.admin, 'pumps').context['results']), 1)
+        self.assertEqual(self.search(self.admin, 'electric').context['results'], [])
+        self.assertEqual(len(self.search(self.admin, 'electric*').context['results']), 1)
+
+    def test_admin_changelist_uses_index(self):
+        self.admin.is_superuser = True
+        self.admin.save()
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('admin:main_villareport_changelist'), {'q': 'pump'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.pool])
+
+
+class BatchWriterTests(TestCase):
+    def setUp(self):
+        self.journal_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.journal_dir)
+
+    def make_writer(self, **kwargs):
+        options = {'batch_size': 2, 'flush_interval': 0.05, 'journal_dir': self.journal_dir}
+        options.update(kwargs)
+        return BatchWriter(Contact, **options)
+
+    async def test_rows_are_saved_in_batches_and_journal_cleared(self):
+        writer = self.make_writer()
+        for i in range(5):
+            await writer.submit({'name': f'Guest {i}', 'email': f'guest{i}@example.com', 'message': 'Hi'})
+        await writer.drain()
+        self.assertEqual(await Contact.objects.acount(), 5)
+        self.assertEqual(list(self.journal_dir.iterdir()), [])
+
+    async def test_flush_interval_saves_partial_batch(self):
+        writer = self.make_writer(batch_size=100)
+        await writer.submit({'name': 'Guest', 'email': 'guest@example.com', 'message': 'Hi'})
+        await asyncio.sleep(0.3)
+        self.assertEqual(await Contact.objects.acount(), 1)
+        await writer.drain()
+
+    def test_recover_replays_journal_of_dead_process(self):
+        journal = self.journal_dir / 'main.contact-999999999-0.jsonl'
+        journal.write_text(
+            json.dumps({'name': 'Guest', 'email': 'guest@example.com', 'message': 'Hi'}) + '\n'
+            + '{"name": "Torn'
+        )
+        self.assertEqual(self.make_writer().recover(), 1)
+        self.assertFalse(journal.exists())
+        self.assertTrue(Contact.objects.filter(name='Guest').exists())
+
+    def test_recover_claims_segments_and_skips_checkpointed_rows(self):
+        rows = [{'name': f'Guest {i}', 'email': f'guest{i}@example.com', 'message': 'Hi'} for i in range(3)]
+        journal = self.journal_dir / 'main.contact-999999999-0.jsonl'
+        journal.write_text(''.join(json.dumps(row) + '\n' for row in rows[:2]) + '#saved 2\n' + json.dumps(rows[2]) + '\n')
+        # A segment another live process has claimed is left to it
+        claimed = self.journal_dir / f'main.contact-{os.getpid()}-recovered-abc.jsonl'
+        claimed.write_text(json.dumps(rows[0]) + '\n')
+        writer = self.make_writer()
+        real_rename = os.rename
+        with patch('main.write_queue.os.rename', side_effect=real_rename) as rename:
+            self.assertEqual(writer.recover(), 1)
+        # Replayed only after renaming it into this process's name
+        self.assertIn(f'-{os.getpid()}-recovered-', rename.call_args.args[1].name)
+        self.assertEqual(list(Contact.objects.values_list('name', flat=True)), ['Guest 2'])
+        self.assertEqual(list(self.journal_dir.iterdir()), [claimed])
+        # Losing the rename race means someone else is replaying it
+        journal.write_text(json.dumps(rows[0]) + '\n')
+        with patch('main.write_queue.os.rename', side_effect=FileNotFoundError):
+            self.assertEqual(writer.recover(), 0)
+
+    async def test_segments_rotate_by_size_not_per_flush(self):
+        writer = self.make_writer(segment_size=10 ** 6)
+        for i in range(4):
+            await writer.submit({'name': f'Guest {i}', 'email': f'guest{i}@example.com', 'message': 'Hi'})
+        await asyncio.sleep(0.2)
+        self.assertEqual(await Contact.objects.acount(), 4)
+        # Two flushes, one segment whose rows are all checkpointed
+        journal, = self.journal_dir.iterdir()
+        self.assertEqual(journal.read_text().splitlines()[-1], '#saved 4')
+        writer.segment_size = 1
+        await writer.submit({'name': 'Guest 4', 'email': 'guest4@example.com', 'message': 'Hi'})
+        await asyncio.sleep(0.2)
+        # The full segment was rotated out and deleted once saved
+        self.assertNotIn(journal, list(self.journal_dir.iterdir()))
+        await writer.drain()
+        self.assertEqual(list(self.journal_dir.iterdir()), [])
+
+    async def test_async_view_validates_inline_and_queues(self):
+        with override_settings(WRITE_QUEUE_JOURNAL_DIR=self.journal_dir), patch.dict(write_queue._writers, clear=True):
+            factory = AsyncRequestFactory()
+            response = await views.submit_review_async(
+                factory.post('/submit-review/', {'name': 'Sarah', 'rating': 9, 'comment': 'Great'})
+            )
+            # Validation errors come back in the response, nothing is queued
+            self.assertIn('rating', json.loads(response.content)['errors'])
+            response = await views.submit_review_async(
+                factory.post('/submit-review/', {'name': 'Sarah', 'rating': 5, 'comment': 'Great'})
+            )
+            self.assertTrue(json.loads(response.content)['success'])
+            await write_queue.drain_all()
+        review = await Review.objects.aget(name='Sarah')
+        self.assertFalse(review.is_approved)
+
+
+class ReportCounterTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner', password='pass12345')
+        self.other = User.objects.create_user('other', password='pass12345')
+        self.admin = User.objects.create_user('staff', password='pass12345', is_staff=True, is_superuser=True)
+
+    def create_report(self, user, **kwargs):
+        return VillaReport.objects.create(
+            user=user, title='Leak', description='Details', location='Pool', report_type='pool', **kwargs
+        )
+
+    def counts(self, user):
+        return UserProfile.objects.get(user=user).report_counts()
+
+    def test_create_status_change_reassign_and_delete(self):
+        report = self.create_report(self.owner)
+        self.create_report(self.owner, status='completed')
+        self.assertEqual(self.counts(self.owner), {
+            'total': 2, 'status_pending': 1, 'status_in_progress': 0,
+            'status_completed': 1, 'status_cancelled': 0,
+        })
+        report.status = 'in_progress'
+        report.save()
+        self.assertEqual(self.counts(self.owner)['status_pending'], 0)
+        self.assertEqual(self.counts(self.owner)['status_in_progress'], 1)
+
+        report.user = self.other
+        report.save()
+        self.assertEqual(self.counts(self.owner)['total'], 1)
+        self.assertEqual(self.counts(self.other)['status_in_progress'], 1)
+
+        report.delete()
+        self.assertEqual(self.counts(self.other)['total'], 0)
+
+    def test_admin_list_editable_updates_counters(self):
+        reports = [self.create_report(self.owner) for i in range(2)]
+        data = {
+            'form-TOTAL_FORMS': '2', 'form-INITIAL_FORMS': '2', 'form-MIN_NUM_FORMS': '0',
+            'form-MAX_NUM_FORMS': '1000', '_save': 'Save',
+        }
+        for i, report in enumerate(reports):
+            data.update({f'form-{i}-id': report.id, f'form-{i}-status': 'completed', f'form-{i}-priority': 'low'})
+        self.client.force_login(self.admin)
+        response = self.client.post(reverse('admin:main_villareport_changelist'), data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.counts(self.owner)['status_completed'], 2)
+        self.assertEqual(self.counts(self.owner)['status_pending'], 0)
+
+    def test_deleting_user_does_not_recreate_profile(self):
+        self.create_report(self.owner)
+        self.owner.delete()
+        self.assertFalse(UserProfile.objects.filter(user_id=self.owner.id).exists())
+
+    def test_dashboard_reads_counters(self):
+        self.create_report(self.owner, status='completed')
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['total_reports'], 1)
+        self.assertEqual(response.context['completed_reports'], 1)
+
+    def test_verify_and_rebuild_command(self):
+        self.create_report(self.owner)
+        # bulk_create skips signals, so these reports are not counted
+        VillaReport.objects.bulk_create([
+            VillaReport(user=user, title='Bulk', description='Details', location='Pool', report_type='pool')
+            for user in (self.owner, self.other)
+        ])
+        with self.assertRaises(CommandError):
+            call_command('rebuild_report_counters', verify=True, stdout=StringIO())
+        call_command('rebuild_report_counters', stdout=StringIO())
+        call_command('rebuild_report_counters', verify=True, stdout=StringIO())
+        self.assertEqual(self.counts(self.owner)['total'], 2)
+        self.assertEqual(self.counts(self.other)['status_pending'], 1)
+        self.assertEqual(report_tallies(), VillaReport.objects.status_summary())
+
+    def test_admin_dashboard_reads_tallies(self):
+        report = self.create_report(self.owner, priority='high')
+        self.create_report(self.other, status='in_progress')
+        report.status = 'completed'
+        report.priority = 'urgent'
+        report.save()
+        self.create_report(self.other).delete()
+        self.assertEqual(report_tallies(), VillaReport.objects.status_summary())
+
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin_dashboard'))
+        # No aggregate over the reports table, however big it gets
+        self.assertFalse([query for query in queries if 'COUNT(' in query['sql']])
+        self.assertEqual(response.context['total_reports'], 2)
+        self.assertEqual(response.context['completed_reports'], 1)
+        self.assertEqual(response.context['report_summary']['priority_urgent'], 1)
+
+
+class TranslationTagTests(SimpleTestCase):
+    def render(self, source, context=None):
+        return engines['django'].from_string('{% load translation_tags %}' + source).render(context or {})
+
+    def test_catalogue_merges_po_files_with_builtin_strings(self):
+        catalogue = get_catalogue('it')
+        # Only in locale/it/LC_MESSAGES/django.po
+        self.assertEqual(catalogue['Subscribe Now'], 'Abbonati Ora')
+        # The built-in table wins where both define a string
+        self.assertEqual(catalogue['Home'], 'Casa')
+        self.assertIs(get_catalogue('it'), catalogue)
+        with self.assertRaises(TypeError):
+            catalogue['Home'] = 'Home'
+
+    def test_get_translation(self):
+        self.assertEqual(self.render("{% get_translation 'Contact Us' %}"), 'Contattaci')
+        self.assertEqual(self.render("{% get_translation 'Contact Us' 'en' %}"), 'Contact Us')
+        self.assertEqual(self.render("{% get_translation 'Unknown' %}"), 'Unknown')
+        self.assertEqual(self.render("{% get_translation 'Home' '../../etc' %}"), 'Home')
+
+    def test_translateblock(self):
+        html = self.render(
+            '{% translateblock %}<a>[[Home]]</a>{% if show %}[[Search]] {{ value }}{% endif %}'
+            '{% for i in items %}[[About]]{% endfor %}{% endtranslateblock %}[[Home]]',
+            {'show': True, 'value': '[[Home]]', 'items': [1]},
+        )
+        # Markers in variables and outside the block are left alone
+        self.assertEqual(html, '<a>Casa</a>Cerca [[Home]]Chi Siamo[[Home]]')
+        self.assertEqual(self.render("{% translateblock 'en' %}[[Home]]{% endtranslateblock %}"), 'Home')
+
+    def test_parse_po(self):
+        path = Path(tempfile.mkdtemp()) / 'django.po'
+        self.addCleanup(shutil.rmtree, path.parent)
+        path.write_text(
+            'msgid ""\nmsgstr "Language: it\\n"\n\n'
+            'msgid "Long"\nmsgstr ""\n"Lunga "\n"frase"\n\n'
+            '#, fuzzy\nmsgid "Draft"\nmsgstr "Bozza"\n\n'
+            'msgid "Empty"\nmsgstr ""\n',
+            encoding='utf-8',
+        )
+        self.assertEqual(parse_po(path), {'Long': 'Lunga frase'})
+
+
+class AssetMinifyTests(SimpleTestCase):
+    def test_minify_css_keeps_strings_and_descendant_pseudo_selectors(self):
+        css = "/* it's */\na  >  b , c :hover {\n  color: red;\n  content: ' /* kept */ ';\n}\n"
+        self.assertEqual(minify_css(css), "a>b,c :hover{color:red;content:' /* kept */ '}")
+
+    def test_minify_css_leaves_strings_and_urls_alone(self):
+        css = '.a { content: "a;}"; background: url(data:image/svg+xml;utf8,<svg><style>a{fill:red;}</style></svg>); }'
+        self.assertEqual(
+            minify_css(css), '.a{content:"a;}";background:url(data:image/svg+xml;utf8,<svg><style>a{fill:red;}</style></svg>)}',
+        )
+
+    def test_minify_js_keeps_line_breaks(self):
+        self.assertEqual(minify_js('// note\nconst a = 1\n\n    a + 1\n'), 'const a = 1\na + 1\n')
+
+    def test_minify_js_leaves_template_literals_alone(self):
+        template = '`\n  <div>\n    // not a comment\n\n  ${items.map(item => `\n    ${item}`)}</div>`'
+        js = (
+            f'  const html = {template}\n  // comment\n'
+            "  const quote = /'/g, half = a / 2 / 'b'.length\n  const s = 'a\\\n   b'\n"
+        )
+        self.assertEqual(minify_js(js), (
+            f'const html = {template}\n'
+            "const quote = /'/g, half = a / 2 / 'b'.length\nconst s = 'a\\\n   b'\n"
+        ))
+
+    def test_extract_critical_css(self):
+        css = (
+            '.navbar { color: red }\n.footer { color: blue }\n'
+            '@media (max-width: 768px) { .hero-title { font-size: 2rem } .footer { margin: 0 } }\n'
+            '@keyframes fade { from { opacity: 0 } }'
+        )
+        self.assertEqual(
+            extract_critical_css(css, ['.navbar', '.hero-']),
+            '.navbar{color:red}@media (max-width:768px){.hero-title{font-size:2rem}}',
+        )
+
+
+class StaticPipelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.static_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.static_root)
+        cls.enterClassContext(override_settings(STATIC_ROOT=cls.static_root))
+        call_command('collectstatic', interactive=False, verbosity=0)
+        cls.manifest = json.loads((Path(cls.static_root) / 'staticfiles.json').read_text())['paths']
+
+    def setUp(self):
+        critical_css.cache_clear()
+        self.addCleanup(critical_css.cache_clear)
+
+    def test_collected_files_are_hashed_minified_and_precompressed(self):
+        hashed = Path(self.static_root) / self.manifest['css/style.css']
+        self.assertTrue(hashed.with_name(hashed.name + '.gz').exists())
+        self.assertLess(hashed.stat().st_size, (Path(settings.BASE_DIR) / 'static/css/style.css').stat().st_size)
+
+    def test_hashed_files_are_served_compressed_and_immutable(self):
+        url = '/static/' + self.manifest['css/style.css']
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+        response = self.client.get(url)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        response = self.client.get('/static/css/style.css')
+        self.assertNotIn('immutable', response['Cache-Control'])
+        self.assertEqual(self.client.get('/static/../manage.py').status_code, 404)
+
+    def test_home_inlines_critical_css_and_links_hashed_bundle(self):
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, '<style>:root{')
+        self.assertContains(response, self.manifest['css/style.css'])
+        self.assertContains(response, self.manifest['js/main.js'])
+
+
+class ResponsiveImageTests(SimpleTestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root, IMAGE_WIDTHS=[320, 640, 1280])
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def make_image(self, width, height, color='gold'):
+        image = Image.new('RGB', (width, height), color)
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera Maker'
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', exif=exif)
+        buffer.seek(0)
+        return buffer
+
+    def test_ingest_writes_derivatives_without_upscaling_or_metadata(self):
+        manifest = ingest('home/villa', self.make_image(800, 400))
+        self.assertEqual(manifest['widths'], [320, 640, 800])
+        self.assertIn('webp', manifest['formats'])
+        path = f"images/home/villa/{manifest['hash']}/640w.webp"
+        with default_storage.open(path) as file, Image.open(file) as derivative:
+            self.assertEqual(derivative.size, (640, 320))
+            self.assertEqual(len(derivative.getexif()), 0)
+
+    def test_reingesting_replaces_old_derivatives(self):
+        first = ingest('home/villa', self.make_image(800, 400))
+        self.assertEqual(ingest('home/villa', self.make_image(800, 400)), first)
+        second = ingest('home/villa', self.make_image(800, 400, 'black'))
+        self.assertNotEqual(second['hash'], first['hash'])
+        self.assertEqual(load_manifest('home/villa')['hash'], second['hash'])
+        self.assertFalse(default_storage.exists(f"images/home/villa/{first['hash']}/320w.jpg"))
+
+    def test_tag_renders_picture_or_fallback(self):
+        template = engines['django'].from_string(
+            "{% load image_tags %}{% responsive_image name 'Villa' sizes='50vw' fallback='/remote.jpg' %}"
+        )
+        self.assertEqual(
+            template.render({'name': 'home/villa'}),
+            '<img src="/remote.jpg" alt="Villa" decoding="async" loading="lazy">',
+        )
+        manifest = ingest('home/villa', self.make_image(800, 400))
+        html = template.render({'name': 'home/villa'})
+        self.assertIn(f'<source type="image/webp" srcset="/media/images/home/villa/{manifest["hash"]}/320w.webp 320w', html)
+        self.assertIn('sizes="50vw"', html)
+        self.assertIn('loading="lazy"', html)
+        self.assertIn('width="800"', html)
+        self.assertIn('height="400"', html)
+        with self.assertRaises(ValueError):
+            ingest('../escape', self.make_image(10, 10))
+
+    def test_derivatives_are_served_without_debug(self):
+        manifest = ingest('home/villa', self.make_image(800, 400))
+        response = self.client.get(f"/media/images/home/villa/{manifest['hash']}/320w.webp")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('immutable', response['Cache-Control'])
+        # Only the image directory is public
+        default_storage.save('attachments/private.txt', ContentFile(b'secret'))
+        self.assertEqual(self.client.get('/media/attachments/private.txt').status_code, 404)
+        self.assertEqual(self.client.get('/media/images/../attachments/private.txt').status_code, 404)
+
+
+@override_settings(ATTACHMENT_WORKERS=0)
+class AttachmentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='pass12345')
+        cls.other = User.objects.create_user('other', password='pass12345')
+        cls.report = VillaReport.objects.create(
+            user=cls.owner, title='Broken tile', description='Details', location='Pool', report_type='pool',
+        )
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client.force_login(self.owner)
+
+    def photo(self, name='tile.jpg'):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # rotated 90 degrees clockwise
+        exif[0x010F] = 'Camera Maker'
+        buffer = BytesIO()
+        Image.new('RGB', (400, 200), 'gold').save(buffer, 'JPEG', exif=exif)
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+    def upload(self, *files):
+        return self.client.post(reverse('upload_attachments', args=[self.report.id]), {'files': list(files)})
+
+    def test_upload_strips_exif_and_builds_thumbnail(self):
+        response = self.upload(self.photo(), self.photo('second.jpg'))
+        self.assertRedirects(response, reverse('villa_report_detail', args=[self.report.id]))
+        attachment = Attachment.objects.get(original_name='tile.jpg')
+        self.assertEqual(attachment.status, 'ready')
+        self.assertEqual((attachment.width, attachment.height), (200, 400))
+        with Image.open(attachment.file.path) as original:
+            self.assertEqual(len(original.getexif()), 0)
+            self.assertEqual(original.size, (200, 400))
+        with Image.open(attachment.thumbnail.path) as thumbnail:
+            self.assertEqual(thumbnail.size, (settings.ATTACHMENT_THUMBNAIL_SIZE,) * 2)
+
+        response = self.client.get(reverse('villa_report_detail', args=[self.report.id]))
+        self.assertContains(response, reverse('attachment_thumbnail', args=[attachment.id]))
+        self.assertContains(response, 'loading="lazy"')
+
+    def test_upright_multi_picture_photo(self):
+        buffer = BytesIO()
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera Maker'
+        primary, depth = Image.new('RGB', (300, 200), 'gold'), Image.new('RGB', (300, 200), 'black')
+        primary.save(buffer, 'MPO', save_all=True, append_images=[depth], exif=exif)
+        self.upload(SimpleUploadedFile('phone.jpg', buffer.getvalue(), content_type='image/jpeg'))
+        attachment = Attachment.objects.get()
+        self.assertEqual(attachment.status, 'ready')
+        with Image.open(attachment.file.path) as original:
+            self.assertEqual(original.format, 'JPEG')
+            self.assertEqual(len(original.getexif()), 0)
+            self.assertEqual(original.size, (300, 200))
+
+    @override_settings(ATTACHMENT_MAX_SIZE=1024)
+    def test_rejects_other_types_and_oversized_files(self):
+        self.upload(
+            SimpleUploadedFile('notes.txt', b'text'),
+            SimpleUploadedFile('huge.jpg', b'x' * 4096, content_type='image/jpeg'),
+        )
+        self.assertFalse(Attachment.objects.exists())
+
+    def test_upload_requires_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.owner)
+        response = client.post(reverse('upload_attachments', args=[self.report.id]), {'files': [self.photo()]})
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Attachment.objects.exists())
+
+    def test_other_users_cannot_upload_or_download(self):
+        self.upload(self.photo())
+        attachment = Attachment.objects.get()
+        self.client.force_login(self.other)
+        self.assertEqual(self.upload(self.photo()).status_code, 404)
+        self.assertEqual(self.client.get(reverse('attachment_file', args=[attachment.id])).status_code, 404)
+
+    def test_original_is_served_with_range_support(self):
+        self.upload(self.photo())
+        attachment = Attachment.objects.get()
+        url = reverse('attachment_file', args=[attachment.id])
+        with open(attachment.file.path, 'rb') as file:
+            data = file.read()
+
+        response = self.client.get(url)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(b''.join(response.streaming_content), data)
+
+        response = self.client.get(url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(data)}')
+        self.assertEqual(b''.join(response.streaming_content), data[10:20])
+
+        response = self.client.get(url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), data[-5:])
+        self.assertEqual(self.client.get(url, HTTP_RANGE=f'bytes={len(data)}-').status_code, 416)
+
+
+class SQLitePragmaTests(TestCase):
+    def test_new_connections_get_configured_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS['busy_timeout'])
+            cursor.execute('PRAGMA temp_store')
+            # 2 = MEMORY
+            self.assertEqual(cursor.fetchone()[0], 2)
+
+
+@override_settings(SSE_POLL_INTERVAL=0.05)
+class ReportEventTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', first_name='Olivia', password='pass12345')
+        cls.report = VillaReport.objects.create(
+            user=cls.owner, title='Broken tile', description='Details', location='Pool', report_type='pool',
+        )
+        cls.other_report = VillaReport.objects.create(
+            user=cls.owner, title='Leak', description='Details', location='Kitchen', report_type='plumbing',
+        )
+
+    def test_poll_publishes_comments_and_status_changes(self):
+        watcher = Broker()
+        # The first poll reports the current status of new subscriptions
+        events = watcher.poll({self.report.id})
+        self.assertEqual(events, [(self.report.id, {
+            'event': 'status', 'data': {'status': 'pending', 'label': 'Pending', 'color': 'warning'},
+        })])
+        self.assertEqual(watcher.poll({self.report.id}), [])
+
+        comment = Comment.objects.create(villa_report=self.report, user=self.owner, comment='Any news?')
+        Comment.objects.create(villa_report=self.other_report, user=self.owner, comment='Not watched')
+        self.report.status = 'in_progress'
+        self.report.save()
+        events = watcher.poll({self.report.id})
+        self.assertEqual([event['event'] for _, event in events], ['comment', 'status'])
+        self.assertEqual(events[0][1]['id'], comment.id)
+        self.assertEqual(events[0][1]['data']['author'], 'Olivia')
+        self.assertEqual(events[1][1]['data']['status'], 'in_progress')
+
+    async def test_stream_replays_missed_comments_then_pushes_new_ones(self):
+        missed = await Comment.objects.acreate(villa_report=self.report, user=self.owner, comment='Missed')
+        await self.async_client.aforce_login(self.owner)
+        response = await self.async_client.get(reverse('report_events', args=[self.report.id]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+
+        stream = report_stream(self.report.id, after=missed.id - 1)
+        try:
+            self.assertTrue((await anext(stream)).startswith('retry:'))
+            self.assertIn('event: status', await anext(stream))
+            self.assertIn(f'id: {missed.id}', await anext(stream))
+
+            comment = await Comment.objects.acreate(villa_report=self.report, user=self.owner, comment='Live')
+            chunk = ''
+            while 'event: comment' not in chunk:
+                # The watcher also publishes the report's status when it starts
+                chunk = await asyncio.wait_for(anext(stream), timeout=5)
+            self.assertIn(f'id: {comment.id}', chunk)
+        finally:
+            await stream.aclose()
+        self.assertEqual(broker.subscriber_count(), 0)
+        await broker.close()
+
+    async def test_only_owner_and_staff_can_subscribe(self):
+        url = reverse('report_events', args=[self.report.id])
+        self.assertEqual((await self.async_client.get(url)).status_code, 302)
+        await self.async_client.aforce_login(await User.objects.acreate_user('other', password='pass12345'))
+        self.assertEqual((await self.async_client.get(url)).status_code, 404)
+
+    def test_wsgi_requests_are_told_not_to_reconnect(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('report_events', args=[self.report.id]))
+        self.assertEqual(response.status_code, 204)
+
+
+class ReportImportExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='pass12345')
+        VillaReport.objects.create(
+            user=cls.owner, title='Broken tile', description='Line one\nLine "two"', location='Pool',
+            report_type='pool', priority='high', status='completed',
+        )
+        VillaReport.objects.create(
+            user=cls.owner, title='Leak', description='Kitchen sink', location='Kitchen', report_type='maintenance',
+        )
+
+    def setUp(self):
+        self.workdir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.workdir)
+
+    def test_round_trip_keeps_fields_and_history(self):
+        for fmt in ('csv', 'jsonl'):
+            path = self.workdir / f'reports.{fmt}'
+            VillaReport.objects.filter(title__startswith='Imported').delete()
+            call_command('export_reports', str(path), stderr=StringIO())
+            original = {
+                report.title: report for report in VillaReport.objects.all()
+            }
+            rows = path.read_text(encoding='utf-8').replace('Broken tile', 'Imported tile').replace('Leak', 'Imported leak')
+            path.write_text(rows, encoding='utf-8')
+
+            call_command('import_reports', str(path), '--batch-size', '1', stdout=StringIO())
+            imported = VillaReport.objects.get(title='Imported tile')
+            self.assertEqual(imported.description, original['Broken tile'].description)
+            self.assertEqual(imported.created_at, original['Broken tile'].created_at)
+            self.assertEqual((imported.priority, imported.status), ('high', 'completed'))
+        # Counters are rebuilt after the bulk insert
+        self.assertEqual(UserProfile.objects.get(user=self.owner).reports_total, 4)
+
+    def test_export_to_the_command_stdout(self):
+        text = StringIO()
+        call_command('export_reports', '--status', 'completed', stdout=text, stderr=StringIO())
+        binary = io.TextIOWrapper(BytesIO(), encoding='utf-8')
+        call_command('export_reports', '--status', 'completed', stdout=binary, stderr=StringIO())
+        binary.flush()
+        for output in (text.getvalue(), binary.buffer.getvalue().decode('utf-8')):
+            rows = list(csv.reader(output.splitlines(keepends=True)))
+            self.assertEqual(rows[0], COLUMNS)
+            self.assertEqual([row[4] for row in rows[1:]], ['Broken tile'])
+
+    def test_export_header_and_filters(self):
+        path = self.workdir / 'reports.csv'
+        call_command('export_reports', str(path), '--status', 'completed', stderr=StringIO())
+        lines = path.read_text(encoding='utf-8').splitlines()
+        self.assertEqual(lines[0], ','.join(COLUMNS))
+        self.assertIn('Broken tile', path.read_text(encoding='utf-8'))
+        self.assertNotIn('Leak', path.read_text(encoding='utf-8'))
+
+    def test_users_are_resolved_or_created_in_batches(self):
+        path = self.workdir / 'reports.jsonl'
+        path.write_text(''.join(
+            json.dumps({'username': f'guest{i % 3}', 'title': f'Issue {i}', 'report_type': 'cleaning'}) + '\n'
+            for i in range(9)
+        ))
+        with self.assertRaisesMessage(CommandError, "line 1: unknown user 'guest0'"):
+            call_command('import_reports', str(path), stdout=StringIO())
+        self.assertFalse(VillaReport.objects.filter(title__startswith='Issue').exists())
+
+        with self.assertNumQueries(5):
+            # Savepoint, one username lookup, one INSERT for the new users
+            # and one for the reports, release
+            call_command('import_reports', str(path), '--create-users', '--no-rebuild', stdout=StringIO())
+        self.assertEqual(VillaReport.objects.filter(title__startswith='Issue').count(), 9)
+        self.assertFalse(User.objects.get(username='guest0').has_usable_password())
+
+    def test_invalid_rows_stop_the_import_or_are_skipped(self):
+        path = self.workdir / 'reports.csv'
+        path.write_text(
+            'username,title,report_type,status\n'
+            'owner,Fine,cleaning,pending\n'
+            'owner,Bad,cleaning,unknown\n'
+        )
+        with self.assertRaisesMessage(CommandError, "line 3: invalid status 'unknown'"):
+            call_command('import_reports', str(path), stdout=StringIO())
+        out = StringIO()
+        call_command('import_reports', str(path), '--skip-invalid', stdout=out)
+        self.assertIn('Imported 1 reports', out.getvalue())
+        self.assertIn('skipped 1 rows', out.getvalue())
+
+    def test_completed_reports_always_get_a_completed_date(self):
+        path = self.workdir / 'reports.csv'
+        path.write_text('username,title,report_type,status\nowner,Done,cleaning,completed\n')
+        call_command('import_reports', str(path), '--no-rebuild', stdout=StringIO())
+        self.assertIsNotNone(VillaReport.objects.get(title='Done').completed_date)
+
+        # Reports completed before completed_date was stamped get their last save
+        VillaReport.objects.filter(status='completed').update(completed_date=None)
+        migration = import_module('main.migrations.0016_backfill_completed_date')
+        migration.backfill_completed_date(apps, None)
+        self.assertFalse(VillaReport.objects.filter(status='completed', completed_date__isnull=True).exists())
+        self.assertFalse(VillaReport.objects.exclude(completed_date=F('updated_at')).filter(status='completed').exists())
+
+
+class AdminReportExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_superuser('staff', 'staff@example.com', 'pass12345')
+        cls.owner = User.objects.create_user('owner', password='pass12345')
+        cls.reports = [
+            VillaReport.objects.create(
+                user=cls.owner, title=f'Report {i}', description='Line one\nBroken <tile> & "grout"',
+                location='Pool', report_type='pool', status='completed' if i % 2 else 'pending',
+            )
+            for i in range(6)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def test_export_view_streams_the_filtered_changelist_as_csv(self):
+        response = self.client.get(reverse('admin:main_villareport_export', args=['csv']), {'status__exact': 'completed'})
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment;', response['Content-Disposition'])
+        rows = list(csv.reader(b''.join(response.streaming_content).decode('utf-8-sig').splitlines(keepends=True)))
+        self.assertEqual(rows[0], COLUMNS)
+        self.assertEqual(sorted(row[4] for row in rows[1:]), ['Report 1', 'Report 3', 'Report 5'])
+        self.assertEqual(rows[1][5], 'Line one\nBroken <tile> & "grout"')
+
+    def test_export_action_streams_selected_reports_as_xlsx(self):
+        selected = [self.reports[0].id, self.reports[1].id]
+        response = self.client.post(reverse('admin:main_villareport_changelist'), {
+            'action': 'export_xlsx', '_selected_action': selected,
+        })
+        self.assertEqual(response['Content-Type'], 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        with zipfile.ZipFile(BytesIO(b''.join(response.streaming_content))) as workbook:
+            self.assertIsNone(workbook.testzip())
+            sheet = ElementTree.fromstring(workbook.read('xl/worksheets/sheet1.xml'))
+        namespace = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        rows = [
+            [''.join(cell.itertext()) for cell in row.findall('s:c', namespace)]
+            for row in sheet.iterfind('.//s:row', namespace)
+        ]
+        self.assertEqual(rows[0], COLUMNS)
+        self.assertEqual([int(row[0]) for row in rows[1:]], selected)
+        self.assertEqual(rows[1][5], 'Line one\nBroken <tile> & "grout"')
+
+    def test_csv_export_escapes_formulas(self):
+        VillaReport.objects.filter(pk=self.reports[0].pk).update(
+            title='=HYPERLINK("http://example.com")', location='@SUM(A1)', admin_notes='-1+2',
+        )
+        response = self.client.get(reverse('admin:main_villareport_export', args=['csv']), {'status__exact': 'pending'})
+        rows = list(csv.reader(b''.join(response.streaming_content).decode('utf-8-sig').splitlines(keepends=True)))
+        row = dict(zip(COLUMNS, rows[1]))
+        self.assertEqual(row['title'], '\'=HYPERLINK("http://example.com")')
+        self.assertEqual(row['location'], "'@SUM(A1)")
+        self.assertEqual(row['admin_notes'], "'-1+2")
+        self.assertEqual(row['id'], str(self.reports[0].id))
+
+    def test_export_with_bad_filters_redirects_like_the_changelist(self):
+        response = self.client.get(reverse('admin:main_villareport_export', args=['csv']), {'status__nope': 'x'})
+        self.assertRedirects(
+            response, reverse('admin:main_villareport_changelist') + '?e=1', fetch_redirect_response=False,
+        )
+
+    def test_export_requires_staff(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('admin:main_villareport_export', args=['csv']))
+        self.assertEqual(response.status_code, 302)
+
+
+TASK_CALLS = []
+
+
+@task(max_attempts=2, retry_delay=0)
+def record_call(value, fail=False):
+    TASK_CALLS.append(value)
+    if fail:
+        raise RuntimeError('boom')
+
+
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        TASK_CALLS.clear()
+
+    def test_claimed_task_runs_once_and_records_timing(self):
+        queued = record_call.enqueue('a')
+        self.assertEqual(queued.name, 'main.tests.record_call')
+        self.assertEqual(claim(10, 'worker-1'), [queued.id])
+        # Already running: a second worker gets nothing
+        self.assertEqual(claim(10, 'worker-2'), [])
+        self.assertTrue(execute(queued.id))
+        queued.refresh_from_db()
+        self.assertEqual(TASK_CALLS, ['a'])
+        self.assertEqual((queued.status, queued.attempts), ('succeeded', 1))
+        self.assertIsNotNone(queued.duration_ms)
+        self.assertEqual(task_stats()[0]['succeeded'], 1)
+
+    def test_failures_are_retried_with_backoff_then_marked_failed(self):
+        queued = record_call.enqueue('b', fail=True)
+        claim(10)
+        with self.assertLogs('main.tasks', 'WARNING'):
+            self.assertFalse(execute(queued.id))
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('queued', 1))
+        self.assertIn('RuntimeError: boom', queued.last_error)
+
+        claim(10)
+        with self.assertLogs('main.tasks', 'ERROR'):
+            execute(queued.id)
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('failed', 2))
+        self.assertEqual(TASK_CALLS, ['b', 'b'])
+
+    def test_stale_tasks_are_given_up_on_only_when_silent_or_overrunning(self):
+        long_ago = timezone.now() - datetime.timedelta(hours=2)
+        live, silent, last_try, overrun = (record_call.enqueue(value) for value in 'abcd')
+        claim(10, 'worker-1')
+        Task.objects.update(started_at=long_ago, heartbeat_at=long_ago)
+        Task.objects.exclude(pk=overrun.pk).update(timeout=3 * 3600)
+        heartbeat([live.pk, overrun.pk])
+        Task.objects.filter(pk=last_try.pk).update(attempts=2)
+
+        with self.assertLogs('main.tasks', 'WARNING'):
+            self.assertEqual(requeue_stale(), 3)
+        statuses = dict(Task.objects.values_list('pk', 'status'))
+        self.assertEqual(
+            [statuses[live.pk], statuses[silent.pk], statuses[last_try.pk], statuses[overrun.pk]],
+            ['running', 'queued', 'failed', 'queued'],
+        )
+        self.assertIn('stopped responding', Task.objects.get(pk=silent.pk).last_error)
+        self.assertEqual(Task.objects.get(pk=overrun.pk).last_error, 'Timed out after 3600s')
+
+        # A run that was given up on and finishes late no longer decides the outcome
+        with self.assertLogs('main.tasks', 'WARNING') as logs:
+            execute(silent.pk)
+        self.assertIn('result dropped', logs.output[0])
+        self.assertEqual(Task.objects.get(pk=silent.pk).status, 'queued')
+
+    def test_stats_use_nearest_rank_percentiles(self):
+        Task.objects.bulk_create([
+            Task(name='main.tests.record_call', status='succeeded', attempts=1, duration_ms=ms,
+                 run_at=timezone.now(), started_at=timezone.now())
+            for ms in range(1, 11)
+        ])
+        stats = task_stats()[0]
+        self.assertEqual((stats['p50_ms'], stats['p95_ms'], stats['max_ms']), (5.5, 10, 10))
+
+    def test_idempotency_key_returns_the_existing_task(self):
+        first = record_call.enqueue('c', idempotency_key='report:1:closed')
+        second = record_call.enqueue('c', idempotency_key='report:1:closed')
+        self.assertEqual(first.id, second.id)
+        self.assertEqual(Task.objects.count(), 1)
+
+    @override_settings(TASKS_EAGER=True)
+    def test_eager_mode_runs_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            queued = record_call.enqueue('d')
+            self.assertEqual(TASK_CALLS, [])
+        self.assertEqual(TASK_CALLS, ['d'])
+        self.assertEqual(Task.objects.get(pk=queued.pk).status, 'succeeded')
+
+
+# Pool threads need their own connections to see the queued rows
+class TaskWorkerTests(TransactionTestCase):
+    def setUp(self):
+        TASK_CALLS.clear()
+
+    def test_run_worker_drains_due_tasks(self):
+        for value in range(5):
+            record_call.enqueue(value)
+        record_call.enqueue('later', delay=3600)
+        out = StringIO()
+        call_command('run_worker', '--once', '--concurrency', '2', stdout=out)
+        self.assertEqual(sorted(TASK_CALLS), [0, 1, 2, 3, 4])
+        self.assertIn('stopped after 5 tasks', out.getvalue())
+        self.assertEqual(Task.objects.filter(status='queued').count(), 1)
+
+        out = StringIO()
+        call_command('run_worker', '--stats', stdout=out)
+        self.assertIn('main.tests.record_call', out.getvalue())
+
+
+class CountingEmailBackend(LocmemEmailBackend):
+    opened = 0
+
+    def open(self):
+        CountingEmailBackend.opened += 1
+        return super().open()
+
+
+@override_settings(EMAIL_BACKEND='main.tests.CountingEmailBackend', NOTIFICATION_DIGEST_WINDOW=300)
+class NotificationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_superuser('staff', 'staff@example.com', 'pass12345')
+        cls.owner = User.objects.create_user('owner', 'owner@example.com', first_name='Olivia')
+        cls.other = User.objects.create_user('other', 'other@example.com')
+        cls.reports = [
+            VillaReport.objects.create(
+                user=cls.owner, report_type='pool', title=f'Pool pump {i}', description='d', location='Garden',
+            )
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        CountingEmailBackend.opened = 0
+
+    @override_settings(TASKS_EAGER=True)
+    def test_status_change_emails_the_owner(self):
+        report = self.reports[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            report.status = 'in_progress'
+            report.save()
+        self.assertEqual(len(mail.outbox), 1)
+        message = mail.outbox[0]
+        self.assertEqual(message.to, ['owner@example.com'])
+        self.assertEqual(message.subject, 'Update on your villa report "Pool pump 0"')
+        self.assertIn('Status: Pending -> In Progress', message.body)
+        self.assertIn(reverse('villa_report_detail', args=[report.pk]), message.body)
+        self.assertFalse(Notification.objects.filter(sent_at__isnull=True).exists())
+
+    @override_settings(TASKS_EAGER=True)
+    def test_only_staff_comments_notify(self):
+        report = self.reports[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(villa_report=report, user=self.owner, comment='Any news?')
+            report.save(update_fields=['title'])
+        self.assertEqual(len(mail.outbox), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(villa_report=report, user=self.staff, comment='Technician booked', is_admin_comment=True)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('Technician booked', mail.outbox[0].body)
+
+    def test_burst_of_updates_is_one_digest_per_owner(self):
+        other_report = VillaReport.objects.create(
+            user=self.other, report_type='other', title='Gate', description='d', location='Drive',
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            for report in self.reports:
+                report.status = 'in_progress'
+                report.save()
+            self.reports[0].status = 'completed'
+            self.reports[0].save()
+            Comment.objects.create(villa_report=self.reports[1], user=self.staff, comment='Parts ordered', is_admin_comment=True)
+            other_report.status = 'cancelled'
+            other_report.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reports[2].status = 'pending'
+            self.reports[2].save()
+
+        # Nothing is sent until the digest window closes, and both
+        # transactions share one queued delivery
+        self.assertEqual(len(mail.outbox), 0)
+        delivery = Task.objects.get(name='main.notifications.send_notifications')
+        self.assertGreater(delivery.run_at, timezone.now())
+
+        self.assertEqual(deliver_pending(), 2)
+        self.assertEqual(CountingEmailBackend.opened, 1)
+        digest = next(message for message in mail.outbox if message.to == ['owner@example.com'])
+        self.assertEqual(digest.subject, 'Updates on 2 of your villa reports')
+        self.assertIn('Status: Pending -> Completed', digest.body)
+        self.assertIn('Parts ordered', digest.body)
+        # Pool pump 2 went back to pending, so there is nothing to report
+        self.assertNotIn('Pool pump 2', digest.body)
+        self.assertEqual(deliver_pending(), 0)
+
+    def test_admin_bulk_edit_queues_one_delivery(self):
+        self.client.force_login(self.staff)
+        data = {'form-TOTAL_FORMS': '3', 'form-INITIAL_FORMS': '3', '_save': 'Save'}
+        for i, report in enumerate(self.reports):
+            data.update({f'form-{i}-id': report.pk, f'form-{i}-status': 'completed', f'form-{i}-priority': 'high'})
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('admin:main_villareport_changelist'), data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(VillaReport.objects.filter(status='completed').count(), 3)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(Notification.objects.count(), 3)
+        self.assertEqual(Task.objects.filter(name='main.notifications.send_notifications').count(), 1)
+
+        deliver_pending()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('Updates on 3 of your villa reports', mail.outbox[0].subject)
+
+    def test_rolled_back_transaction_does_not_block_later_deliveries(self):
+        report = self.reports[0]
+        with self.captureOnCommitCallbacks() as callbacks:
+            try:
+                with transaction.atomic():
+                    report.status = 'in_progress'
+                    report.save()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            report.refresh_from_db()
+            report.status = 'cancelled'
+            report.save()
+        self.assertEqual(len([callback for callback in callbacks if isinstance(callback, DeliveryCallback)]), 1)
+
+    def test_claims_are_only_released_by_sending_or_expiry(self):
+        for report in self.reports[:2]:
+            notify(self.owner.pk, report.pk, 'status', old_status='pending', new_status='in_progress')
+        first, second = Notification.objects.order_by('id')
+        # A delivery that died after claiming: one fresh claim, one stale
+        Notification.objects.filter(pk=first.pk).update(claimed_by='dead', claimed_at=timezone.now())
+        Notification.objects.filter(pk=second.pk).update(
+            claimed_by='dead', claimed_at=timezone.now() - datetime.timedelta(seconds=settings.NOTIFICATION_CLAIM_TIMEOUT + 1),
+        )
+        with patch.object(CountingEmailBackend, 'send_messages', side_effect=ConnectionError):
+            with self.assertRaises(ConnectionError):
+                deliver_pending()
+        second.refresh_from_db()
+        self.assertEqual((second.claimed_by, second.sent_at), ('', None))
+
+        self.assertEqual(deliver_pending(), 1)
+        self.assertIn('Pool pump 1', mail.outbox[0].body)
+        first.refresh_from_db()
+        self.assertIsNone(first.sent_at)
+        self.assertFalse(Notification.objects.filter(pk=second.pk, sent_at__isnull=True).exists())
+
+
+class PerfMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='pass12345', first_name='John')
+        VillaReport.objects.create(user=cls.owner, report_type='pool', title='Pump', description='d', location='Pool')
+
+    def setUp(self):
+        cache.clear()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.log = Path(self.tmp) / 'perf.log'
+        self.addCleanup(close_handlers)
+        self.client.force_login(self.owner)
+
+    def test_sampled_requests_are_logged(self):
+        with self.settings(PERF_SAMPLE_RATE=1, PERF_LOG_FILE=self.log):
+            with self.assertNumQueries(3):
+                response = self.client.get(reverse('dashboard'))
+        close_handlers()
+        [record] = read_records(self.log)
+        self.assertEqual(record['view'], 'dashboard')
+        self.assertEqual(record['status'], 200)
+        # The middleware sees the same queries as the query budget tests
+        self.assertEqual(record['queries'], 3)
+        self.assertGreater(record['template_ms'], 0)
+        self.assertGreaterEqual(record['wall_ms'], record['template_ms'])
+        self.assertEqual(record['bytes'], len(response.content))
+
+    def test_disabled_when_sample_rate_is_zero(self):
+        with self.settings(PERF_SAMPLE_RATE=0, PERF_LOG_FILE=self.log):
+            self.client.get(reverse('dashboard'))
+        close_handlers()
+        self.assertEqual(os.listdir(self.tmp), [])
+
+    def test_records_are_written_off_thread_to_a_file_per_process(self):
+        with self.settings(PERF_LOG_FILE=self.log):
+            writers = []
+
+            def emit(handler, record):
+                writers.append(threading.get_ident())
+
+            with patch('logging.handlers.RotatingFileHandler.emit', emit):
+                write_record({'ts': time.time(), 'view': 'dashboard'})
+                close_handlers()
+            # Written by the listener thread, not the caller's
+            self.assertEqual(len(writers), 1)
+            self.assertNotEqual(writers[0], threading.get_ident())
+            write_record({'ts': time.time(), 'view': 'dashboard'})
+            close_handlers()
+            # Another process's log is read alongside this one's
+            other = Path(process_log_file(self.log, 999999999))
+            other.write_text(json.dumps({'ts': time.time(), 'view': 'home'}) + '\n')
+            self.assertEqual(sorted(record['view'] for record in read_records()), ['dashboard', 'home'])
+        self.assertTrue(Path(process_log_file(self.log)).exists())
+        self.assertFalse(self.log.exists())
+
+    def test_perf_report_flags_views_over_budget(self):
+        with self.settings(PERF_SAMPLE_RATE=1, PERF_LOG_FILE=self.log):
+            for _ in range(3):
+                self.client.get(reverse('dashboard'))
+            self.client.get(reverse('villa_reports'))
+            close_handlers()
+            out = StringIO()
+            call_command('perf_report', stdout=out)
+            self.assertIn('dashboard', out.getvalue())
+            self.assertNotIn('over their query budget', out.getvalue())
+
+            with self.settings(PERF_QUERY_BUDGETS={'dashboard': 2}, PERF_DEFAULT_QUERY_BUDGET=10):
+                with self.assertRaisesMessage(CommandError, '1 view(s) over their query budget: dashboard'):
+                    call_command('perf_report', '--check', stdout=StringIO())
+
+    def test_percentile_is_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual([percentile(values, q) for q in (50, 95, 99)], [50, 95, 99])
+        self.assertEqual(percentile([7], 99), 7)
+        self.assertIsNone(percentile([], 50))
+
+
+class SyntheticDataTests(TestCase):
+    def test_populate_data_adds_synthetic_data_at_scale(self):
+        call_command(
+            'populate_data', users=5, reports=40, comments=100, batch_size=16, no_index=True, stdout=StringIO(),
+        )
+        synthetic = VillaReport.objects.filter(user__username__startswith='loaduser')
+        self.assertEqual(User.objects.filter(username__startswith='loaduser').count(), 5)
+        self.assertEqual(synthetic.count(), 40)
+        self.assertEqual(Comment.objects.filter(villa_report__in=synthetic).count(), 100)
+        # Comments are written by the report owner or by staff
+        self.assertFalse(
+            Comment.objects.filter(villa_report__in=synthetic, is_admin_comment=False)
+            .exclude(user=F('villa_report__user')).exists()
+        )
+        # bulk_create skips the signals, so the counters were rebuilt
+        profiles = UserProfile.objects.filter(user__username__startswith='loaduser')
+        self.assertEqual(sum(profile.reports_total for profile in profiles), 40)
+        self.assertTrue(User.objects.get(username='loaduser0').check_password('loadtest123'))
+
+
+class LoadClientTests(LiveServerTestCase):
+    def test_client_keeps_session_and_csrf_cookies(self):
+        owner = User.objects.create_user('owner', password='pass12345')
+        report = VillaReport.objects.create(user=owner, report_type='pool', title='Pump', description='d', location='Pool')
+        client = Client()
+        client.force_login(owner)
+        now = time.time()
+        outcome = run_client(self.live_server_url, {
+            'cookies': {name: morsel.value for name, morsel in client.cookies.items()},
+            'requests': [
+                ['GET', reverse('villa_report_detail', args=[report.id]), None],
+                ['POST', reverse('submit_contact'), {'name': 'Load', 'email': 'load@example.com', 'message': 'Hi'}],
+            ],
+        }, start_at=now, measure_from=now, end_at=now + 0.5)
+        self.assertGreater(len(outcome['latencies']), 1)
+        self.assertEqual(outcome['errors'], 0)
+        self.assertEqual(list(outcome['statuses']), [200])
+        self.assertTrue(Contact.objects.filter(email='load@example.com').exists())
+
+
+class SchedulingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner')
+        cls.neighbour = User.objects.create_user('neighbour')
+        UserProfile.objects.create(user=cls.owner, villa_address='1 Palm Road')
+        UserProfile.objects.create(user=cls.neighbour, villa_address='2 Palm Road')
+        # Next Monday, so no day of the week is in the past
+        cls.monday = week_start_for(timezone.localdate()) + datetime.timedelta(days=7)
+
+    def report(self, user, **fields):
+        fields = {'report_type': 'other', 'priority': 'medium', 'title': 'Job', 'description': 'd',
+                  'location': 'Villa', **fields}
+        return VillaReport.objects.create(user=user, **fields)
+
+    def technician(self, **fields):
+        return Technician.objects.create(**{'name': 'Tech', 'work_days': [0], **fields})
+
+    def test_urgent_work_is_placed_first(self):
+        # Three hours: the emergency (two hours plus travel) leaves no room
+        self.technician(day_start=datetime.time(8), day_end=datetime.time(11))
+        low = self.report(self.owner, priority='low')
+        emergency = self.report(self.neighbour, report_type='emergency')
+        plan = plan_week(self.monday, apply=True)
+        self.assertEqual(list(plan.placed), [emergency.id])
+        self.assertEqual([job.id for job in plan.unscheduled], [low.id])
+        emergency.refresh_from_db()
+        self.assertEqual(timezone.localtime(emergency.scheduled_date).time(), datetime.time(8, 30))
+        self.assertIsNone(VillaReport.objects.get(pk=low.pk).technician)
+
+    def test_jobs_at_one_villa_share_a_visit(self):
+        technician = self.technician()
+        first, second = self.report(self.owner), self.report(self.owner, report_type='pool')
+        self.report(self.neighbour)
+        plan = plan_week(self.monday, apply=True)
+        self.assertEqual(len(plan.placed), 3)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.technician, second.technician), (technician, technician))
+        # One trip: the second job starts when the first ends
+        self.assertEqual(second.scheduled_date - first.scheduled_date, datetime.timedelta(minutes=60))
+        self.assertEqual(sum(len(slot.villas) for slot in plan.slots.values()), 2)
+
+    def test_technicians_only_get_their_report_types(self):
+        pool = self.technician(report_types=['pool'])
+        pool_job = self.report(self.owner, report_type='pool')
+        other_job = self.report(self.neighbour)
+        plan = plan_week(self.monday)
+        self.assertEqual(plan.assignments()[pool_job.id][0], pool.id)
+        self.assertEqual([job.id for job in plan.unscheduled], [other_job.id])
+        # Dry run: nothing saved
+        self.assertFalse(VillaReport.objects.filter(technician__isnull=False).exists())
+
+    @override_settings(TASKS_EAGER=True)
+    def test_finished_report_leaves_its_visit(self):
+        self.technician()
+        first, second = self.report(self.owner), self.report(self.owner)
+        plan_week(self.monday, apply=True)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(second.scheduled_date - first.scheduled_date, datetime.timedelta(minutes=60))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.status = 'completed'
+            first.save()
+        # The finished job keeps its technician; the rest of the visit moves up
+        self.assertEqual(VillaReport.objects.get(pk=first.pk).technician_id, first.technician_id)
+        self.assertEqual(VillaReport.objects.get(pk=second.pk).scheduled_date, first.scheduled_date)
+
+    def test_missed_visits_are_planned_again(self):
+        technician = self.technician(work_days=list(range(7)), day_end=datetime.time(23, 59))
+        overdue = self.report(self.owner, status='in_progress')
+        missed = timezone.now() - datetime.timedelta(days=8)
+        VillaReport.objects.filter(pk=overdue.pk).update(technician=technician, scheduled_date=missed)
+
+        plan = plan_week(self.monday, apply=True)
+        self.assertEqual(list(plan.placed), [overdue.id])
+        overdue.refresh_from_db()
+        self.assertEqual(timezone.localdate(overdue.scheduled_date), self.monday)
+
+        VillaReport.objects.filter(pk=overdue.pk).update(scheduled_date=missed)
+        technician_id, start = replan_report(overdue.pk)
+        self.assertEqual(technician_id, technician.id)
+        self.assertGreaterEqual(timezone.localdate(start), timezone.localdate())
+        self.assertEqual(VillaReport.objects.get(pk=overdue.pk).scheduled_date, start)
+
+    def test_plan_schedule_command(self):
+        self.technician(name='Alex')
+        self.report(self.owner)
+        out = StringIO()
+        call_command('plan_schedule', '--week', self.monday.isoformat(), '--apply', stdout=out)
+        self.assertIn('Alex', out.getvalue())
+        self.assertIn('1 reports in 1 villa visits', out.getvalue())
+        self.assertTrue(VillaReport.objects.filter(technician__name='Alex').exists())
+
+
+class SLARollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_superuser('staff', 'staff@example.com', 'pass12345')
+        cls.owner = User.objects.create_user('owner')
+
+    def report(self, **fields):
+        fields = {'report_type': 'pool', 'priority': 'high', 'title': 'Pump', 'description': 'd',
+                  'location': 'Pool', **fields}
+        return VillaReport.objects.create(user=self.owner, **fields)
+
+    def assertRollupsCorrect(self):
+        self.assertEqual(find_drift(), ([], []))
+
+    def test_signals_keep_rollups_in_step(self):
+        report = self.report()
+        other = self.report(priority='low')
+        self.assertRollupsCorrect()
+
+        Comment.objects.create(villa_report=report, user=self.owner, comment='Any news?')
+        Comment.objects.create(villa_report=report, user=self.staff, comment='On it', is_admin_comment=True)
+        Comment.objects.create(villa_report=report, user=self.staff, comment='Parts ordered', is_admin_comment=True)
+        row = SLARollup.objects.get(report_type='pool', priority='high')
+        # Only the first staff comment counts as the response
+        self.assertEqual((row.reports, row.responded, row.response_met), (1, 1, 1))
+        self.assertRollupsCorrect()
+
+        report.status = 'completed'
+        report.completed_date = report.created_at + datetime.timedelta(hours=100)
+        report.save()
+        row.refresh_from_db()
+        self.assertEqual((row.completed, row.completion_met), (1, 0))
+        self.assertEqual(row.completion_time, datetime.timedelta(hours=100))
+        self.assertRollupsCorrect()
+
+        # A priority change moves the report, with its response, to another row
+        report.priority = 'low'
+        report.save()
+        self.assertRollupsCorrect()
+        row = SLARollup.objects.get(report_type='pool', priority='low')
+        self.assertEqual((row.reports, row.responded, row.completed, row.completion_met), (2, 1, 1, 1))
+
+        other.status = 'cancelled'
+        other.save()
+        report.delete()
+        self.assertRollupsCorrect()
+        self.assertEqual(SLARollup.objects.filter(reports__gt=0).count(), 1)
+
+    def test_completed_reports_keep_their_completed_date(self):
+        report = self.report(status='completed')
+        completed_date = report.completed_date
+        self.client.force_login(self.staff)
+        response = self.client.post(reverse('admin:main_villareport_change', args=[report.pk]), {
+            'user': self.owner.pk, 'report_type': 'pool', 'priority': 'high', 'title': 'Pump',
+            'description': 'd', 'location': 'Pool', 'status': 'completed', 'admin_notes': '',
+            'transitions-TOTAL_FORMS': 0, 'transitions-INITIAL_FORMS': 0,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['adminform'].form.errors['completed_date'],
+                         ['A completed report needs its completion date.'])
+        report.refresh_from_db()
+        self.assertEqual(report.completed_date, completed_date)
+        with self.assertRaisesMessage(ValueError, 'A completed report has no completed_date'):
+            report_totals('high', report.created_at, 'completed', None)
+        self.assertRollupsCorrect()
+
+    def test_rollup_sla_repairs_drift(self):
+        self.report()
+        # bulk_create sends no signals
+        VillaReport.objects.bulk_create([
+            VillaReport(user=self.owner, report_type='other', title='t', description='d', location='l')
+        ])
+        with self.assertRaisesMessage(CommandError, '1 SLA rollup rows are wrong'):
+            call_command('rollup_sla', '--verify', stdout=StringIO())
+        out = StringIO()
+        call_command('rollup_sla', stdout=out)
+        self.assertIn('1 rows updated', out.getvalue())
+        call_command('rollup_sla', '--verify', '--months', '1', stdout=StringIO())
+
+    def test_analytics_page_reads_only_rollups(self):
+        self.client.force_login(self.staff)
+        for _ in range(3):
+            self.report()
+        with self.assertNumQueries(2):
+            small = self.client.get(reverse('admin_analytics'))
+        VillaReport.objects.bulk_create([
+            VillaReport(user=self.owner, report_type='pool', priority='high', title='t', description='d',
+                        location='l')
+            for _ in range(200)
+        ])
+        rebuild_rollups()
+        # The rollups (the user is cached now): the same however many reports there are
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('admin_analytics'), {'type': 'pool', 'months': 6})
+        self.assertEqual(small.context['stats']['total']['reports'], 3)
+        stats = response.context['stats']
+        self.assertEqual(stats['total']['reports'], 203)
+        self.assertEqual(len(stats['months']), 6)
+        self.assertEqual(stats['months'][-1]['reports'], 203)
+
+
+class StatusTransitionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_superuser('staff', 'staff@example.com', 'pass12345')
+        cls.owner = User.objects.create_user('owner')
+
+    def report(self, **fields):
+        return VillaReport.objects.create(
+            user=self.owner, report_type='pool', title='Pump', description='d', location='Pool', **fields,
+        )
+
+    def move(self, report, status, at):
+        with patch('main.transitions.timezone.now', return_value=at):
+            report.status = status
+            report.save()
+
+    def test_completed_date_and_history(self):
+        start = timezone.now() - datetime.timedelta(days=10)
+        with patch('main.transitions.timezone.now', return_value=start):
+            report = self.report()
+        report._changed_by = self.staff
+        self.move(report, 'in_progress', start + datetime.timedelta(days=1))
+        self.move(report, 'completed', start + datetime.timedelta(days=2))
+        self.assertEqual(report.completed_date, start + datetime.timedelta(days=2))
+
+        self.move(report, 'in_progress', start + datetime.timedelta(days=3))
+        report.refresh_from_db()
+        self.assertIsNone(report.completed_date)
+        # Saves that leave the status alone add nothing
+        report.title = 'Pool pump'
+        report.save()
+
+        codes = StatusTransition.STATUS_CODES
+        history = list(report.transitions.values_list('from_status', 'to_status', 'changed_by'))
+        self.assertEqual(history, [
+            (None, codes['pending'], None),
+            (codes['pending'], codes['in_progress'], self.staff.pk),
+            (codes['in_progress'], codes['completed'], self.staff.pk),
+            (codes['completed'], codes['in_progress'], self.staff.pk),
+        ])
+        self.assertIsNone(status_at(report.pk, start - datetime.timedelta(days=1)))
+        self.assertEqual(status_at(report.pk, start), 'pending')
+        self.assertEqual(status_at(report.pk, start + datetime.timedelta(days=2, hours=12)), 'completed')
+
+        transition = report.transitions.first()
+        with self.assertRaises(ValueError):
+            transition.save()
+        with self.assertRaises(ValueError):
+            transition.delete()
+
+    def test_update_fields_still_saves_completed_date(self):
+        report = self.report()
+        report.status = 'completed'
+        report.save(update_fields=['status'])
+        report.refresh_from_db()
+        self.assertIsNotNone(report.completed_date)
+
+    def test_completed_date_follows_the_status_on_every_save(self):
+        report = self.report(status='completed')
+        completed_date = report.completed_date
+        report.completed_date = None
+        report.title = 'Pool pump'
+        report.save()
+        report.refresh_from_db()
+        self.assertEqual(report.completed_date, completed_date)
+
+        reopened = self.report(status='in_progress')
+        VillaReport.objects.filter(pk=reopened.pk).update(completed_date=completed_date)
+        reopened.refresh_from_db()
+        reopened.save()
+        reopened.refresh_from_db()
+        self.assertIsNone(reopened.completed_date)
+        # Neither save was a transition
+        self.assertEqual(StatusTransition.objects.filter(report_id__in=[report.pk, reopened.pk]).count(), 2)
+        self.assertEqual(find_drift(), ([], []))
+
+    def test_invalid_transitions_are_rejected(self):
+        report = self.report(status='cancelled')
+        report.status = 'completed'
+        with self.assertRaises(ValidationError):
+            report.save()
+        self.assertEqual(report.transitions.count(), 1)
+
+        self.client.force_login(self.staff)
+        response = self.client.post(reverse('admin_edit_report', args=[report.pk]), {
+            'user': self.owner.pk, 'report_type': 'pool', 'priority': 'medium', 'title': 'Pump',
+            'description': 'd', 'location': 'Pool', 'status': 'completed',
+        })
+        self.assertContains(response, "A report can&#x27;t go from Cancelled to Completed.")
+        report.refresh_from_db()
+        self.assertEqual(report.status, 'cancelled')
+
+    def test_counts_at_a_moment(self):
+        start = timezone.now() - datetime.timedelta(days=10)
+        with patch('main.transitions.timezone.now', return_value=start):
+            first, second, third = self.report(), self.report(), self.report()
+        self.move(first, 'in_progress', start + datetime.timedelta(days=1))
+        self.move(second, 'completed', start + datetime.timedelta(days=2))
+        self.move(first, 'completed', start + datetime.timedelta(days=3))
+
+        moment = start + datetime.timedelta(days=2, hours=12)
+        self.assertEqual(status_counts_at(moment), {
+            'pending': 1, 'in_progress': 1, 'completed': 1, 'cancelled': 0,
+        })
+        self.assertEqual(sum(status_counts_at(start - datetime.timedelta(days=1)).values()), 0)
+        statuses = dict(with_status_at(VillaReport.objects.all(), moment).values_list('pk', 'status_then'))
+        codes = StatusTransition.STATUS_CODES
+        self.assertEqual(statuses, {
+            first.pk: codes['in_progress'], second.pk: codes['completed'], third.pk: codes['pending'],
+        })
+
+    def test_deleting_a_report_keeps_its_history(self):
+        start = timezone.now() - datetime.timedelta(days=10)
+        with patch('main.transitions.timezone.now', return_value=start):
+            report = self.report()
+        self.move(report, 'in_progress', start + datetime.timedelta(days=1))
+        report_id = report.pk
+        with patch('main.transitions.timezone.now', return_value=start + datetime.timedelta(days=2)):
+            report.delete()
+
+        codes = StatusTransition.STATUS_CODES
+        history = list(StatusTransition.objects.filter(report_id=report_id).values_list('from_status', 'to_status'))
+        self.assertEqual(history, [(None, codes['pending']), (codes['pending'], codes['in_progress']),
+                                   (codes['in_progress'], None)])
+        self.assertEqual(status_at(report_id, start + datetime.timedelta(days=1, hours=12)), 'in_progress')
+        self.assertIsNone(status_at(report_id, start + datetime.timedelta(days=3)))
+        self.assertEqual(status_counts_at(start + datetime.timedelta(days=1, hours=12))['in_progress'], 1)
+        self.assertEqual(sum(status_counts_at(timezone.now()).values()), 0)
+
+    def test_counts_start_from_the_latest_snapshot(self):
+        start = timezone.now() - datetime.timedelta(days=10)
+        with patch('main.transitions.timezone.now', return_value=start):
+            first, second = self.report(), self.report()
+        self.move(first, 'in_progress', start + datetime.timedelta(days=1))
+        snapshot = start + datetime.timedelta(days=2)
+        self.assertEqual(take_snapshot(snapshot), snapshot)
+        self.move(second, 'completed', start + datetime.timedelta(days=3))
+
+        expected = {'pending': 0, 'in_progress': 1, 'completed': 1, 'cancelled': 0}
+        self.assertEqual(status_counts_at(start + datetime.timedelta(days=4)), expected)
+        # Only transitions after the snapshot are aggregated on top of it
+        StatusSnapshot.objects.filter(at=snapshot, status=StatusTransition.STATUS_CODES['cancelled']).update(count=5)
+        self.assertEqual(status_counts_at(start + datetime.timedelta(days=4))['cancelled'], 5)
+        self.assertEqual(status_counts_at(start + datetime.timedelta(days=1, hours=12))['cancelled'], 0)
+
+        # Backfilled history older than the snapshot invalidates it
+        imported, = VillaReport.objects.bulk_create([VillaReport(
+            user=self.owner, report_type='pool', title='t', description='d', location='l',
+        )])
+        VillaReport.objects.filter(pk=imported.pk).update(created_at=start)
+        backfill_transitions()
+        self.assertFalse(StatusSnapshot.objects.exists())
+        self.assertEqual(status_counts_at(start + datetime.timedelta(days=4)), dict(expected, pending=1))
+
+        call_command('snapshot_statuses', stdout=StringIO())
+        self.assertEqual(StatusSnapshot.objects.count(), len(StatusTransition.STATUS_CODES))
+
+    def test_backfill_for_bulk_created_reports(self):
+        # After created_at, which bulk_create sets to now
+        completed_date = timezone.now() + datetime.timedelta(hours=1)
+        VillaReport.objects.bulk_create([
+            VillaReport(user=self.owner, report_type='pool', title='t', description='d', location='l'),
+            VillaReport(user=self.owner, report_type='pool', title='t', description='d', location='l',
+                        status='completed', completed_date=completed_date),
+        ])
+        self.assertEqual(backfill_transitions(batch_size=1), 3)
+        self.assertEqual(backfill_transitions(), 0)
+        self.assertEqual(status_counts_at(completed_date)['completed'], 1)
+        self.assertEqual(status_counts_at(completed_date - datetime.timedelta(minutes=1))['pending'], 2)
+
+
+class ProfileMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='pass12345')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.owner)
+
+    def test_profile_is_created_once_then_cached(self):
+        self.assertFalse(UserProfile.objects.filter(user=self.owner).exists())
+        self.client.get(reverse('dashboard'))
+        profile = UserProfile.objects.get(user=self.owner)
+        # Recent reports only; the session, user and profile are cached
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['user_profile'].pk, profile.pk)
+
+    def test_saves_and_counter_changes_invalidate(self):
+        self.client.get(reverse('dashboard'))
+        VillaReport.objects.create(user=self.owner, report_type='pool', title='Pump', description='d', location='Pool')
+        self.assertEqual(self.client.get(reverse('dashboard')).context['total_reports'], 1)
+
+        self.client.post(reverse('profile'), {'phone': '555-0100', 'villa_type': 'luxury'})
+        response = self.client.get(reverse('profile'))
+        self.assertEqual(response.context['user_profile'].phone, '555-0100')
+        # The form saved every field, but not a stale report counter
+        self.assertEqual(UserProfile.objects.get(user=self.owner).reports_total, 1)
+
+    def test_profile_forms_leave_the_report_counters_alone(self):
+        self.client.get(reverse('dashboard'))
+        profile = UserProfile.objects.get(user=self.owner)
+        # A report counted after the profile was read (and cached)
+        UserProfile.objects.filter(pk=profile.pk).update(reports_total=F('reports_total') + 1)
+        self.client.post(reverse('profile'), {'phone': '555-0100', 'villa_type': 'luxury'})
+        profile.refresh_from_db()
+        self.assertEqual((profile.phone, profile.reports_total), ('555-0100', 1))
+
+        staff = User.objects.create_superuser('staff', 'staff@example.com', 'pass12345')
+        self.client.force_login(staff)
+        read_profile = UserProfileAdmin.get_object
+
+        def read_then_count_a_report(admin, *args):
+            obj = read_profile(admin, *args)
+            UserProfile.objects.filter(pk=obj.pk).update(reports_total=F('reports_total') + 1)
+            return obj
+
+        with patch.object(UserProfileAdmin, 'get_object', read_then_count_a_report):
+            response = self.client.post(reverse('admin:main_userprofile_change', args=[profile.pk]), {
+                'user': self.owner.pk, 'phone': '555-0199', 'address': '', 'villa_address': '',
+                'villa_type': 'luxury', 'subscription_package': '',
+            })
+        self.assertEqual(response.status_code, 302)
+        profile.refresh_from_db()
+        self.assertEqual((profile.phone, profile.reports_total), ('555-0199', 2))
+
+    def test_anonymous_requests_have_no_profile(self):
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        ProfileMiddleware(lambda request: None)(request)
+        with self.assertNumQueries(0):
+            self.assertFalse(request.profile)
+
+
+class SessionCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='pass12345')
+
+    def test_authenticated_requests_skip_session_and_user_queries(self):
+        self.client.login(username='owner', password='pass12345')
+        self.client.get(reverse('villa_reports'))
+        # Only the reports themselves
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('villa_reports'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_user_changes_reach_cached_sessions(self):
+        self.client.login(username='owner', password='pass12345')
+        self.client.get(reverse('villa_reports'))
+        self.owner.set_password('changed12345')
+        self.owner.save()
+        # The cached user is gone, so the old session's password hash no longer matches
+        self.assertRedirects(
+            self.client.get(reverse('villa_reports')), f"{settings.LOGIN_URL}?next={reverse('villa_reports')}",
+            fetch_redirect_response=False,
+        )
+
+    def test_logout_ends_cached_session(self):
+        self.client.login(username='owner', password='pass12345')
+        session_key = self.client.session.session_key
+        self.client.post(reverse('logout'))
+        self.assertIsNone(caches[settings.SESSION_CACHE_ALIAS].get(SessionStore(session_key).cache_key))
+        self.assertFalse(Session.objects.filter(session_key=session_key).exists())
+
+    def test_file_cache_writes_without_scanning_and_prunes_expired_entries(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        file_tier = {'BACKEND': 'main.sessions.SessionFileCache', 'LOCATION': directory}
+        with self.settings(CACHES={**settings.CACHES, settings.SESSION_CACHE_ALIAS: file_tier}):
+            session_cache = caches[settings.SESSION_CACHE_ALIAS]
+            with patch.object(SessionFileCache, '_list_cache_files') as list_files:
+                session_cache.set('live', 1, 60)
+                session_cache.set('expired', 1, -1)
+            list_files.assert_not_called()
+            out = StringIO()
+            call_command('clear_expired_sessions', stdout=out)
+            self.assertIn('1 expired cache entries', out.getvalue())
+            self.assertEqual(len(list(Path(directory).iterdir())), 1)
+            self.assertEqual(session_cache.get('live'), 1)
+
+    def test_clear_expired_sessions_in_batches(self):
+        now = timezone.now()
+        Session.objects.bulk_create([
+            Session(session_key=f'{name}{i:030d}', session_data='', expire_date=now + offset)
+            for name, offset in (('old', -datetime.timedelta(days=1)), ('new', datetime.timedelta(days=1)))
+            for i in range(5)
+        ])
+        out = StringIO()
+        call_command('clear_expired_sessions', '--batch-size', '2', stdout=out)
+        self.assertIn('Deleted 5 expired sessions', out.getvalue())
+        self.assertEqual(Session.objects.filter(session_key__startswith='new').count(), 5)
+        self.assertEqual(Session.objects.count(), 5)
@@ -0,0 +1,143 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.utils import timezone
+from .models import StatusSnapshot, StatusTransition, VillaReport
+
+CODES = StatusTransition.STATUS_CODES
+STATUSES = {code: value for value, code in CODES.items()}
+
+
+def begin(report, old_status, completed_date=None):
+    """Check a save's status change and keep completed_date in step with the status.
+
+    Runs on every save that may touch either field. old_status and
+    completed_date are the stored values, or None for a new report (which
+    may start in any status). Raises ValidationError for a change that
+    STATUS_TRANSITIONS does not allow. A completed report always has a
+    completed_date (a cleared one gets its stored value back) and any other
+    report has none. Returns the transition time, or None if the status is
+    unchanged.
+    """
+    report.check_transition(old_status)
+    now = timezone.now()
+    if report.status != 'completed':
+        report.completed_date = None
+    elif report.completed_date is None:
+        report.completed_date = completed_date if old_status == 'completed' and completed_date else now
+    if old_status is not None and old_status == report.status:
+        return None
+    return now
+
+
+def record(report, old_status, at, update_fields=None):
+    """Append the transition; save completed_date if update_fields left it out."""
+    StatusTransition.objects.create(
+        report_id=report.pk, from_status=CODES.get(old_status), to_status=CODES[report.status], at=at,
+        changed_by=getattr(report, '_changed_by', None),
+    )
+    if update_fields is not None and 'completed_date' not in update_fields:
+        VillaReport.objects.filter(pk=report.pk).update(completed_date=report.completed_date)
+
+
+def record_deletion(report):
+    """Append the report's deletion; its earlier transitions stay."""
+    StatusTransition.objects.create(
+        report_id=report.pk, from_status=CODES[report.status], to_status=None, at=timezone.now(),
+        changed_by=getattr(report, '_changed_by', None),
+    )
+
+
+def status_at(report_id, moment):
+    """A report's status at a moment, or None if it did not exist then (one index seek)."""
+    code = (
+        StatusTransition.objects.filter(report_id=report_id, at__lte=moment)
+        .order_by('-at', '-id').values_list('to_status', flat=True).first()
+    )
+    return STATUSES.get(code)
+
+
+def with_status_at(reports, moment):
+    """Annotate a VillaReport queryset with status_then, the status code at moment."""
+    return reports.annotate(status_then=Subquery(
+        StatusTransition.objects.filter(report=OuterRef('pk'), at__lte=moment)
+        .order_by('-at', '-id').values('to_status')[:1]
+    ))
+
+
+def latest_snapshot(moment):
+    """(at, {status: count}) of the latest snapshot at or before moment, or (None, zeros)."""
+    counts = dict.fromkeys(CODES, 0)
+    at = StatusSnapshot.objects.filter(at__lte=moment).order_by('-at').values_list('at', flat=True).first()
+    if at is not None:
+        for code, count in StatusSnapshot.objects.filter(at=at).values_list('status', 'count'):
+            counts[STATUSES[code]] = count
+    return at, counts
+
+
+def status_counts_at(moment):
+    """{status: number of reports in it} at a moment.
+
+    Starts from the latest snapshot before the moment; every transition
+    after it adds one to its new status and takes one from its old one.
+    That is one aggregate over the (at, from, to) index, limited to the
+    transitions since the snapshot.
+    """
+    since, counts = latest_snapshot(moment)
+    transitions = StatusTransition.objects.filter(at__lte=moment)
+    if since is not None:
+        transitions = transitions.filter(at__gt=since)
+    aggregates = {}
+    for value, code in CODES.items():
+        aggregates[f'to_{value}'] = Count('id', filter=Q(to_status=code))
+        aggregates[f'from_{value}'] = Count('id', filter=Q(from_status=code))
+    totals = transitions.order_by().aggregate(**aggregates)
+    return {value: counts[value] + totals[f'to_{value}'] - totals[f'from_{value}'] for value in CODES}
+
+
+def take_snapshot(moment=None):
+    """Store the status counts at moment (default: STATUS_SNAPSHOT_LAG seconds ago); returns it."""
+    if moment is None:
+        moment = timezone.now() - timedelta(seconds=settings.STATUS_SNAPSHOT_LAG)
+    counts = status_counts_at(moment)
+    StatusSnapshot.objects.filter(at=moment).delete()
+    StatusSnapshot.objects.bulk_create([
+        StatusSnapshot(at=moment, status=CODES[value], count=count) for value, count in counts.items()
+    ])
+    return moment
+
+
+def backfill_transitions(batch_size=5000):
+    """Give reports without any transitions (bulk imports) a plausible history.
+
+    Each gets its creation as pending and, if it has moved on since, one
+    change to its current status at completed_date or updated_at. Reports
+    are read in primary key batches, so inserting never disturbs the read.
+    Snapshots taken after the earliest backfilled transition no longer add
+    up and are deleted. Returns the number of transitions written.
+    """
+    missing = VillaReport.objects.exclude(pk__in=StatusTransition.objects.values('report_id')).order_by('pk')
+    written = last_id = 0
+    earliest = None
+    while True:
+        rows = list(missing.filter(pk__gt=last_id).values_list(
+            'id', 'status', 'created_at', 'completed_date', 'updated_at',
+        )[:batch_size])
+        if not rows:
+            if earliest is not None:
+                StatusSnapshot.objects.filter(at__gte=earliest).delete()
+            return written
+        batch_earliest = min(created_at for report_id, status, created_at, *dates in rows)
+        earliest = batch_earliest if earliest is None else min(earliest, batch_earliest)
+        batch = []
+        for report_id, status, created_at, completed_date, updated_at in rows:
+            batch.append(StatusTransition(report_id=report_id, to_status=CODES['pending'], at=created_at))
+            if status != 'pending':
+                batch.append(StatusTransition(
+                    report_id=report_id, from_status=CODES['pending'], to_status=CODES[status],
+                    at=max(completed_date or updated_at, created_at),
+                ))
+        StatusTransition.objects.bulk_create(batch)
+        written += len(batch)
+        last_id = rows[-1][0]
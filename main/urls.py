@@ -1,11 +1,12 @@
+from django.conf import settings
 from django.urls import path
 from django.contrib.auth import views as auth_views
 from . import views
 
 urlpatterns = [
     path('', views.home, name='home'),
-    path('submit-contact/', views.submit_contact, name='submit_contact'),
-    path('submit-review/', views.submit_review, name='submit_review'),
+    path('submit-contact/', views.submit_contact_async if settings.ASYNC_SUBMISSIONS else views.submit_contact, name='submit_contact'),
+    path('submit-review/', views.submit_review_async if settings.ASYNC_SUBMISSIONS else views.submit_review, name='submit_review'),
     
     # Authentication URLs
     path('register/', views.register_view, name='register'),
@@ -19,9 +20,15 @@ urlpatterns = [
     # Villa Reports (User)
     path('villa-reports/', views.villa_reports, name='villa_reports'),
     path('villa-report/<int:report_id>/', views.villa_report_detail, name='villa_report_detail'),
+    path('villa-report/<int:report_id>/events/', views.report_events, name='report_events'),
+    path('search/', views.search, name='search'),
+    path('villa-report/<int:report_id>/attachments/', views.upload_attachments, name='upload_attachments'),
+    path('attachments/<int:attachment_id>/', views.attachment_file, name='attachment_file'),
+    path('attachments/<int:attachment_id>/thumbnail/', views.attachment_thumbnail, name='attachment_thumbnail'),
     
     # Admin Routes
     path('admin-dashboard/', views.admin_dashboard, name='admin_dashboard'),
+    path('admin-panel/analytics/', views.admin_analytics, name='admin_analytics'),
     path('admin-panel/create-report/', views.admin_create_report, name='admin_create_report'),
     path('admin-panel/edit-report/<int:report_id>/', views.admin_edit_report, name='admin_edit_report'),
     path('admin-panel/report/<int:report_id>/', views.admin_report_detail, name='admin_report_detail'),
@@ -1,15 +1,27 @@
-from django.shortcuts import render, redirect, get_object_or_404
+import os
+import time
+
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib import messages
 from django.contrib.auth import login, authenticate
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.forms import AuthenticationForm
-from django.http import JsonResponse
-from django.core.paginator import Paginator
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.decorators.http import require_POST
 from django.contrib.auth.models import User
 from django.utils.translation import gettext as _
 from django.conf import settings
-from .models import Contact, Review, Package, UserProfile, VillaReport, Comment
+from .models import Attachment, Contact, Review, Package, UserProfile, VillaReport, Comment
+from .events import report_stream
+from .attachments import AttachmentUploadHandler, ranged_file_response, schedule
+from .counters import report_tallies
 from .forms import ContactForm, ReviewForm, CustomUserCreationForm, UserProfileForm, VillaReportForm, CommentForm
+from .pagination import CursorPaginator
+from .search import get_search_backend
+from .sla import analytics
+from .write_queue import get_writer
 
 
 
@@ -17,7 +29,8 @@ from .forms import ContactForm, ReviewForm, CustomUserCreationForm, UserProfileF
 
 def home(request):
     
-    # Get approved reviews
+    # Get approved reviews (querysets are lazy, so they only hit the
+    # database when the cached fragments in home.html have expired)
     reviews = Review.objects.filter(is_approved=True)[:6]
     
     # Get packages
@@ -50,6 +63,7 @@ def home(request):
         'review_form': review_form,
         'reviews': reviews,
         'packages': packages,
+        'fragment_cache_timeout': settings.HOME_FRAGMENT_CACHE_TIMEOUT,
     }
     
     return render(request, 'main/home.html', context)
@@ -79,6 +93,35 @@ def submit_review(request):
     return JsonResponse({'success': False, 'message': 'Invalid request'})
 
 
+# Async variants for ASGI deployments (settings.ASYNC_SUBMISSIONS): validate
+# inline, then hand the row to a batching writer instead of INSERTing here
+def form_values(form):
+    return {name: form.cleaned_data[name] for name in form._meta.fields}
+
+
+async def submit_contact_async(request):
+    if request.method == 'POST':
+        form = ContactForm(request.POST)
+        if form.is_valid():
+            await get_writer(Contact).submit(form_values(form))
+            return JsonResponse({'success': True, 'message': 'Thank you for your message!'})
+        else:
+            return JsonResponse({'success': False, 'errors': form.errors})
+    return JsonResponse({'success': False, 'message': 'Invalid request'})
+
+
+async def submit_review_async(request):
+    if request.method == 'POST':
+        form = ReviewForm(request.POST)
+        if form.is_valid():
+            # Reviews need approval; is_approved defaults to False
+            await get_writer(Review).submit(form_values(form))
+            return JsonResponse({'success': True, 'message': 'Thank you for your review!'})
+        else:
+            return JsonResponse({'success': False, 'errors': form.errors})
+    return JsonResponse({'success': False, 'message': 'Invalid request'})
+
+
 # Authentication Views
 def register_view(request):
     if request.method == 'POST':
@@ -114,20 +157,19 @@ def login_view(request):
 
 @login_required
 def dashboard(request):
-    user_profile, created = UserProfile.objects.get_or_create(user=request.user)
+    user_profile = request.profile
     recent_reports = VillaReport.objects.filter(user=request.user)[:5]
     
-    # Get statistics
-    total_reports = VillaReport.objects.filter(user=request.user).count()
-    pending_reports = VillaReport.objects.filter(user=request.user, status='pending').count()
-    completed_reports = VillaReport.objects.filter(user=request.user, status='completed').count()
+    # Get statistics (counters kept current by main.counters)
+    summary = user_profile.report_counts()
     
     context = {
         'user_profile': user_profile,
         'recent_reports': recent_reports,
-        'total_reports': total_reports,
-        'pending_reports': pending_reports,
-        'completed_reports': completed_reports,
+        'total_reports': summary['total'],
+        'pending_reports': summary['status_pending'],
+        'completed_reports': summary['status_completed'],
+        'report_summary': summary,
     }
     
     return render(request, 'main/dashboard.html', context)
@@ -135,12 +177,14 @@ def dashboard(request):
 
 @login_required
 def profile_view(request):
-    user_profile, created = UserProfile.objects.get_or_create(user=request.user)
+    user_profile = request.profile
     
     if request.method == 'POST':
         form = UserProfileForm(request.POST, instance=user_profile)
         if form.is_valid():
-            form.save()
+            # Only the form's columns: the report counters are moved with F()
+            # expressions by main.counters and may have changed since the read
+            form.save(commit=False).save(update_fields=[*form.Meta.fields, 'updated_at'])
             messages.success(request, 'Profile updated successfully!')
             return redirect('profile')
     else:
@@ -152,47 +196,94 @@ def profile_view(request):
 @login_required
 def villa_reports(request):
     reports = VillaReport.objects.filter(user=request.user)
-    paginator = Paginator(reports, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = CursorPaginator(reports, 10)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
     return render(request, 'main/villa_reports.html', {'page_obj': page_obj})
 
 
+@login_required
+def search(request):
+    query = request.GET.get('q', '').strip()
+    results = []
+    elapsed_ms = None
+    if query:
+        # Staff search every report; owners only see their own
+        owner = None if request.user.is_staff else request.user
+        started = time.perf_counter()
+        results = get_search_backend().search(query, owner=owner, limit=settings.SEARCH_RESULTS_LIMIT)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+    
+    context = {
+        'query': query,
+        'results': results,
+        'elapsed_ms': elapsed_ms,
+    }
+    
+    return render(request, 'main/search_results.html', context)
+
+
 # Admin-only functions
 def is_admin(user):
     return user.is_authenticated and user.is_staff
 
 @user_passes_test(is_admin)
 def admin_dashboard(request):
-    # Get statistics
-    total_reports = VillaReport.objects.count()
-    pending_reports = VillaReport.objects.filter(status='pending').count()
-    in_progress_reports = VillaReport.objects.filter(status='in_progress').count()
-    completed_reports = VillaReport.objects.filter(status='completed').count()
+    # Get statistics (tallies kept current by main.counters)
+    summary = report_tallies()
     
     # Get recent reports
-    recent_reports = VillaReport.objects.all()[:10]
+    recent_reports = VillaReport.objects.select_related('user')[:10]
     
     # Get recent comments
-    recent_comments = Comment.objects.all()[:10]
+    recent_comments = Comment.objects.select_related('user')[:10]
     
     context = {
-        'total_reports': total_reports,
-        'pending_reports': pending_reports,
-        'in_progress_reports': in_progress_reports,
-        'completed_reports': completed_reports,
+        'total_reports': summary['total'],
+        'pending_reports': summary['status_pending'],
+        'in_progress_reports': summary['status_in_progress'],
+        'completed_reports': summary['status_completed'],
+        'report_summary': summary,
         'recent_reports': recent_reports,
         'recent_comments': recent_comments,
     }
     
     return render(request, 'main/admin_dashboard.html', context)
 
+@user_passes_test(is_admin)
+def admin_analytics(request):
+    # Reads only the SLARollup rows for the period, never the reports table
+    report_type = request.GET.get('type')
+    if report_type not in dict(VillaReport.REPORT_TYPES):
+        report_type = None
+    try:
+        months = min(max(int(request.GET.get('months', settings.SLA_ANALYTICS_MONTHS)), 1), 60)
+    except ValueError:
+        months = settings.SLA_ANALYTICS_MONTHS
+    stats = analytics(months, report_type)
+    # Bar lengths relative to the busiest month
+    peak = max((month['reports'] for month in stats['months']), default=0) or 1
+    for month in stats['months']:
+        month['bar_pct'] = 100 * month['reports'] / peak
+    context = {
+        'stats': stats,
+        'months': months,
+        'report_type': report_type,
+        'report_types': VillaReport.REPORT_TYPES,
+        'breakdowns': [('Per Tipo', stats['types']), ('Per Priorità', stats['priorities'])],
+        'targets': [
+            (label, settings.SLA_RESPONSE_TARGET_HOURS[value], settings.SLA_COMPLETION_TARGET_HOURS[value])
+            for value, label in reversed(VillaReport.PRIORITY_LEVELS)
+        ],
+    }
+    return render(request, 'main/admin_analytics.html', context)
+
 @user_passes_test(is_admin)
 def admin_create_report(request):
     if request.method == 'POST':
         form = VillaReportForm(request.POST)
         if form.is_valid():
+            form.instance._changed_by = request.user
             form.save()
             messages.success(request, 'Villa report created successfully!')
             return redirect('admin_dashboard')
@@ -208,6 +299,7 @@ def admin_edit_report(request, report_id):
     if request.method == 'POST':
         form = VillaReportForm(request.POST, instance=report)
         if form.is_valid():
+            report._changed_by = request.user
             form.save()
             messages.success(request, 'Villa report updated successfully!')
             return redirect('admin_dashboard')
@@ -218,8 +310,8 @@ def admin_edit_report(request, report_id):
 
 @user_passes_test(is_admin)
 def admin_report_detail(request, report_id):
-    report = get_object_or_404(VillaReport, id=report_id)
-    comments = Comment.objects.filter(villa_report=report)
+    report = get_object_or_404(VillaReport.objects.select_related('user'), id=report_id)
+    comments = Comment.objects.filter(villa_report=report).select_related('user')
     
     if request.method == 'POST':
         form = CommentForm(request.POST)
@@ -237,6 +329,7 @@ def admin_report_detail(request, report_id):
     context = {
         'report': report,
         'comments': comments,
+        'attachments': report.attachments.all(),
         'form': form,
     }
     
@@ -246,7 +339,7 @@ def admin_report_detail(request, report_id):
 @login_required
 def villa_report_detail(request, report_id):
     report = get_object_or_404(VillaReport, id=report_id, user=request.user)
-    comments = Comment.objects.filter(villa_report=report)
+    comments = Comment.objects.filter(villa_report=report).select_related('user')
     
     if request.method == 'POST':
         form = CommentForm(request.POST)
@@ -264,7 +357,93 @@ def villa_report_detail(request, report_id):
     context = {
         'report': report,
         'comments': comments,
+        'attachments': report.attachments.all(),
         'form': form,
     }
     
-    return render(request, 'main/villa_report_detail.html', context)
\ No newline at end of file
+    return render(request, 'main/villa_report_detail.html', context)
+
+
+# Photo attachments
+# The upload handlers must be swapped before anything reads request.POST,
+# and CsrfViewMiddleware does exactly that, so CSRF is checked inside instead.
+@csrf_exempt
+@login_required
+@require_POST
+def upload_attachments(request, report_id):
+    handler = AttachmentUploadHandler(request)
+    request.upload_handlers = [handler]
+    return _upload_attachments(request, report_id, handler)
+
+
+@csrf_protect
+def _upload_attachments(request, report_id, handler):
+    report = get_object_or_404(VillaReport, id=report_id)
+    if not (request.user.is_staff or report.user_id == request.user.id):
+        raise Http404
+    detail_url = 'admin_report_detail' if request.user.is_staff else 'villa_report_detail'
+
+    uploaded = 0
+    rejected = list(handler.rejected)
+    for upload in request.FILES.getlist('files')[:settings.ATTACHMENT_MAX_FILES]:
+        if os.path.splitext(upload.name)[1].lower() not in settings.ATTACHMENT_EXTENSIONS:
+            rejected.append(upload.name)
+            continue
+        attachment = Attachment.objects.create(
+            villa_report=report, uploaded_by=request.user, file=upload,
+            original_name=upload.name[:255], content_type=upload.content_type or '', size=upload.size,
+        )
+        schedule(attachment.id)
+        uploaded += 1
+
+    if uploaded:
+        messages.success(request, f'{uploaded} photo(s) uploaded. Thumbnails will appear shortly.')
+    if rejected:
+        messages.error(request, f'Not uploaded (unsupported type or too large): {", ".join(rejected)}')
+    return redirect(detail_url, report_id=report.id)
+
+
+def _get_attachment(request, attachment_id):
+    attachment = get_object_or_404(Attachment.objects.select_related('villa_report'), id=attachment_id)
+    if not (request.user.is_staff or attachment.villa_report.user_id == request.user.id):
+        raise Http404
+    return attachment
+
+
+@login_required
+def attachment_file(request, attachment_id):
+    attachment = _get_attachment(request, attachment_id)
+    response = ranged_file_response(request, attachment.file.path)
+    response['Cache-Control'] = 'private, max-age=86400'
+    return response
+
+
+@login_required
+def attachment_thumbnail(request, attachment_id):
+    attachment = _get_attachment(request, attachment_id)
+    if not attachment.thumbnail:
+        raise Http404
+    response = ranged_file_response(request, attachment.thumbnail.path, 'image/webp')
+    response['Cache-Control'] = 'private, max-age=86400'
+    return response
+
+
+# Live updates for the report detail pages (see main/events.py)
+@login_required
+async def report_events(request, report_id):
+    if not isinstance(request, ASGIRequest):
+        # A WSGI worker would be tied up for the life of the stream; 204
+        # tells EventSource to stop reconnecting, so pages just stay static
+        return HttpResponse(status=204)
+    user = await request.auser()
+    report = await aget_object_or_404(VillaReport.objects.only('id', 'user_id'), id=report_id)
+    if not (user.is_staff or report.user_id == user.id):
+        raise Http404
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('after')
+    after = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    response = StreamingHttpResponse(report_stream(report.id, after), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,306 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+class JournalSegment:
+    """Append-only JSONL file holding rows that are queued but not yet saved.
+
+    All file I/O runs in order on the writer's single journal thread, so the
+    event loop never blocks on disk. Concurrent writers share fsync calls
+    (group commit): a caller waits until an fsync that started after its own
+    write has finished. After each saved batch a '#saved N' line records
+    that the segment's first N rows are in the database, so recovery skips
+    them.
+    """
+
+    def __init__(self, path, executor):
+        self.path = path
+        self.executor = executor
+        self.file = None
+        self.error = None
+        self.created = time.monotonic()
+        self.size = 0
+        self.written = 0
+        self.synced = 0
+        self.pending = 0
+        self.saved = 0
+        self.failed = False
+        self._syncing = None
+
+    def append(self, values):
+        line = json.dumps(values) + '\n'
+        self.size += len(line)
+        self.written += 1
+        self.pending += 1
+        self._write(line)
+        return self.written
+
+    def mark_saved(self, count):
+        """Checkpoint count more rows as saved (rows are saved in the order they were appended)."""
+        self.saved += count
+        self._write(f'#saved {self.saved}\n')
+
+    def _write(self, text):
+        # Queued without waiting; the journal thread writes in submission order
+        self.executor.submit(self._write_now, text)
+
+    def _write_now(self, text):
+        if self.error is not None:
+            return
+        try:
+            if self.file is None:
+                self.file = open(self.path, 'a', encoding='utf-8')
+            self.file.write(text)
+            self.file.flush()
+        except OSError as error:
+            self.error = error
+            logger.exception('Failed to write the journal %s', self.path)
+
+    async def sync(self, seq):
+        while self.synced < seq:
+            if self._syncing is None:
+                self._syncing = asyncio.ensure_future(self._fsync(self.written))
+            await asyncio.shield(self._syncing)
+
+    async def _fsync(self, target):
+        try:
+            # Runs after every write submitted before it
+            await asyncio.get_running_loop().run_in_executor(self.executor, self._fsync_now)
+            self.synced = max(self.synced, target)
+        finally:
+            self._syncing = None
+
+    def _fsync_now(self):
+        if self.error is not None:
+            raise self.error
+        if self.file is not None:
+            os.fsync(self.file.fileno())
+
+    async def close(self, delete):
+        if self._syncing is not None:
+            await asyncio.shield(self._syncing)
+        await asyncio.get_running_loop().run_in_executor(self.executor, self._close_now, delete)
+
+    def _close_now(self, delete):
+        if self.file is not None:
+            self.file.close()
+        if delete:
+            self.path.unlink(missing_ok=True)
+
+
+class BatchWriter:
+    """Buffers rows for one model and saves them with bulk_create.
+
+    submit() returns once the row is fsynced to a journal segment, so an
+    acknowledged submission survives a crash. A background task saves rows
+    when batch_size is reached or flush_interval seconds have passed,
+    whichever comes first, and checkpoints them in their segment. Segments
+    are rotated once they reach segment_size bytes or segment_age seconds
+    and deleted when all their rows are saved. Segments left behind by a
+    dead process are claimed (renamed) by one live process and replayed
+    from their last checkpoint, so delivery is at-least-once.
+    """
+
+    def __init__(self, model, batch_size, flush_interval, journal_dir, fsync=True,
+                 segment_size=1024 * 1024, segment_age=300):
+        self.model = model
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.journal_dir = Path(journal_dir)
+        self.fsync = fsync
+        self.segment_size = segment_size
+        self.segment_age = segment_age
+        self.name = model._meta.label_lower
+        self._queue = None
+        self._task = None
+        self._executor = None
+        self._segment = None
+        self._segments = []
+        self._segment_numbers = itertools.count()
+
+    async def submit(self, values):
+        self._start()
+        segment = self._segment
+        # append + enqueue run without awaiting, so the flusher can never see
+        # a queued row that was not submitted to the journal, or the reverse
+        seq = segment.append(values)
+        self._queue.put_nowait((segment, values))
+        if self.fsync:
+            await segment.sync(seq)
+
+    async def drain(self):
+        """Save everything still queued and stop the background task."""
+        if self._task is None:
+            return
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+        await self._release_segments()
+        if self._segment is not None:
+            await self._segment.close(delete=self._segment.pending == 0 and not self._segment.failed)
+            self._segment = None
+        self._executor.shutdown()
+        self._executor = None
+
+    def recover(self):
+        """Replay segments written by processes that are no longer running.
+
+        Each segment is first renamed to a name owned by this process, which
+        only one process can do, so two workers never replay the same rows.
+        If this process dies while replaying, the renamed segment is picked
+        up by the next recovery in turn.
+        """
+        if not self.journal_dir.exists():
+            return 0
+        recovered = 0
+        for path in sorted(self.journal_dir.glob(f'{self.name}-*.jsonl')):
+            pid = int(path.stem.split('-')[1])
+            if pid == os.getpid() or _process_alive(pid):
+                continue
+            claimed = path.with_name(f'{self.name}-{os.getpid()}-recovered-{uuid.uuid4().hex}.jsonl')
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                # Claimed by another process
+                continue
+            rows = _read_journal(claimed)
+            self._save(rows)
+            claimed.unlink()
+            recovered += len(rows)
+        if recovered:
+            logger.info('Recovered %d queued %s rows from the journal', recovered, self.name)
+        return recovered
+
+    def _start(self):
+        if self._task is not None:
+            return
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix=f'journal-{self.name}')
+        self._rotate()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        try:
+            await sync_to_async(self.recover)()
+        except Exception:
+            logger.exception('Failed to replay the %s journal', self.name)
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            stopping = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), deadline - loop.time())
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+            if stopping:
+                return
+
+    async def _flush(self, batch):
+        try:
+            await sync_to_async(self._save)([values for segment, values in batch])
+        except Exception:
+            # The rows stay in their journal segments and are replayed on restart
+            logger.exception('Failed to save %d queued %s rows', len(batch), self.name)
+            for segment, values in batch:
+                segment.failed = True
+        else:
+            # Batches are taken in submission order, so each segment's saved
+            # rows are a prefix of it, unless an earlier flush failed
+            for segment, count in Counter(segment for segment, values in batch).items():
+                if not segment.failed:
+                    segment.mark_saved(count)
+        for segment, values in batch:
+            segment.pending -= 1
+        if (self._segment.size >= self.segment_size
+                or time.monotonic() - self._segment.created >= self.segment_age):
+            self._rotate()
+        await self._release_segments()
+
+    def _save(self, rows):
+        with transaction.atomic():
+            self.model.objects.bulk_create([self.model(**values) for values in rows], batch_size=self.batch_size)
+
+    def _rotate(self):
+        if self._segment is not None:
+            self._segments.append(self._segment)
+        path = self.journal_dir / f'{self.name}-{os.getpid()}-{next(self._segment_numbers)}.jsonl'
+        self._segment = JournalSegment(path, self._executor)
+
+    async def _release_segments(self):
+        for segment in [segment for segment in self._segments if segment.pending == 0]:
+            self._segments.remove(segment)
+            await segment.close(delete=not segment.failed)
+
+
+def _read_journal(path):
+    """The rows of a journal segment that its last checkpoint does not cover."""
+    rows = []
+    saved = 0
+    with open(path, encoding='utf-8') as journal:
+        for line in journal:
+            if line.startswith('#saved '):
+                saved = int(line.split()[1])
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                # Torn final line from a crash; it was never acknowledged
+                continue
+    return rows[saved:]
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+_writers = {}
+
+
+def get_writer(model):
+    if model not in _writers:
+        _writers[model] = BatchWriter(
+            model,
+            batch_size=settings.WRITE_QUEUE_BATCH_SIZE,
+            flush_interval=settings.WRITE_QUEUE_FLUSH_INTERVAL,
+            journal_dir=settings.WRITE_QUEUE_JOURNAL_DIR,
+            fsync=settings.WRITE_QUEUE_FSYNC,
+            segment_size=settings.WRITE_QUEUE_SEGMENT_SIZE,
+            segment_age=settings.WRITE_QUEUE_SEGMENT_AGE,
+        )
+    return _writers[model]
+
+
+async def drain_all():
+    for writer in list(_writers.values()):
+        await writer.drain()
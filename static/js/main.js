@@ -104,8 +104,84 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         });
     });
+
+    // Live comments and status on report detail pages
+    const commentsList = document.querySelector('.comments-list[data-events-url]');
+    if (commentsList && window.EventSource) {
+        initReportEvents(commentsList);
+    }
 });
 
+// Report updates over Server-Sent Events
+function initReportEvents(commentsList) {
+    // Resume after the newest comment rendered with the page; on reconnects
+    // the browser sends Last-Event-ID instead
+    const ids = Array.from(commentsList.querySelectorAll('[data-comment-id]'), el => Number(el.dataset.commentId));
+    const url = commentsList.dataset.eventsUrl + '?after=' + (ids.length ? Math.max(...ids) : 0);
+    const source = new EventSource(url);
+
+    source.addEventListener('status', function(e) {
+        const status = JSON.parse(e.data);
+        document.querySelectorAll('[data-report-status]').forEach(badge => {
+            badge.className = 'badge bg-' + status.color;
+            badge.textContent = status.label;
+            badge.dataset.reportStatus = status.status;
+        });
+    });
+
+    source.addEventListener('comment', function(e) {
+        const comment = JSON.parse(e.data);
+        if (commentsList.querySelector('[data-comment-id="' + comment.id + '"]')) {
+            return;
+        }
+        const emptyState = commentsList.querySelector('.empty-state');
+        if (emptyState) {
+            emptyState.remove();
+        }
+        commentsList.prepend(renderComment(comment));
+    });
+}
+
+function renderComment(comment) {
+    // Built with textContent so comment text is never parsed as HTML
+    const item = document.createElement('div');
+    item.className = 'comment-item ' + (comment.is_admin ? 'admin-comment' : 'client-comment');
+    item.dataset.commentId = comment.id;
+
+    const header = document.createElement('div');
+    header.className = 'comment-header';
+    const author = document.createElement('div');
+    author.className = 'comment-author';
+    const name = document.createElement('strong');
+    name.textContent = comment.author;
+    const role = document.createElement('span');
+    role.className = 'badge ' + (comment.is_admin ? 'bg-warning' : 'bg-info');
+    role.textContent = comment.is_admin ? 'Admin' : 'Client';
+    author.append(name, ' ', role);
+    const date = document.createElement('div');
+    date.className = 'comment-date';
+    date.textContent = new Date(comment.created_at).toLocaleString([], {
+        month: 'short', day: '2-digit', year: 'numeric', hour: '2-digit', minute: '2-digit', hour12: false
+    });
+    header.append(author, date);
+
+    const content = document.createElement('div');
+    content.className = 'comment-content';
+    comment.comment.split(/\n{2,}/).forEach(paragraph => {
+        const p = document.createElement('p');
+        paragraph.split('\n').forEach((line, i) => {
+            if (i) {
+                p.append(document.createElement('br'));
+            }
+            p.append(line);
+        });
+        content.append(p);
+    });
+
+    item.append(header, content);
+    return item;
+}
+
 // Contact form handling
 function handleContactForm() {
     const form = document.getElementById('contactForm');
@@ -200,7 +276,13 @@ function handleSearch() {
         });
         
         if (!found) {
-            showNotification('No results found for your search.', 'info');
+            // Signed-in users fall back to the full-text report search
+            const searchUrl = document.getElementById('searchForm').dataset.searchUrl;
+            if (searchUrl) {
+                window.location.href = `${searchUrl}?q=${encodeURIComponent(query)}`;
+            } else {
+                showNotification('No results found for your search.', 'info');
+            }
         }
     }
 }
@@ -10,7 +10,58 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 import os
 
 from django.core.asgi import get_asgi_application
+from django.core.handlers.asgi import ASGIHandler
+from django.urls import Resolver404, resolve
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'villacare.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+
+class EventStreamHandler(ASGIHandler):
+    """Serves report event streams (main.events) without a thread each.
+
+    ASGIHandler gives every request its own thread for sync middleware and
+    ORM calls, kept until the response ends. Event streams stay open as long
+    as the page does, so they share asgiref's single sync thread instead;
+    they only use it briefly while connecting.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.handle(scope, receive, send)
+
+
+event_stream_application = EventStreamHandler()
+
+
+def is_event_stream(path):
+    if not path.endswith('/events/'):
+        return False
+    try:
+        return resolve(path).url_name == 'report_events'
+    except Resolver404:
+        return False
+
+
+from main.events import broker  # noqa: E402  (needs the app registry)
+from main.write_queue import drain_all  # noqa: E402
+
+
+async def application(scope, receive, send):
+    # Django does not handle the lifespan protocol; answer it here so queued
+    # contact/review submissions are saved and open event streams end
+    # before the server exits.
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await broker.close()
+                await drain_all()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    elif scope['type'] == 'http' and is_event_stream(scope['path']):
+        await event_stream_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -41,12 +41,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so its timings cover the rest of the stack (main.perf)
+    'main.perf.PerfMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     # 'django.middleware.locale.LocaleMiddleware',  # Temporarily disabled
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # request.profile (main.profiles)
+    'main.profiles.ProfileMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -55,7 +59,9 @@ ROOT_URLCONF = 'villacare.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, plus render timing for main.perf.PerfMiddleware
+        'BACKEND': 'main.perf.PerfDjangoTemplates',
+        'NAME': 'django',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -79,9 +85,113 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Reuse connections across requests instead of reconnecting each time
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Take the write lock at BEGIN so concurrent writers wait on
+            # busy_timeout instead of failing with "database is locked"
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+# Applied to every new SQLite connection by main.signals.configure_sqlite.
+# WAL lets readers run while a write is in progress; synchronous=NORMAL is
+# durable across application crashes under WAL (only an OS crash can lose
+# the last commits). journal_mode=wal is stored in the database file
+# itself, which is one reason db.sqlite3 is not kept in git: create it with
+# `manage.py migrate`.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,          # ms
+    'cache_size': -64000,          # negative = KiB, i.e. 64 MB per connection
+    'mmap_size': 268435456,        # 256 MB
+    'temp_store': 'memory',
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# LocMemCache is per-process; switch to a shared backend (e.g. Redis or
+# Memcached) when running several workers so invalidation reaches all of them.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'villacare',
+    }
+}
+
+# Sessions live in the database but are read through the 'sessions' cache
+# (cached_db), and main.sessions.CachedModelBackend keeps the logged-in user
+# there too, so an authenticated request normally runs no session or user
+# query. SESSION_CACHE_TIER picks that cache: 'file' is shared by every
+# worker process on the host; 'locmem' is faster but per-process, so it is
+# only safe with a single process (a logout or password change in one
+# process would not reach another's copy). The file tier skips Django's
+# directory scan on every write, so MAX_ENTRIES doesn't apply; run
+# `manage.py clear_expired_sessions` nightly to delete expired rows and
+# cache files.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'sessions'
+SESSION_CACHE_TIER = 'file'
+SESSION_CACHE_TIERS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'villacare-sessions',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    'file': {
+        'BACKEND': 'main.sessions.SessionFileCache',
+        'LOCATION': BASE_DIR / 'var' / 'session_cache',
+    },
+}
+CACHES[SESSION_CACHE_ALIAS] = SESSION_CACHE_TIERS[SESSION_CACHE_TIER]
+
+# Keeps tests off the shared session cache directory (main.testing)
+TEST_RUNNER = 'main.testing.TestRunner'
+
+AUTHENTICATION_BACKENDS = ['main.sessions.CachedModelBackend']
+# Seconds a logged-in user stays cached; saves invalidate it sooner
+AUTH_USER_CACHE_TIMEOUT = 300
+
+# Seconds the home page package/review fragments stay cached. Saving or
+# deleting a Package or Review invalidates them immediately (see main/signals.py).
+HOME_FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Seconds a user's profile stays cached for request.profile (main.profiles).
+# Profile saves and report counter changes invalidate it in this process;
+# the timeout bounds how stale other processes' copies can get with a
+# per-process cache such as LocMemCache.
+PROFILE_CACHE_TIMEOUT = 60
+
+
+# Full-text search over villa reports and comments (see main/search.py).
+# Use 'main.search.DatabaseSearchBackend' on databases without SQLite FTS5.
+SEARCH_BACKEND = 'main.search.SQLiteFTSBackend'
+SEARCH_RESULTS_LIMIT = 50
+# Only the newest N matches of a query are ranked by relevance, which keeps
+# searches for very common words fast on large corpora
+SEARCH_RANK_WINDOW = 2000
+
+
+# Contact and review submissions under ASGI (see main/write_queue.py). When
+# enabled, the submit endpoints validate inline and queue rows that are saved
+# with bulk_create every WRITE_QUEUE_BATCH_SIZE rows or
+# WRITE_QUEUE_FLUSH_INTERVAL seconds. Queued rows are journaled to
+# WRITE_QUEUE_JOURNAL_DIR first so they survive a crash; a process starts a
+# new journal file after WRITE_QUEUE_SEGMENT_SIZE bytes or
+# WRITE_QUEUE_SEGMENT_AGE seconds.
+ASYNC_SUBMISSIONS = False
+WRITE_QUEUE_BATCH_SIZE = 100
+WRITE_QUEUE_FLUSH_INTERVAL = 0.5
+WRITE_QUEUE_JOURNAL_DIR = BASE_DIR / 'var' / 'write_queue'
+WRITE_QUEUE_FSYNC = True
+WRITE_QUEUE_SEGMENT_SIZE = 1024 * 1024  # bytes
+WRITE_QUEUE_SEGMENT_AGE = 300           # seconds
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -133,9 +243,148 @@ STATICFILES_DIRS = [
 ]
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# collectstatic writes content-hashed, minified files plus .gz/.br siblings
+# (main.storage.CompressedManifestStaticFilesStorage)
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'main.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+STATIC_MINIFY = True
+# With DEBUG off, Django serves STATIC_ROOT through main.assets.serve, and
+# the responsive images under MEDIA_URL + IMAGE_DIR through main.images.serve.
+# Set to False when a web server serves both directly.
+SERVE_STATIC = True
+# Cache lifetime for static files without a content hash in their name;
+# hashed files are always cached for a year as immutable
+STATIC_MAX_AGE = 3600
+# Rules of css/style.css inlined into home.html's <head> (selector prefixes)
+CRITICAL_CSS_SELECTORS = [':root', '*', 'html', 'body', '.navbar', '.hero-']
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Responsive images (main.images): sources ingested with `manage.py ingest_images`
+# are stored under MEDIA_ROOT/IMAGE_DIR with one derivative per width and format.
+# AVIF is skipped when Pillow cannot write it; a JPEG fallback is always made.
+IMAGE_DIR = 'images'
+IMAGE_WIDTHS = [480, 768, 1200, 1920]
+IMAGE_FORMATS = ['avif', 'webp']
+
+# Photo attachments on villa reports (main.attachments). Uploads are streamed
+# to disk; EXIF stripping and thumbnails run on a thread pool of
+# ATTACHMENT_WORKERS threads (0 = inline, in the request).
+ATTACHMENT_MAX_SIZE = 20 * 1024 * 1024  # bytes per file
+ATTACHMENT_MAX_FILES = 20               # per upload
+ATTACHMENT_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.webp', '.gif']
+ATTACHMENT_THUMBNAIL_SIZE = 320         # px, square
+ATTACHMENT_WORKERS = 2
+
+# Live report updates over Server-Sent Events (main.events, ASGI only). One
+# watcher polls for new comments and status changes every SSE_POLL_INTERVAL
+# seconds while any report page is open and fans them out to every stream.
+SSE_POLL_INTERVAL = 1.0      # seconds
+SSE_POLL_BATCH = 500         # comments read per poll
+SSE_KEEPALIVE = 15           # seconds between keepalive comments
+SSE_RETRY = 3000             # ms before the browser reconnects
+SSE_QUEUE_SIZE = 32          # undelivered events kept per connection
+
+# Background tasks (main.tasks), stored in the database and run by
+# `manage.py run_worker`. Failed tasks are retried after TASK_RETRY_DELAY
+# seconds, doubling per attempt up to TASK_MAX_RETRY_DELAY. With
+# TASKS_EAGER, tasks run in-process right after the enqueuing transaction
+# commits instead (tests, or development without a worker). A task whose
+# worker stops sending heartbeats, or that runs past its timeout, is
+# queued again; that run counted as one of its attempts.
+TASKS_EAGER = False
+TASK_MAX_ATTEMPTS = 3
+TASK_RETRY_DELAY = 10           # seconds
+TASK_MAX_RETRY_DELAY = 3600     # seconds
+TASK_TIMEOUT = 3600             # seconds a run may take, unless @task(timeout=...) says otherwise
+TASK_HEARTBEAT_INTERVAL = 30    # seconds between a worker's "still running" updates
+TASK_STALE_AFTER = 900          # seconds without a heartbeat before a running task counts as abandoned
+TASK_RETENTION_DAYS = 7         # succeeded tasks are purged after this
+TASK_WORKER_CONCURRENCY = 4
+TASK_POLL_INTERVAL = 1.0        # seconds
+
+# Email. The console backend prints messages while developing; configure
+# EMAIL_HOST and friends for the SMTP backend in production.
+EMAIL_BACKEND = (
+    'django.core.mail.backends.console.EmailBackend' if DEBUG
+    else 'django.core.mail.backends.smtp.EmailBackend'
+)
+DEFAULT_FROM_EMAIL = 'VillaCare <noreply@villacare.example>'
+# Absolute links in emails
+SITE_URL = 'http://localhost:8000'
+
+# Report owners are emailed about status changes and staff comments
+# (main.notifications). Updates committed within NOTIFICATION_DIGEST_WINDOW
+# seconds are delivered together, one digest per owner, by a single
+# background task; 0 sends after every change.
+NOTIFICATION_DIGEST_WINDOW = 300    # seconds
+NOTIFICATION_BATCH_SIZE = 200       # owners per batch sent over one connection
+# Seconds before a claimed but unsent batch (its worker died) is sent by the
+# next delivery; below TASK_STALE_AFTER so the requeued task can take it over
+NOTIFICATION_CLAIM_TIMEOUT = 600
+
+# Request instrumentation (main.perf.PerfMiddleware). A PERF_SAMPLE_RATE
+# share of requests (0 disables the middleware, 1 records every request) is
+# logged with its wall time, query count and time, template render time and
+# response size by a background thread. Each process writes its own copy of
+# PERF_LOG_FILE (perf-<pid>.log), rotated at PERF_LOG_MAX_BYTES with
+# PERF_LOG_BACKUPS old files kept. `manage.py perf_report` summarizes them
+# and flags views that ran more queries than their budget.
+PERF_SAMPLE_RATE = 0.0
+PERF_LOG_FILE = BASE_DIR / 'var' / 'perf.log'
+PERF_LOG_MAX_BYTES = 10 * 1024 * 1024
+PERF_LOG_BACKUPS = 5
+PERF_DEFAULT_QUERY_BUDGET = 10
+PERF_QUERY_BUDGETS = {
+    'dashboard': 3,
+    'villa_reports': 2,
+    'villa_report_detail': 4,
+    'admin_dashboard': 4,
+    'admin_report_detail': 4,
+    'admin:main_villareport_changelist': 4,
+    'admin:main_comment_changelist': 4,
+    'admin:main_userprofile_changelist': 6,
+}
+
+# Technician scheduling (main.scheduling, `manage.py plan_schedule`). Job
+# length per report type in minutes, travel time charged once per villa
+# visit, and the age in days after which a waiting report is treated as one
+# priority level higher (up to high).
+SCHEDULE_JOB_MINUTES = {
+    'maintenance': 120,
+    'cleaning': 180,
+    'security': 90,
+    'landscaping': 240,
+    'pool': 90,
+    'emergency': 120,
+    'other': 60,
+}
+SCHEDULE_DEFAULT_JOB_MINUTES = 60
+SCHEDULE_TRAVEL_MINUTES = 30
+SCHEDULE_AGING_DAYS = 7
+
+# SLA tracking (main.sla). Targets in hours per priority for the first staff
+# comment and for completion. Monthly totals per type and priority are kept
+# in SLARollup by signals and recomputed nightly by `manage.py rollup_sla`;
+# the admin analytics page charts the last SLA_ANALYTICS_MONTHS months.
+SLA_RESPONSE_TARGET_HOURS = {'urgent': 2, 'high': 8, 'medium': 24, 'low': 72}
+SLA_COMPLETION_TARGET_HOURS = {'urgent': 24, 'high': 72, 'medium': 168, 'low': 336}
+SLA_ANALYTICS_MONTHS = 12
+
+# Status history (main.transitions). `manage.py snapshot_statuses` (run
+# hourly or nightly) stores per-status report counts so status_counts_at()
+# only aggregates transitions since the last snapshot. Snapshots are taken
+# STATUS_SNAPSHOT_LAG seconds in the past, so transitions stamped just
+# before but committed after the snapshot are not missed.
+STATUS_SNAPSHOT_LAG = 300
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
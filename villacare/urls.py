@@ -15,10 +15,12 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from django.conf.urls.i18n import i18n_patterns
+from main.assets import serve as serve_static
+from main.images import serve as serve_image
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -29,3 +31,10 @@ urlpatterns = [
 
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+elif settings.SERVE_STATIC:
+    # Collected files with immutable cache headers and precompressed variants
+    urlpatterns.insert(0, re_path(rf'^{settings.STATIC_URL.strip("/")}/(?P<path>.+)$', serve_static))
+    # Responsive image derivatives; the rest of MEDIA_ROOT stays private
+    urlpatterns.insert(0, re_path(
+        rf'^{settings.MEDIA_URL.strip("/")}/{settings.IMAGE_DIR}/(?P<path>.+)$', serve_image,
+    ))